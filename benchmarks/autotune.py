@@ -0,0 +1,149 @@
+"""
+Picks the fastest clingo search configuration of every task on this machine.
+
+For every task configuration of `benchmarks.run` the programs of a few sampled
+problems are solved with every profile of `solvers.profiles.PROFILES`, and the
+fastest profile that finds the same number of models as the default one is
+kept for the largest program size seen. Profiles with more threads than CPUs
+are skipped. The table is written as JSON and used by the CLI:
+
+    python -m benchmarks.autotune --samples 8 --repeat 3
+    python main.py --solver-profiles benchmarks/results/solver_profiles.json
+
+Everything runs locally and offline.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.run import GRAPH_SIZES, HAND_SIZES, RESULTS_DIR
+from benchmarks.run import _metadata as run_metadata
+from benchmarks.run import benchmark_tasks
+from generators.registry import LogicTask
+from solvers.clingo_solver import ClingoSolver
+from solvers.profiles import DEFAULT_PROFILE, PROFILES, SolverProfile, program_size
+
+MAX_MODELS = 2
+
+
+def _solve_all(programs: list[str], profile: SolverProfile) -> tuple[list[int], float]:
+    start = time.perf_counter()
+    counts = [
+        len(ClingoSolver.get_models(program, MAX_MODELS, profile))
+        for program in programs
+    ]
+    return counts, time.perf_counter() - start
+
+
+def tune_task(
+    task: LogicTask, n: int, rng: np.random.Generator, repeat: int = 1
+) -> tuple[int, dict[str, float]]:
+    """Size of the largest program and the seconds of every valid profile."""
+    base_asp = task.base_asp()
+    programs = [base_asp + asp for asp in task.serialize(task.generate(n, rng))]
+    cpus = os.cpu_count() or 1
+
+    expected = None
+    seconds = {}
+    for profile in [DEFAULT_PROFILE] + list(PROFILES.values()):
+        if profile.name in seconds or profile.threads > cpus:
+            continue
+        # The fastest of the repeats is the least disturbed by other load.
+        runs = [_solve_all(programs, profile) for _ in range(repeat)]
+        counts = runs[0][0]
+        if expected is None:
+            expected = counts
+        elif counts != expected:
+            continue
+        seconds[profile.name] = min(run[1] for run in runs)
+
+    return max(program_size(program) for program in programs), seconds
+
+
+def autotune(
+    samples: int,
+    graph_sizes: list[int],
+    hand_sizes: list[int],
+    repeat: int = 1,
+    seed: int = 0,
+    pattern: str | None = None,
+) -> tuple[dict[str, list[dict]], list[dict]]:
+    """The profile table of `solvers.profiles` and the timings of every run."""
+    table: dict[str, list[dict]] = {}
+    results = []
+    for name, size, task in benchmark_tasks(graph_sizes, hand_sizes):
+        if pattern is not None and pattern not in name:
+            continue
+        np.random.seed(seed)
+        rng = np.random.default_rng(seed)
+        max_size, seconds = tune_task(task, samples, rng, repeat)
+        best = min(seconds, key=seconds.get)
+        table.setdefault(task.name, []).append({"max_size": max_size, "profile": best})
+        results.append(
+            {
+                "task": task.name,
+                "size": size,
+                "program_size": max_size,
+                "profile": best,
+                "seconds": seconds,
+            }
+        )
+        speedup = seconds[DEFAULT_PROFILE.name] / max(seconds[best], 1e-9)
+        print(
+            f"{name} (size {size}): {best}, {seconds[best]:.3f}s "
+            f"({speedup:.2f}x the default)",
+            flush=True,
+        )
+
+    for entries in table.values():
+        entries.sort(key=lambda entry: entry["max_size"])
+    return table, results
+
+
+def _metadata() -> dict:
+    return {**run_metadata(), "cpus": os.cpu_count()}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--samples", type=int, default=8)
+    parser.add_argument("--graph-sizes", nargs="+", type=int, default=GRAPH_SIZES)
+    parser.add_argument("--hand-sizes", nargs="+", type=int, default=HAND_SIZES)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--tasks", default=None, help="Only tune tasks containing this text."
+    )
+    parser.add_argument(
+        "--output", default=os.path.join(RESULTS_DIR, "solver_profiles.json")
+    )
+    args = parser.parse_args(argv)
+
+    table, results = autotune(
+        args.samples,
+        args.graph_sizes,
+        args.hand_sizes,
+        args.repeat,
+        args.seed,
+        args.tasks,
+    )
+    if not table:
+        print("No task matches", args.tasks, file=sys.stderr)
+        return 2
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(
+            {"metadata": _metadata(), "tasks": table, "results": results}, f, indent=4
+        )
+    print(f"Profiles written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
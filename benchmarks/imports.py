@@ -0,0 +1,78 @@
+"""
+Import-time benchmark of the CLI and the task registry.
+
+Every worker process imports `main` and the task modules before it can run a
+job, so they must not import matplotlib, networkx, scipy or sudokum, which are
+only loaded by the tasks that use them. The import is timed in fresh
+interpreters:
+
+    python -m benchmarks.imports --max-seconds 0.5
+
+The command exits with 1 if a heavy module is imported eagerly or the fastest
+import takes longer than the limit.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+HEAVY_MODULES = ["matplotlib", "networkx", "scipy", "sudokum"]
+
+SNIPPET = """
+import json
+import sys
+import time
+
+start = time.perf_counter()
+import main
+from generators.registry import load_tasks
+
+load_tasks()
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "modules": sorted(sys.modules)}))
+"""
+
+
+def time_import() -> tuple[float, list[str]]:
+    """Seconds to import the CLI in a fresh interpreter and the heavy modules."""
+    output = subprocess.run(
+        [sys.executable, "-c", SNIPPET], capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.splitlines()[-1])
+    loaded = [
+        module
+        for module in HEAVY_MODULES
+        if any(m == module or m.startswith(module + ".") for m in result["modules"])
+    ]
+    return result["seconds"], loaded
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=0.5,
+        help="Limit on the fastest import time.",
+    )
+    args = parser.parse_args(argv)
+
+    runs = [time_import() for _ in range(args.repeat)]
+    seconds = min(run[0] for run in runs)
+    loaded = sorted({module for _, modules in runs for module in modules})
+    print(f"Importing the tasks takes {seconds:.3f}s")
+
+    failed = False
+    if loaded:
+        print(f"Imported eagerly: {', '.join(loaded)}", file=sys.stderr)
+        failed = True
+    if seconds > args.max_seconds:
+        print(f"Slower than {args.max_seconds:.3f}s", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
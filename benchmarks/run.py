@@ -0,0 +1,269 @@
+"""
+Benchmarks of every generation stage of the registered tasks.
+
+For every task configuration and sample size the stages are timed separately:
+sampling the problem specs, building the ASP text, grounding and solving with
+clingo, rendering the images, encoding them as PNG and writing the export.
+Results are written as JSON and compared against a saved baseline:
+
+    python -m benchmarks.run --samples 4 16 --save-baseline
+    python -m benchmarks.run --samples 4 16 --threshold 1.25
+
+The second command exits with 1 if a stage got slower than the baseline by
+more than the threshold. Everything runs locally and offline.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import clingo
+import matplotlib
+
+matplotlib.use("Agg")
+
+import numpy as np
+
+from generators.registry import LogicTask, load_tasks, problem_from_spec
+from generators.set_hands import SET_TASKS, SetHandTask
+from generators.sparse_graph import (
+    GRAPH_KINDS,
+    LargeGraphFillInTask,
+    LargeGraphValidityTask,
+)
+from generators.utils import export_problems, save_image
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+STAGES = ["generate", "serialize", "ground", "solve", "render", "encode", "export"]
+GRAPH_SIZES = [50, 200, 500]
+HAND_SIZES = [12, 15, 18]
+
+
+def benchmark_tasks(
+    graph_sizes: list[int], hand_sizes: list[int]
+) -> list[tuple[str, int | None, LogicTask]]:
+    """(name, size, task) of every benchmarked task configuration."""
+    tasks = load_tasks()
+    configurations = [
+        ("sudoku_validity", 9, tasks["sudoku_validity"]),
+        ("sudoku_fill_in", 9, tasks["sudoku_fill_in"]),
+        ("sudoku_violation", 9, tasks["sudoku_violation"]),
+        ("graph_validity", None, tasks["graph_validity"]),
+        ("graph_fill_in", None, tasks["graph_fill_in"]),
+        ("set_validity", 4, tasks["set_validity"]),
+    ]
+    for kind in GRAPH_KINDS:
+        for n in graph_sizes:
+            configurations.append(
+                (f"graph_{kind}_validity", n, LargeGraphValidityTask(kind, n, n))
+            )
+            configurations.append(
+                (f"graph_{kind}_fill_in", n, LargeGraphFillInTask(kind, n, n))
+            )
+    for task in SET_TASKS:
+        for n in hand_sizes:
+            configurations.append((f"set_{task}", n, SetHandTask(task, n)))
+
+    return configurations
+
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def _ground(base_asp: str, programs: list[str]) -> list[clingo.Control]:
+    controls = []
+    for program in programs:
+        control = clingo.Control(["2"])
+        control.add("base", [], base_asp + program)
+        control.ground([("base", [])])
+        controls.append(control)
+    return controls
+
+
+def _solve(controls: list[clingo.Control]):
+    for control in controls:
+        control.solve()
+
+
+def _encode(images: list) -> list[bytes]:
+    encoded = []
+    for image in images:
+        buffer = io.BytesIO()
+        save_image(image, buffer)
+        encoded.append(buffer.getvalue())
+    return encoded
+
+
+def _export(specs: list[dict], programs: list[str], base_asp: str, data_dir: str):
+    problems = [problem_from_spec(s, asp) for s, asp in zip(specs, programs)]
+    export_problems(problems, data_dir, base_asp)
+
+
+def benchmark_task(task: LogicTask, n: int, rng: np.random.Generator) -> dict:
+    """Seconds spent in every stage for n samples of the task."""
+    timings = {}
+    specs, timings["generate"] = _timed(task.generate, n, rng)
+    programs, timings["serialize"] = _timed(task.serialize, specs)
+
+    base_asp = task.base_asp()
+    controls, timings["ground"] = _timed(_ground, base_asp, programs)
+    _, timings["solve"] = _timed(_solve, controls)
+
+    images, timings["render"] = _timed(task.render, specs)
+    _, timings["encode"] = _timed(_encode, images)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        _, timings["export"] = _timed(_export, specs, programs, base_asp, data_dir)
+
+    return timings
+
+
+def run_benchmarks(
+    samples: list[int],
+    graph_sizes: list[int],
+    hand_sizes: list[int],
+    repeat: int = 1,
+    seed: int = 0,
+    pattern: str | None = None,
+) -> list[dict]:
+    results = []
+    for name, size, task in benchmark_tasks(graph_sizes, hand_sizes):
+        if pattern is not None and pattern not in name:
+            continue
+        for n in samples:
+            np.random.seed(seed)
+            rng = np.random.default_rng(seed)
+            # The fastest of the repeats is the least disturbed by other load.
+            runs = [benchmark_task(task, n, rng) for _ in range(repeat)]
+            for stage in STAGES:
+                seconds = min(run[stage] for run in runs)
+                results.append(
+                    {
+                        "task": name,
+                        "size": size,
+                        "samples": n,
+                        "stage": stage,
+                        "seconds": seconds,
+                        "per_sample": seconds / n,
+                    }
+                )
+            total = sum(min(run[stage] for run in runs) for stage in STAGES)
+            print(f"{name} (size {size}, {n} samples): {total:.3f}s", flush=True)
+
+    return results
+
+
+def _key(result: dict) -> tuple:
+    return (result["task"], result["size"], result["samples"], result["stage"])
+
+
+def compare(
+    results: list[dict],
+    baseline: list[dict],
+    threshold: float,
+    min_seconds: float = 0.005,
+) -> list[str]:
+    """
+    Descriptions of the stages slower than the baseline by more than the
+    threshold ratio. Differences below `min_seconds` are treated as noise.
+    """
+    baseline = {_key(result): result["seconds"] for result in baseline}
+    regressions = []
+    for result in results:
+        before = baseline.get(_key(result))
+        if before is None:
+            continue
+        after = result["seconds"]
+        if after > before * threshold and after - before > min_seconds:
+            task, size, samples, stage = _key(result)
+            regressions.append(
+                f"{task} (size {size}, {samples} samples) {stage}: "
+                f"{before:.4f}s -> {after:.4f}s ({after / before:.2f}x)"
+            )
+    return regressions
+
+
+def _metadata() -> dict:
+    return {
+        "date": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "clingo": clingo.__version__,
+        "matplotlib": matplotlib.__version__,
+    }
+
+
+def _write(path: str, results: list[dict]):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"metadata": _metadata(), "results": results}, f, indent=4)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--samples", nargs="+", type=int, default=[4, 16])
+    parser.add_argument("--graph-sizes", nargs="+", type=int, default=GRAPH_SIZES)
+    parser.add_argument("--hand-sizes", nargs="+", type=int, default=HAND_SIZES)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--tasks", default=None, help="Only benchmark tasks containing this text."
+    )
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "latest.json"))
+    parser.add_argument(
+        "--baseline", default=os.path.join(RESULTS_DIR, "baseline.json")
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Store the results as the new baseline instead of comparing.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.25,
+        help="Slowdown ratio over the baseline reported as a regression.",
+    )
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(
+        args.samples,
+        args.graph_sizes,
+        args.hand_sizes,
+        args.repeat,
+        args.seed,
+        args.tasks,
+    )
+    _write(args.output, results)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        _write(args.baseline, results)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against, use --save-baseline")
+        return 0
+
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"Regression: {regression}", file=sys.stderr)
+    print(f"{len(regressions)} regressions over {args.threshold:.2f}x the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
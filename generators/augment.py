@@ -0,0 +1,378 @@
+"""
+Augmentation of rendered images, applied to batches of uint8 arrays.
+
+One render can be turned into many variants without drawing it again with
+matplotlib. Every image gets its own seed, from which the parameters of every
+step and its noise are drawn, and the steps themselves run on the whole batch:
+
+- scaling and small rotations about the center, with bilinear sampling and
+  the corner color as background,
+- a palette swap that gives the achromatic pixels (paper, lines and text) a
+  light paper and a dark ink color, both near gray,
+- brightness, contrast and saturation jitter,
+- JPEG-like artifacts, by quantizing the DCT of the 8x8 blocks of the
+  luminance and subsampling the chrominance,
+- Gaussian luminance noise.
+
+Hues are never shifted, since the colors of nodes, cards and marked cells are
+part of the questions.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from generators.utils import image_to_array
+
+# Pixels whose channels differ by less than this are recolored by palette swaps.
+ACHROMATIC_RANGE = 24
+# Largest tint of the paper and ink colors, small enough that gray nodes and
+# cards still look gray.
+PALETTE_TINT = 5
+GRAY_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+RGB_TO_YCBCR = np.array(
+    [[0.299, 0.587, 0.114], [-0.168736, -0.331264, 0.5], [0.5, -0.418688, -0.081312]],
+    dtype=np.float32,
+)
+YCBCR_TO_RGB = np.linalg.inv(RGB_TO_YCBCR).astype(np.float32)
+# Quantization tables of the JPEG standard (Annex K) at quality 50.
+LUMINANCE_TABLE = np.array(
+    [
+        [16, 11, 10, 16, 24, 40, 51, 61],
+        [12, 12, 14, 19, 26, 58, 60, 55],
+        [14, 13, 16, 24, 40, 57, 69, 56],
+        [14, 17, 22, 29, 51, 87, 80, 62],
+        [18, 22, 37, 56, 68, 109, 103, 77],
+        [24, 35, 55, 64, 81, 104, 113, 92],
+        [49, 64, 78, 87, 103, 121, 120, 101],
+        [72, 92, 95, 98, 112, 100, 103, 99],
+    ],
+    dtype=np.float32,
+)
+# Pixels augmented at a time.
+CHUNK_PIXELS = 2**19
+# Lanes of 16 bits of a uint64, used to blend the channels of pixels at once.
+LANE_MASK = np.uint64(0x00FF00FF00FF00FF)
+LANE_HALF = np.uint64(0x0080008000800080)
+
+
+def _dct_matrix() -> np.ndarray:
+    k, i = np.mgrid[0:8, 0:8]
+    matrix = np.sqrt(2 / 8) * np.cos((2 * i + 1) * k * np.pi / 16)
+    matrix[0] /= np.sqrt(2)
+    return matrix.astype(np.float32)
+
+
+DCT = _dct_matrix()
+# DCT of flattened 8x8 blocks.
+DCT_2D = np.kron(DCT, DCT)
+
+
+@dataclass(frozen=True)
+class Augmentation:
+    """Strength of every step, 0 disables it."""
+
+    brightness: float = 0.15
+    contrast: float = 0.15
+    saturation: float = 0.2
+    # Probability of a palette swap.
+    palette: float = 0.5
+    # Largest relative zoom in or out, and largest rotation in degrees.
+    scale: float = 0.1
+    rotation: float = 4.0
+    # Largest standard deviation of the noise, in gray levels.
+    noise: float = 4.0
+    # Probability of JPEG-like artifacts, and the range of their quality.
+    jpeg: float = 0.5
+    jpeg_quality: tuple[int, int] = (30, 90)
+
+
+DEFAULT_AUGMENTATION = Augmentation()
+
+
+def sample_parameters(
+    seeds: list[int], config: Augmentation
+) -> tuple[dict[str, np.ndarray], list[np.random.Generator]]:
+    """
+    Parameters of every step for every seed, and the generators that the
+    noise of every image is drawn from afterwards.
+    """
+    names = [
+        "brightness",
+        "contrast",
+        "saturation",
+        "palette",
+        "paper",
+        "ink",
+        "scale",
+        "angle",
+        "noise",
+        "jpeg",
+        "quality",
+    ]
+    parameters = {name: [] for name in names}
+    rngs = []
+    for seed in seeds:
+        rng = np.random.default_rng(seed)
+        values = [
+            1 + rng.uniform(-config.brightness, config.brightness),
+            1 + rng.uniform(-config.contrast, config.contrast),
+            1 + rng.uniform(-config.saturation, config.saturation),
+            rng.random() < config.palette,
+            rng.uniform(220, 250) + rng.uniform(-PALETTE_TINT, PALETTE_TINT, 3),
+            rng.uniform(0, 60) + rng.uniform(-PALETTE_TINT, PALETTE_TINT, 3),
+            np.exp(rng.uniform(np.log1p(-config.scale), np.log1p(config.scale))),
+            np.deg2rad(rng.uniform(-config.rotation, config.rotation)),
+            rng.uniform(0, config.noise),
+            rng.random() < config.jpeg,
+            rng.integers(config.jpeg_quality[0], config.jpeg_quality[1] + 1),
+        ]
+        for name, value in zip(names, values):
+            parameters[name].append(value)
+        rngs.append(rng)
+    arrays = {name: np.array(values) for name, values in parameters.items()}
+    # Float parameters are float32 like the images, which numpy would otherwise
+    # promote to float64.
+    for name, array in arrays.items():
+        if array.dtype == np.float64:
+            arrays[name] = array.astype(np.float32)
+    return arrays, rngs
+
+
+def _gray(images: np.ndarray) -> np.ndarray:
+    weights = GRAY_WEIGHTS
+    return (
+        images[..., 0] * weights[0]
+        + images[..., 1] * weights[1]
+        + images[..., 2] * weights[2]
+    )
+
+
+def _planes(images: np.ndarray, matrix: np.ndarray) -> list[np.ndarray]:
+    # Channels of a color transform, faster than a matmul with 3 columns.
+    channels = images[..., 0], images[..., 1], images[..., 2]
+    planes = []
+    for row in matrix:
+        plane = channels[0] * row[0]
+        plane += channels[1] * row[1]
+        plane += channels[2] * row[2]
+        planes.append(plane)
+    return planes
+
+
+def _blend(a: np.ndarray, b: np.ndarray, weight: np.ndarray) -> np.ndarray:
+    # Blends all 16-bit lanes of two uint64 arrays, with weights out of 256.
+    return ((a * (256 - weight) + b * weight + LANE_HALF) >> 8) & LANE_MASK
+
+
+def warp(images: np.ndarray, scale: np.ndarray, angle: np.ndarray) -> np.ndarray:
+    """
+    Scales and rotates a batch of uint8 images about their centers, with
+    bilinear sampling and the color of the top left corner as background.
+    """
+    n, h, w, channels = images.shape
+    ys = np.arange(h, dtype=np.float32)[:, None] - (h - 1) / 2
+    xs = np.arange(w, dtype=np.float32) - (w - 1) / 2
+    cos = (np.cos(angle) / scale)[:, None, None]
+    sin = (np.sin(angle) / scale)[:, None, None]
+    # Source coordinates of every output pixel, by the inverse transform, in
+    # fixed point with 8 fractional bits.
+    sy = ((cos * ys - sin * xs + (h - 1) / 2) * 256).astype(np.int32)
+    sx = ((sin * ys + cos * xs + (w - 1) / 2) * 256).astype(np.int32)
+    inside = (sy >= 0) & (sy <= (h - 1) * 256) & (sx >= 0) & (sx <= (w - 1) * 256)
+    y0 = np.clip(sy >> 8, 0, h - 1)
+    x0 = np.clip(sx >> 8, 0, w - 1)
+    fy = (sy & 255).astype(np.uint64)
+    fx = (sx & 255).astype(np.uint64)
+
+    # The channels of a pixel are the 16-bit lanes of one uint64, so pixels
+    # are gathered and blended whole. The last row and column are repeated to
+    # give the pixels on the edges their neighbors.
+    lanes = np.zeros((n, h + 1, w + 1, 4), dtype=np.uint16)
+    lanes[:, :h, :w, :channels] = images
+    lanes[:, h] = lanes[:, h - 1]
+    lanes[:, :, w] = lanes[:, :, w - 1]
+    pixels = lanes.reshape(-1).view(np.uint64)
+    index = (np.arange(n)[:, None, None] * (h + 1) + y0) * (w + 1) + x0
+    top = _blend(pixels[index], pixels[index + 1], fx)
+    bottom = _blend(pixels[index + w + 1], pixels[index + w + 2], fx)
+    warped = np.where(
+        inside, _blend(top, bottom, fy), pixels[:: (h + 1) * (w + 1), None, None]
+    )
+    return warped.view(np.uint16).reshape(n, h, w, 4)[..., :channels].astype(np.uint8)
+
+
+def swap_palette(images: np.ndarray, paper: np.ndarray, ink: np.ndarray):
+    """
+    Maps the gray levels of the achromatic pixels of a uint8 batch from ink to
+    paper, as float32.
+    """
+    red, green, blue = images[..., 0], images[..., 1], images[..., 2]
+    spread = np.maximum(np.maximum(red, green), blue) - np.minimum(
+        np.minimum(red, green), blue
+    )
+    achromatic = spread < ACHROMATIC_RANGE
+    level = _gray(images)[..., None] * np.float32(1 / 255)
+    ink, paper = ink[:, None, None, :], paper[:, None, None, :]
+    return np.where(achromatic[..., None], ink + (paper - ink) * level, images)
+
+
+def jitter(
+    images: np.ndarray,
+    brightness: np.ndarray,
+    contrast: np.ndarray,
+    saturation: np.ndarray,
+) -> np.ndarray:
+    # Brightness, contrast around the mean gray level and saturation around
+    # the gray level of every pixel make up one affine map of the pixel and
+    # its gray level, applied in a single pass.
+    gray = _gray(images)
+    mean = gray.mean(axis=(1, 2))
+    scale = contrast * brightness
+    pixel = saturation * scale
+    gray_weight = (1 - saturation) * scale
+    offset = (1 - contrast) * brightness * mean
+    shift = gray * gray_weight[:, None, None] + offset[:, None, None]
+    images *= pixel[:, None, None, None]
+    images += shift[..., None]
+    return images
+
+
+def quantization_tables(quality: np.ndarray) -> np.ndarray:
+    """(n, 8, 8) quantization tables of the luminance."""
+    quality = np.clip(quality, 1, 100)
+    scale = np.where(quality < 50, 5000 / quality, 200 - 2 * quality)
+    tables = np.floor((LUMINANCE_TABLE * scale[:, None, None] + 50) / 100)
+    return np.maximum(tables, 1).astype(np.float32)
+
+
+def _subsample(plane: np.ndarray):
+    # Replaces the pixels of every 2x2 block of an (n, H, W) plane by their mean.
+    mean = plane[:, ::2, ::2] + plane[:, 1::2, ::2]
+    mean += plane[:, ::2, 1::2]
+    mean += plane[:, 1::2, 1::2]
+    mean *= 0.25
+    for dy in range(2):
+        for dx in range(2):
+            plane[:, dy::2, dx::2] = mean
+
+
+def compress(images: np.ndarray, quality: np.ndarray) -> np.ndarray:
+    """
+    JPEG-like artifacts: the DCT of the 8x8 blocks of the luminance is
+    quantized and the chrominance is subsampled in 2x2 blocks.
+    """
+    n, h, w, _ = images.shape
+    pad_h, pad_w = -h % 8, -w % 8
+    images = np.pad(images, ((0, 0), (0, pad_h), (0, pad_w), (0, 0)), mode="edge")
+    rows, columns = (h + pad_h) // 8, (w + pad_w) // 8
+    luminance, blue, red = _planes(images, RGB_TO_YCBCR)
+
+    blocks = luminance.reshape(n, rows, 8, columns, 8).transpose(0, 1, 3, 2, 4)
+    # The 2D DCT of every flattened block is one product with DCT_2D.
+    blocks = blocks.reshape(n, rows, columns, 64) - 128
+    tables = quantization_tables(quality).reshape(n, 1, 1, 64)
+    coefficients = np.round(blocks @ DCT_2D.T / tables) * tables
+    blocks = (coefficients @ DCT_2D + 128).reshape(n, rows, columns, 8, 8)
+    luminance = blocks.transpose(0, 1, 3, 2, 4).reshape(n, rows * 8, columns * 8)
+    _subsample(blue)
+    _subsample(red)
+
+    images = np.stack([luminance, blue, red], axis=-1)
+    return np.stack(_planes(images[:, :h, :w], YCBCR_TO_RGB), axis=-1)
+
+
+def augment_batch(
+    images: np.ndarray,
+    seeds: list[int],
+    config: Augmentation = DEFAULT_AUGMENTATION,
+) -> np.ndarray:
+    """Augmented copies of an (n, H, W, 3) uint8 batch, one seed per image."""
+    images = np.asarray(images)[..., :3]
+    parameters, rngs = sample_parameters(seeds, config)
+    # The steps run on chunks of the batch whose intermediate arrays stay in
+    # the cache, which is faster than running them on the whole batch.
+    n, h, w, _ = images.shape
+    step = max(1, CHUNK_PIXELS // (h * w))
+    augmented = np.empty((n, h, w, 3), dtype=np.uint8)
+    for start in range(0, n, step):
+        chunk = slice(start, start + step)
+        augmented[chunk] = _augment(
+            images[chunk],
+            {name: values[chunk] for name, values in parameters.items()},
+            rngs[chunk],
+        )
+    return augmented
+
+
+def _augment(
+    images: np.ndarray,
+    parameters: dict[str, np.ndarray],
+    rngs: list[np.random.Generator],
+) -> np.ndarray:
+    images = images.copy()
+
+    # Steps that leave an image unchanged are only run on the other images.
+    # Warping and palette swaps read uint8 pixels, the other steps float32.
+    selected = np.nonzero((parameters["scale"] != 1) | (parameters["angle"] != 0))[0]
+    if len(selected):
+        images[selected] = warp(
+            images[selected],
+            parameters["scale"][selected],
+            parameters["angle"][selected],
+        )
+    selected = np.nonzero(parameters["palette"])[0]
+    if len(selected) == len(images):
+        images = swap_palette(images, parameters["paper"], parameters["ink"])
+    else:
+        result = images.astype(np.float32)
+        if len(selected):
+            result[selected] = swap_palette(
+                images[selected],
+                parameters["paper"][selected],
+                parameters["ink"][selected],
+            )
+        images = result
+    images = jitter(
+        images,
+        parameters["brightness"],
+        parameters["contrast"],
+        parameters["saturation"],
+    )
+    selected = np.nonzero(parameters["jpeg"])[0]
+    if len(selected):
+        images[selected] = compress(
+            np.clip(images[selected], 0, 255), parameters["quality"][selected]
+        )
+    # The noise is drawn once per pixel and added to every channel, like the
+    # luminance noise of a camera, which takes a third of the draws.
+    for image, rng, std in zip(images, rngs, parameters["noise"]):
+        if std > 0:
+            image += (
+                rng.standard_normal(image.shape[:2], dtype=np.float32)[..., None] * std
+            )
+    images += 0.5
+    return np.clip(images, 0, 255, out=images).astype(np.uint8)
+
+
+def augment_images(
+    images: list,
+    seeds: list[int],
+    config: Augmentation = DEFAULT_AUGMENTATION,
+) -> list[np.ndarray]:
+    """
+    Augmented (H, W, 3) uint8 arrays of rendered figures or image arrays.
+    Images of the same size are augmented as one batch.
+    """
+    arrays = [image_to_array(image) for image in images]
+    augmented = [None] * len(arrays)
+    shapes = {}
+    for i, array in enumerate(arrays):
+        shapes.setdefault(array.shape, []).append(i)
+    for indices in shapes.values():
+        batch = augment_batch(
+            np.stack([arrays[i] for i in indices]), [seeds[i] for i in indices], config
+        )
+        for i, image in zip(indices, batch):
+            augmented[i] = image
+    return augmented
@@ -1,41 +1,57 @@
-import os
+from __future__ import annotations
+
+import itertools
 import random
+from typing import TYPE_CHECKING
 
-import matplotlib.pyplot as plt
-import networkx as nx
 import numpy as np
 
-from generators.utils import create_directory, export_problems
+from generators.graph_index import GraphDedupIndex
+from generators.registry import (
+    TASKS,
+    LogicTask,
+    ValidityTask,
+    export_task,
+    register_task,
+    seeded_globals,
+)
+from generators.utils import format_options, generate_valid_options
+from pipeline import metrics
+from solvers.asp_instance import AspInstance
 from solvers.clingo_solver import ClingoSolver
 
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+    import networkx as nx
+
 COLOURS = ["red", "blue", "green", "yellow", "purple", "orange"]
+MIN_NODES = 5
 MAX_NODES = len(COLOURS)
+# Fewest colors of a fill-in graph, unless a number of colors is given.
+MIN_FILL_IN_COLORS = 4
+# Candidates rejected in a row after which a generator gives up.
+MAX_REJECTED_IN_A_ROW = 1000
 
+FILL_IN_QUESTION = "You have a picture of a graph with multiple nodes connected by edges. Each node has a specific color, except for one. Given that no two connected nodes can have the same color, can you determine what color the uncolored (grey) node should be? Give me a letter of a valid answer."
+VALIDITY_QUESTION = "You have a picture of a graph with multiple nodes connected by edges. Currently all nodes are grey color. Each node has to have a specific color assigned to each. Given that no two connected nodes can have the same color, can you determine if with given set of colors you can color each node so it would not break the ruleYou have a picture of a graph with multiple nodes connected by edges. Currently, all nodes are grey. Each node needs to be assigned a specific color. Given that no two connected nodes can share the same color, can you determine whether it is possible to color the graph according to this rule with the given set of colors? Give me a letter of a valid answer."
 
-def generate_coloring_facts(node_colors: list[str]):
-    asp = "% Defining colored node facts\n"
-    asp_coloring_rule = ""
-    for i, color in enumerate(node_colors):
-        if color == "grey":
-            asp_coloring_rule = f"""
-                % Ensure the grey node (node {i})is assigned exactly one color
-                1 {{ coloring({i},Color) : color(Color) }} 1.
-                % Define the answer as the color of the grey node
-                answer(Color) :- coloring({i},Color).
-
-                % Output the final answer
-                #show answer/1.
 
-                """
-        else:
-            asp += f"coloring({i},{color}).\n"
-    asp += asp_coloring_rule
+def add_coloring_facts(instance: AspInstance, node_colors: list[str]):
+    instance.comment("Defining colored node facts")
+    instance.add_facts(
+        "coloring",
+        [(i, color) for i, color in enumerate(node_colors) if color != "grey"],
+    )
 
-    return asp
+    grey_node = node_colors.index("grey")
+    instance.comment(f"The grey node (node {grey_node}) has to be assigned a color")
+    instance.add_fact("grey", grey_node)
 
 
 def _generate_connected_graph(max_nodes: int) -> nx.Graph:
-    n = random.randint(5, max_nodes)
+    import networkx as nx
+
+    n = random.randint(MIN_NODES, max_nodes)
     G = nx.Graph()
     G.add_nodes_from(range(n))
 
@@ -53,67 +69,163 @@ def _generate_connected_graph(max_nodes: int) -> nx.Graph:
     return G
 
 
-def assign_colors_to_graph(graph: nx.Graph) -> tuple[list[str], list[str]]:
-    color_map = nx.coloring.greedy_color(graph, strategy="largest_first")
+def _check_stalled(generator: str, rejected: int, found: int, wanted: int):
+    # Small graphs only make a limited number of distinct problems, beyond
+    # which the deduplicated generators would loop forever.
+    if rejected >= MAX_REJECTED_IN_A_ROW:
+        raise ValueError(
+            f"{generator}: only {found} of {wanted} distinct problems found "
+            f"before {rejected} candidates in a row were rejected, ask for "
+            "fewer samples or allow larger graphs"
+        )
 
-    # Convert color assignments to a list of node colors
-    color_palette = COLOURS
 
-    node_colors = [color_palette[color_map[node]] for node in graph.nodes()]
-    grey_node = random.choice(list(graph.nodes()))
-    original_node_colors = node_colors.copy()
-    node_colors[grey_node] = "grey"
+def build_fill_in_graph(
+    n_nodes: int, n_colors: int, edge_probability: float, rng: np.random.Generator
+) -> tuple[nx.Graph, list[str], list[str]]:
+    """
+    A connected graph with a proper coloring that uses `n_colors` colors, and
+    its node colors with a grey node. The neighbours of the grey node use
+    every color but its own, so its color is the only answer.
+    """
+    import networkx as nx
 
-    return node_colors, original_node_colors
+    grey_node = int(rng.integers(n_nodes))
+    grey_color = int(rng.integers(n_colors))
+    others = np.delete(np.arange(n_nodes), grey_node)
+    neighbours = rng.choice(
+        others, int(rng.integers(n_colors - 1, n_nodes)), replace=False
+    )
+    # Every other color is given to one neighbour, and random ones to the rest.
+    other_colors = np.delete(np.arange(n_colors), grey_color)
+    neighbour_colors = np.concatenate(
+        [other_colors, rng.choice(other_colors, len(neighbours) - len(other_colors))]
+    )
+    colors = rng.integers(n_colors, size=n_nodes)
+    colors[grey_node] = grey_color
+    colors[neighbours] = rng.permutation(neighbour_colors)
+
+    graph = nx.Graph()
+    graph.add_nodes_from(range(n_nodes))
+    graph.add_edges_from((grey_node, int(node)) for node in neighbours)
+    # The other nodes are attached to a node of another color that is already
+    # connected, which keeps the graph connected.
+    connected = [grey_node, *neighbours]
+    for node in rng.permutation(np.setdiff1d(others, neighbours)):
+        choices = [other for other in connected if colors[other] != colors[node]]
+        graph.add_edge(int(node), int(rng.choice(choices)))
+        connected.append(node)
+    # Extra edges only join nodes of different colors, so the coloring stays
+    # proper and the grey node only gets neighbours of the other colors.
+    for u, v in itertools.combinations(range(n_nodes), 2):
+        if (
+            colors[u] != colors[v]
+            and not graph.has_edge(u, v)
+            and rng.random() < edge_probability
+        ):
+            graph.add_edge(u, v)
+
+    original_node_colors = [COLOURS[color] for color in colors]
+    node_colors = original_node_colors.copy()
+    node_colors[grey_node] = "grey"
+    return graph, node_colors, original_node_colors
 
 
 def generate_fill_in_connected_graphs(
-    max_nodes: int, n_samples: int = 10
+    max_nodes: int,
+    n_samples: int = 10,
+    index: GraphDedupIndex | None = None,
+    rng: np.random.Generator | None = None,
+    min_nodes: int = MIN_NODES,
+    n_colors: int | None = None,
+    edge_probability: float = 0.3,
 ) -> tuple[list[nx.Graph], list[list[str]], list[list[str]]]:
+    """
+    Graphs built with a unique color for their grey node, so no candidate is
+    solved or rejected other than duplicates. The number of colors is drawn
+    from MIN_FILL_IN_COLORS up to the number of nodes unless it is given.
+    Raises ValueError for impossible settings, and when small graphs run out
+    of distinct problems (see `_check_stalled`).
+    """
+    if min_nodes > max_nodes:
+        raise ValueError(f"min_nodes ({min_nodes}) exceeds max_nodes ({max_nodes})")
+    if not 0 <= edge_probability <= 1:
+        raise ValueError("edge_probability must be between 0 and 1")
+    if n_colors is not None and not 2 <= n_colors <= min(min_nodes, len(COLOURS)):
+        raise ValueError(
+            f"n_colors must be between 2 and {min(min_nodes, len(COLOURS))}, "
+            "the smaller of min_nodes and the number of colors"
+        )
+    if n_colors is None and min_nodes < MIN_FILL_IN_COLORS:
+        raise ValueError(f"min_nodes must be at least {MIN_FILL_IN_COLORS}")
+    rng = rng or np.random.default_rng(np.random.randint(2**31))
     graphs: list[nx.Graph] = []
     original_node_colors_list = []
     node_colors_list = []
 
+    duplicates = 0
     while len(graphs) < n_samples:
-        G = _generate_connected_graph(max_nodes)
-
-        node_colors, original_node_colors = assign_colors_to_graph(G)
-        if len(set(original_node_colors)) < 4:
-            continue
-        asp = get_fill_in_asp(G, set(original_node_colors), node_colors)
-        # There are more than one possible solutions
-        if ClingoSolver.get_models_count(asp) > 1:
+        _check_stalled("graph_fill_in", duplicates, len(graphs), n_samples)
+        n_nodes = int(rng.integers(min_nodes, max_nodes + 1))
+        colors = n_colors or int(
+            rng.integers(MIN_FILL_IN_COLORS, min(n_nodes, len(COLOURS)) + 1)
+        )
+        G, node_colors, original_node_colors = build_fill_in_graph(
+            n_nodes, colors, edge_probability, rng
+        )
+        if index is not None and not index.add(G, node_colors):
+            metrics.attempt("graph_fill_in", False, "duplicate")
+            duplicates += 1
             continue
-        else:
-            node_colors_list.append(node_colors)
-            original_node_colors_list.append(original_node_colors)
-            graphs.append(G)
+        metrics.attempt("graph_fill_in", True)
+        duplicates = 0
+        node_colors_list.append(node_colors)
+        original_node_colors_list.append(original_node_colors)
+        graphs.append(G)
 
     return graphs, node_colors_list, original_node_colors_list
 
 
-def generate_validity_graphs(max_nodes: int, n_samples: int = 10) -> tuple[
+def generate_validity_graphs(
+    max_nodes: int, n_samples: int = 10, index: GraphDedupIndex | None = None
+) -> tuple[
     list[nx.Graph],
-    list[str],
+    list[AspInstance],
     list[list[str]],
     list[nx.Graph],
-    list[str],
+    list[AspInstance],
     list[list[str]],
 ]:
     valid_graphs: list[nx.Graph] = []
     invalid_graphs: list[nx.Graph] = []
 
-    valid_asp: list[str] = []
-    invalid_asp: list[str] = []
+    valid_asp: list[AspInstance] = []
+    invalid_asp: list[AspInstance] = []
 
     valid_color_choices: list[list[str]] = []
     invalid_color_choices: list[list[str]] = []
 
+    rejected = 0
     while len(valid_graphs) < n_samples or len(invalid_graphs) < n_samples:
+        _check_stalled(
+            "graph_validity",
+            rejected,
+            len(valid_graphs) + len(invalid_graphs),
+            2 * n_samples,
+        )
         G = _generate_connected_graph(max_nodes)
-        asp, color_choices = generate_validity_asp(G)
+        color_choices = sample_color_choices(G.nodes.__len__())
+        # Candidates are only added to the index once accepted, so a graph
+        # dropped because its answer has enough samples can still be used.
+        if index is not None and index.contains(G, color_choices=color_choices):
+            metrics.attempt("graph_validity", False, "duplicate")
+            rejected += 1
+            continue
+        asp = build_validity_instance(G, color_choices)
         if ClingoSolver.solve(asp):
             if len(valid_graphs) >= n_samples:
+                metrics.attempt("graph_validity", False, "enough_valid")
+                rejected += 1
                 continue
 
             valid_graphs.append(G)
@@ -121,11 +233,17 @@ def generate_validity_graphs(max_nodes: int, n_samples: int = 10) -> tuple[
             valid_color_choices.append(color_choices)
         else:
             if len(invalid_graphs) >= n_samples:
+                metrics.attempt("graph_validity", False, "enough_invalid")
+                rejected += 1
                 continue
 
             invalid_graphs.append(G)
             invalid_asp.append(asp)
             invalid_color_choices.append(color_choices)
+        if index is not None:
+            index.add(G, color_choices=color_choices)
+        metrics.attempt("graph_validity", True)
+        rejected = 0
 
     return (
         valid_graphs,
@@ -137,9 +255,14 @@ def generate_validity_graphs(max_nodes: int, n_samples: int = 10) -> tuple[
     )
 
 
-def visualize_graph(G, node_colors: list[str] | None = None) -> plt.Figure:
+def visualize_graph(
+    G, node_colors: list[str] | None = None, seed: int | None = None
+) -> plt.Figure:
+    import matplotlib.pyplot as plt
+    import networkx as nx
+
     fig = plt.figure(figsize=(5, 5))
-    pos = nx.spring_layout(G)  # positions for all nodes
+    pos = nx.spring_layout(G, seed=seed)  # positions for all nodes
     nx.draw(
         G,
         pos,
@@ -153,44 +276,27 @@ def visualize_graph(G, node_colors: list[str] | None = None) -> plt.Figure:
     return fig
 
 
-def generate_asp_facts(G):
-    nodes = list(G.nodes())
-    edges = list(G.edges())
-
-    asp_facts = "% Define the nodes and edges in the graph\n"
-
-    for node in nodes:
-        asp_facts += f"node({node}).\n"
-
-    for edge in edges:
-        asp_facts += f"edge({edge[0]}, {edge[1]}).\n"
-
-    return asp_facts
+def add_graph_facts(instance: AspInstance, G: nx.Graph):
+    instance.comment("Define the nodes and edges in the graph")
+    instance.add_facts("node", [(node,) for node in G.nodes()])
+    instance.add_facts("edge", G.edges())
 
 
-def generate_validity_asp(graph: nx.Graph) -> tuple[str, list[str]]:
-    asp = base_asp()
-    color_facts, color_choices = generate_color_facts(graph.nodes.__len__())
-    asp_facts = generate_asp_facts(graph)
+def sample_color_choices(nodes_count: int) -> list[str]:
+    number_of_colors = random.randint(2, nodes_count)
+    return random.sample(COLOURS, number_of_colors)
 
-    asp_code = asp + color_facts + asp_facts
-    asp_code = asp_code.replace("    ", "")
 
-    return asp_code, color_choices
+def add_color_facts(instance: AspInstance, color_choices: list[str]):
+    instance.comment("Define predefined colorings for specific nodes")
+    instance.add_facts("color", [(color,) for color in color_choices])
 
 
-def generate_color_facts(
-    nodes_count: int, color_choices: list[str] | None = None
-) -> tuple[str, list[str]]:
-    color_facts = "% Define predefined colorings for specific nodes\n"
-    if not color_choices:
-        number_of_colors = random.randint(2, nodes_count)
-        color_choices = random.sample(COLOURS, number_of_colors)
-    for color in color_choices:
-        color_facts += f"color({color}).\n"
-
-    color_facts += "\n"
-    return color_facts, color_choices
+def build_validity_instance(graph: nx.Graph, color_choices: list[str]) -> AspInstance:
+    instance = AspInstance(get_validity_base_asp())
+    add_color_facts(instance, color_choices)
+    add_graph_facts(instance, graph)
+    return instance
 
 
 def base_asp():
@@ -206,201 +312,199 @@ def base_asp():
     """
 
 
+def get_validity_base_asp() -> str:
+    return base_asp().replace("    ", "")
+
+
+def get_fill_in_base_asp() -> str:
+    asp = base_asp() + """
+    % Define the answer as the color of the grey node
+    answer(Color) :- grey(Node), coloring(Node, Color).
+
+    % Output the final answer
+    #show answer/1.
+
+    """
+    return asp.replace("    ", "")
+
+
 def generate_fill_in_options(
     node_colors: list[str], original_node_colors: list[str]
 ) -> tuple[list[str], str]:
     idx_of_replaced_color = node_colors.index("grey")
     answer_color = original_node_colors[idx_of_replaced_color]
-    options = list(set(original_node_colors) - set([answer_color]))
+    # Colors in order of first appearance, since the order of a set of strings
+    # changes from one process to the next.
+    options = [c for c in dict.fromkeys(original_node_colors) if c != answer_color]
     if len(options) > 3:
         options = random.sample(options, 3)
     options.append(answer_color)
 
-    np.random.shuffle(options)
-    formatted_options = [f"{chr(65 + i)}) {options[i]}" for i in range(4)]
-    correct_option = chr(65 + options.index(answer_color))
+    return format_options(options, answer_color)
 
-    return formatted_options, correct_option
+
+def build_fill_in_instance(
+    graph: nx.Graph, original_colors: list[str], node_colors: list[str]
+) -> AspInstance:
+    instance = AspInstance(get_fill_in_base_asp())
+    add_color_facts(instance, original_colors)
+    add_graph_facts(instance, graph)
+    add_coloring_facts(instance, node_colors)
+    return instance
 
 
 def get_fill_in_asp(
-    graph: nx.Graph, original_colors: set[str], node_colors: list[str]
+    graph: nx.Graph, original_colors: list[str], node_colors: list[str]
 ) -> str:
-    asp = base_asp()
-    color_facts, _ = generate_color_facts(graph.nodes.__len__(), original_colors)
-    coloring_facts = generate_coloring_facts(node_colors)
-    asp_facts = generate_asp_facts(graph)
-
-    asp_code = asp + color_facts + asp_facts + coloring_facts
-    asp_code = asp_code.replace("    ", "")
-
-    return asp_code
-
-
-def format_fill_in_problem(
-    graphs: list[nx.Graph],
-    node_colors_list: list[list[str]] | None = None,
-    original_colors_list: list[list[str]] | None = None,
-):
-    problems = []
-
-    for i, graph in enumerate(graphs):
-        node_colors, original_node_colors = (
-            node_colors_list[i],
-            original_colors_list[i],
+    return build_fill_in_instance(graph, original_colors, node_colors).to_asp()
+
+
+def graph_from_spec(spec: dict) -> nx.Graph:
+    import networkx as nx
+
+    graph = nx.Graph()
+    graph.add_nodes_from(range(spec["nodes"]))
+    graph.add_edges_from(spec["edges"])
+    return graph
+
+
+def graph_to_spec(graph: nx.Graph) -> dict:
+    return {"nodes": graph.number_of_nodes(), "edges": [list(e) for e in graph.edges()]}
+
+
+class GraphValidityTask(ValidityTask):
+    name = "graph_validity"
+    prompt_template = "graph_validity.txt"
+
+    def base_asp(self) -> str:
+        return get_validity_base_asp()
+
+    def generate(
+        self,
+        n: int,
+        rng: np.random.Generator,
+        index: GraphDedupIndex | None = None,
+    ) -> list[dict]:
+        # The validity graphs, their colors and the options are drawn from the
+        # global generators.
+        with seeded_globals(rng):
+            (
+                valid_graphs,
+                _,
+                valid_color_choices,
+                invalid_graphs,
+                _,
+                invalid_color_choices,
+            ) = generate_validity_graphs(MAX_NODES, n // 2, index)
+
+            specs = []
+            for valid, graphs, color_choices in [
+                (True, valid_graphs, valid_color_choices),
+                (False, invalid_graphs, invalid_color_choices),
+            ]:
+                for graph, color_choice in zip(graphs, color_choices):
+                    options, answer = generate_valid_options(valid)
+                    specs.append(
+                        {
+                            "question": VALIDITY_QUESTION
+                            + "\nAvailable colors:\n"
+                            + ", ".join(color_choice),
+                            "options": options,
+                            "answer": answer,
+                            **graph_to_spec(graph),
+                            "color_choices": color_choice,
+                            "valid": valid,
+                            "layout_seed": int(rng.integers(2**31)),
+                        }
+                    )
+            return specs
+
+    def render_spec(self, spec: dict) -> plt.Figure:
+        return visualize_graph(graph_from_spec(spec), seed=spec.get("layout_seed"))
+
+    def serialize_spec(self, spec: dict) -> str:
+        graph = graph_from_spec(spec)
+        return build_validity_instance(graph, spec["color_choices"]).to_asp()
+
+    def prompt_values(self, spec: dict, asp: str) -> dict[str, str]:
+        values = super().prompt_values(spec, asp)
+        return {**values, "COLORS": ", ".join(spec["color_choices"])}
+
+
+class GraphFillInTask(LogicTask):
+    name = "graph_fill_in"
+    prompt_template = "graph_fill_in.txt"
+
+    def base_asp(self) -> str:
+        return get_fill_in_base_asp()
+
+    def generate(
+        self,
+        n: int,
+        rng: np.random.Generator,
+        index: GraphDedupIndex | None = None,
+        min_nodes: int = MIN_NODES,
+        max_nodes: int = MAX_NODES,
+        n_colors: int | None = None,
+        edge_probability: float = 0.3,
+    ) -> list[dict]:
+        # The options are drawn from the global generators.
+        with seeded_globals(rng):
+            graphs, node_colors_list, original_colors_list = (
+                generate_fill_in_connected_graphs(
+                    max_nodes, n, index, rng, min_nodes, n_colors, edge_probability
+                )
+            )
+
+            specs = []
+            for graph, node_colors, original_node_colors in zip(
+                graphs, node_colors_list, original_colors_list
+            ):
+                options, answer = generate_fill_in_options(
+                    node_colors, original_node_colors
+                )
+                specs.append(
+                    {
+                        "question": FILL_IN_QUESTION,
+                        "options": options,
+                        "answer": answer,
+                        **graph_to_spec(graph),
+                        "node_colors": node_colors,
+                        "original_node_colors": original_node_colors,
+                        "layout_seed": int(rng.integers(2**31)),
+                    }
+                )
+            return specs
+
+    def render_spec(self, spec: dict) -> plt.Figure:
+        return visualize_graph(
+            graph_from_spec(spec), spec["node_colors"], spec.get("layout_seed")
         )
-        image = visualize_graph(graph, node_colors)
-        asp_program = get_fill_in_asp(graph, set(original_node_colors), node_colors)
-        options, answer = generate_fill_in_options(node_colors, original_node_colors)
-        problems.append(
-            {
-                "question": "You have a picture of a graph with multiple nodes connected by edges. Each node has a specific color, except for one. Given that no two connected nodes can have the same color, can you determine what color the uncolored (grey) node should be? Give me a letter of a valid answer.",
-                "options": options,
-                "answer": answer,
-                "asp": asp_program,
-                "image": image,
-            }
-        )
-
-    return problems
-
-
-def _generate_valid_options(valid: bool) -> tuple[list[str], str]:
-    options = ["Yes", "No"]
-    np.random.shuffle(options)
-    formatted_options = [f"{chr(65 + i)}) {options[i]}" for i in range(2)]
-    correct_option = chr(65 + options.index("Yes" if valid else "No"))
-    return formatted_options, correct_option
-
 
-def format_validity_problem(
-    graphs: list[nx.Graph],
-    asp_programs: list[str],
-    color_choices: list[list[str]],
-    valid: bool = True,
-):
-    problems = []
-
-    QUESTION = "You have a picture of a graph with multiple nodes connected by edges. Currently all nodes are grey color. Each node has to have a specific color assigned to each. Given that no two connected nodes can have the same color, can you determine if with given set of colors you can color each node so it would not break the ruleYou have a picture of a graph with multiple nodes connected by edges. Currently, all nodes are grey. Each node needs to be assigned a specific color. Given that no two connected nodes can share the same color, can you determine whether it is possible to color the graph according to this rule with the given set of colors? Give me a letter of a valid answer."
-
-    for i, graph in enumerate(graphs):
-        asp_program = asp_programs[i]
-        color_choice = color_choices[i]
-
-        image = visualize_graph(graph)
-        options, answer = _generate_valid_options(valid)
-        problems.append(
-            {
-                "question": QUESTION
-                + "\nAvailable colors:\n"
-                + ", ".join(color_choice),
-                "color_choices": color_choice,
-                "options": options,
-                "answer": answer,
-                "asp": asp_program,
-                "image": image,
-            }
+    def serialize_spec(self, spec: dict) -> str:
+        # Colors in order of first appearance, since the order of a set of
+        # strings changes from one process to the next.
+        return get_fill_in_asp(
+            graph_from_spec(spec),
+            list(dict.fromkeys(spec["original_node_colors"])),
+            spec["node_colors"],
         )
 
-    return problems
-
-
-def _remove_color_choices_from_problems(problems: list[dict]) -> list[dict]:
-    for problem in problems:
-        del problem["color_choices"]
-    return problems
-
-
-def export_data(root_dir: str, n_samples: str, fill_in: bool = False):
-    _dirname = os.path.dirname(__file__)
+    def check(self, spec: dict, models: list[list[str]]) -> bool:
+        grey_node = spec["node_colors"].index("grey")
+        return models == [[f"answer({spec['original_node_colors'][grey_node]})"]]
 
-    create_directory(root_dir)
-    if not fill_in:
-        data_dir = os.path.join(root_dir, "graph_validity")
-        create_directory(data_dir)
 
-        (
-            valid_graphs,
-            valid_asp,
-            valid_color_choices,
-            invalid_graphs,
-            invalid_asp,
-            invalid_color_choices,
-        ) = generate_validity_graphs(MAX_NODES, n_samples + 1)
+register_task(GraphValidityTask())
+register_task(GraphFillInTask())
 
-        valid_problems = format_validity_problem(
-            valid_graphs, valid_asp, valid_color_choices, valid=True
-        )
-        invalid_problems = format_validity_problem(
-            invalid_graphs, invalid_asp, invalid_color_choices, valid=False
-        )
-        valid_problem_sample = valid_problems.pop()
-        invalid_problem_sample = invalid_problems.pop()
-
-        problems = valid_problems + invalid_problems
-        np.random.shuffle(problems)
 
-        with open(
-            os.path.join(_dirname, "prompt_templates/graph_validity.txt"), "r"
-        ) as f:
-            prompt_template = f.read()
-
-        valid_prompt_template = prompt_template.replace(
-            "[[ASP]]", valid_problem_sample["asp"]
-        )
-        invalid_prompt_template = prompt_template.replace(
-            "[[ASP]]", invalid_problem_sample["asp"]
-        )
-        valid_prompt_template = valid_prompt_template.replace(
-            "[[COLORS]]", ", ".join(valid_problem_sample["color_choices"])
-        )
-        invalid_prompt_template = invalid_prompt_template.replace(
-            "[[COLORS]]", ", ".join(invalid_problem_sample["color_choices"])
-        )
-
-        with open(os.path.join(data_dir, "valid_prompt_template.txt"), "w") as f:
-            f.write(valid_prompt_template)
-
-        with open(os.path.join(data_dir, "invalid_prompt_template.txt"), "w") as f:
-            f.write(invalid_prompt_template)
-
-        valid_problem_sample["image"].savefig(
-            os.path.join(data_dir, "valid_prompt.png")
-        )
-        invalid_problem_sample["image"].savefig(
-            os.path.join(data_dir, "invalid_prompt.png")
-        )
-
-        problems = _remove_color_choices_from_problems(problems)
-        export_problems(problems, data_dir)
-
-    else:
-        data_dir = os.path.join(root_dir, "graph_fill_in")
-        create_directory(data_dir)
-
-        graphs, node_colors_list, original_colors_list = (
-            generate_fill_in_connected_graphs(MAX_NODES, n_samples + 1)
-        )
-        fill_in_problems = format_fill_in_problem(
-            graphs, node_colors_list, original_colors_list
-        )
-        sample_fill_in_problem = fill_in_problems.pop()
-        with open(
-            os.path.join(_dirname, "prompt_templates/graph_fill_in.txt"), "r"
-        ) as f:
-            prompt_template = f.read()
-
-        prompt_template = prompt_template.replace(
-            "[[ASP]]", sample_fill_in_problem["asp"]
-        )
-        prompt_template = prompt_template.replace(
-            "[[OPTIONS]]", "\n".join(sample_fill_in_problem["options"])
-        )
-        with open(os.path.join(data_dir, "prompt_template.txt"), "w") as f:
-            f.write(prompt_template)
-
-        sample_fill_in_problem["image"].savefig(
-            os.path.join(data_dir, "sample_prompt.png")
-        )
-
-        export_problems(fill_in_problems, data_dir)
+def export_data(
+    root_dir: str,
+    n_samples: str,
+    fill_in: bool = False,
+    index: GraphDedupIndex | None = None,
+    output_format: str = "json",
+):
+    task = TASKS["graph_fill_in" if fill_in else "graph_validity"]
+    export_task(task, root_dir, n_samples, output_format=output_format, index=index)
@@ -0,0 +1,172 @@
+"""
+Deduplication index for generated graph problems.
+
+Graphs are keyed by their Weisfeiler-Lehman hash computed over node labels
+(the node color, "grey" for the node to fill in) together with the set of
+available colors. WL hashes are not complete, so graphs that share a hash are
+told apart by an exact canonical form for small graphs, or by an isomorphism
+check for larger ones. The uncolored structure of every problem is kept too,
+so that a structure used by a validity problem (uncolored) is not reused by a
+fill-in problem (colored), and the other way around.
+"""
+
+from __future__ import annotations
+
+import itertools
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import networkx as nx
+
+# Exact canonical forms are computed by brute force over label-preserving
+# permutations, which stays cheap for the graph sizes used in `graph.py`.
+MAX_CANONICAL_NODES = 8
+UNCOLORED = "none"
+
+
+def _labelled_graph(graph: nx.Graph, node_colors: list[str] | None) -> nx.Graph:
+    import networkx as nx
+
+    labelled = nx.Graph()
+    for node in graph.nodes():
+        labelled.add_node(node, label=node_colors[node] if node_colors else UNCOLORED)
+    labelled.add_edges_from(graph.edges())
+    return labelled
+
+
+def canonical_form(graph: nx.Graph) -> tuple:
+    """
+    Returns a relabeling-invariant form of a graph with "label" node attributes.
+
+    Nodes are grouped by (label, degree) and only permutations inside groups
+    are tried, the lexicographically smallest edge list wins.
+    """
+    groups: dict[tuple, list] = {}
+    for node in graph.nodes():
+        invariant = (graph.nodes[node]["label"], graph.degree[node])
+        groups.setdefault(invariant, []).append(node)
+    invariants = sorted(groups)
+
+    best = None
+    for permutations in itertools.product(
+        *[itertools.permutations(groups[invariant]) for invariant in invariants]
+    ):
+        order = [node for permutation in permutations for node in permutation]
+        position = {node: i for i, node in enumerate(order)}
+        edges = sorted(
+            tuple(sorted((position[u], position[v]))) for u, v in graph.edges()
+        )
+        if best is None or edges < best:
+            best = edges
+
+    return tuple(invariants), tuple(best)
+
+
+class _IsomorphismSet:
+    """Graphs with "label" node attributes, in buckets of an invariant key."""
+
+    def __init__(self):
+        self._buckets: dict[tuple, list[nx.Graph]] = {}
+        self._canonical_forms: dict[tuple, set[tuple]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(bucket) for bucket in self._buckets.values())
+
+    def contains(self, labelled: nx.Graph, key: tuple) -> bool:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return False
+
+        if labelled.number_of_nodes() <= MAX_CANONICAL_NODES:
+            forms = self._canonical_forms.get(key)
+            if forms is None:
+                forms = self._canonical_forms[key] = {
+                    canonical_form(other) for other in bucket
+                }
+            return canonical_form(labelled) in forms
+
+        import networkx as nx
+
+        node_match = nx.algorithms.isomorphism.categorical_node_match("label", None)
+        return any(
+            nx.is_isomorphic(labelled, other, node_match=node_match) for other in bucket
+        )
+
+    def add(self, labelled: nx.Graph, key: tuple):
+        self._buckets.setdefault(key, []).append(labelled)
+        forms = self._canonical_forms.get(key)
+        if forms is not None:
+            forms.add(canonical_form(labelled))
+
+
+class GraphDedupIndex:
+    """
+    Set of graph problems seen so far, shared by the validity and fill-in tasks.
+
+    `add` returns False for a graph that is isomorphic (including node colors)
+    to one added before, or whose uncolored structure belongs to a problem of
+    the other kind, so that validity graphs (uncolored) and fill-in graphs
+    (colored) never share a structure. `contains` checks a candidate without
+    adding it, so generators can skip duplicates before solving them and only
+    add the candidates they accept.
+    """
+
+    def __init__(self, iterations: int = 3):
+        self.iterations = iterations
+        self._problems = _IsomorphismSet()
+        # Uncolored structures of the colored and of the uncolored problems.
+        self._structures = {True: _IsomorphismSet(), False: _IsomorphismSet()}
+
+    def __len__(self) -> int:
+        return len(self._problems)
+
+    def _hash(self, labelled: nx.Graph) -> str:
+        import networkx as nx
+
+        return nx.weisfeiler_lehman_graph_hash(
+            labelled, node_attr="label", iterations=self.iterations
+        )
+
+    def _entries(
+        self,
+        graph: nx.Graph,
+        node_colors: list[str] | None,
+        color_choices: list[str] | None,
+    ) -> tuple[tuple[nx.Graph, tuple], tuple[nx.Graph, tuple]]:
+        # The labelled problem and its uncolored structure, with their keys.
+        labelled = _labelled_graph(graph, node_colors)
+        wl_hash = self._hash(labelled)
+        problem = labelled, (wl_hash, tuple(sorted(color_choices or [])))
+        if not node_colors:
+            return problem, (labelled, (wl_hash,))
+
+        structure = _labelled_graph(graph, None)
+        return problem, (structure, (self._hash(structure),))
+
+    def _seen(self, problem: tuple, structure: tuple, colored: bool) -> bool:
+        other_kind = self._structures[not colored]
+        return self._problems.contains(*problem) or other_kind.contains(*structure)
+
+    def contains(
+        self,
+        graph: nx.Graph,
+        node_colors: list[str] | None = None,
+        color_choices: list[str] | None = None,
+    ) -> bool:
+        """Whether `add` would reject the graph, without adding it."""
+        problem, structure = self._entries(graph, node_colors, color_choices)
+        return self._seen(problem, structure, bool(node_colors))
+
+    def add(
+        self,
+        graph: nx.Graph,
+        node_colors: list[str] | None = None,
+        color_choices: list[str] | None = None,
+    ) -> bool:
+        problem, structure = self._entries(graph, node_colors, color_choices)
+        if self._seen(problem, structure, bool(node_colors)):
+            return False
+
+        self._problems.add(*problem)
+        self._structures[bool(node_colors)].add(*structure)
+        return True
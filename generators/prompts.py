@@ -0,0 +1,61 @@
+"""
+Prompt templates compiled once into literal text and placeholders.
+
+A template has a header, one example block and the query block, separated by
+`------` lines. Placeholders such as `[[ASP]]` are filled from a dict of values
+and the example block is repeated once per example for k-shot prompts.
+Placeholders without a value are kept, so a filled template can be filled
+again later, e.g. the query of an exported `prompt_template.txt`.
+"""
+
+import os
+import re
+from functools import lru_cache
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "prompt_templates")
+SEPARATOR = "------\n"
+PLACEHOLDER = re.compile(r"\[\[([A-Z_]+)\]\]")
+
+
+def compile_text(text: str) -> list[tuple[str, str | None]]:
+    """(literal text, placeholder name or None) pairs of a template part."""
+    parts = []
+    start = 0
+    for match in PLACEHOLDER.finditer(text):
+        parts.append((text[start : match.start()], match.group(1)))
+        start = match.end()
+    parts.append((text[start:], None))
+    return parts
+
+
+def render_text(parts: list[tuple[str, str | None]], values: dict[str, str]) -> str:
+    return "".join(
+        literal + (values.get(name, f"[[{name}]]") if name is not None else "")
+        for literal, name in parts
+    )
+
+
+class PromptTemplate:
+    def __init__(self, text: str):
+        sections = text.split(SEPARATOR)
+        if len(sections) != 3:
+            raise ValueError(
+                "Expected a header, an example and a query separated by "
+                f"{SEPARATOR.strip()!r} lines"
+            )
+        self.header, self.example, self.query = map(compile_text, sections)
+
+    def render(
+        self, examples: list[dict[str, str]], query: dict[str, str] | None = None
+    ) -> str:
+        return SEPARATOR.join(
+            [render_text(self.header, {})]
+            + [render_text(self.example, values) for values in examples]
+            + [render_text(self.query, query or {})]
+        )
+
+
+@lru_cache(maxsize=None)
+def load_prompt_template(filename: str) -> PromptTemplate:
+    with open(os.path.join(TEMPLATES_DIR, filename), "r") as f:
+        return PromptTemplate(f.read())
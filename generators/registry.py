@@ -0,0 +1,419 @@
+"""
+Registry of the logic tasks and the engine that exports them.
+
+A task works on problem specs: JSON-serializable dicts with the question, the
+options, the answer and everything needed to rebuild the problem. It implements
+four batched hooks:
+
+- `generate(n, rng)` samples n specs,
+- `verify(specs)` checks the answer of every spec with clingo,
+- `render(specs)` draws the image of every spec, augmented if the spec has an
+  `augment_seed` (see `generators.augment`),
+- `serialize(specs)` writes the ASP instance facts of every spec.
+
+`export_task` runs the hooks and writes the task directory, so a new task only
+implements the hooks to get batching, parallel rendering and the export layout.
+The specs are also saved in the compact form of `pack_spec`, so that the images
+and programs of an export can be rebuilt without generating it again, see
+`pipeline.rebuild`.
+"""
+
+import importlib
+import json
+import os
+import random
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+
+import clingo
+import numpy as np
+
+from generators.augment import augment_images
+from generators.prompts import load_prompt_template
+from generators.utils import (
+    create_directory,
+    export_problems,
+    save_image,
+)
+from pipeline import memory, metrics
+from solvers import profiles
+from solvers.clingo_solver import ClingoSolver
+
+TASK_MODULES = [
+    "generators.sudoku",
+    "generators.graph",
+    "generators.sparse_graph",
+    "generators.set_cards",
+    "generators.set_hands",
+]
+SPECS_FILENAME = "specs.jsonl"
+EXAMPLES_FILENAME = "examples.json"
+# Spec fields that only depend on how the problem is presented.
+PRESENTATION_FIELDS = ["question", "options", "answer", "layout_seed", "augment_seed"]
+# Figures rendered at once by a process, matplotlib warns when more than 20
+# figures are open.
+RENDER_BATCH = 16
+# Specs per chunk sent to a render worker.
+RENDER_CHUNK = 64
+# Memory of a render worker assumed when sizing the pool for a budget.
+WORKER_BYTES = 256 * 2**20
+
+TASKS: dict[str, "LogicTask"] = {}
+
+
+def register_task(task: "LogicTask") -> "LogicTask":
+    if task.name in TASKS:
+        raise ValueError(f"Task {task.name} is already registered")
+    TASKS[task.name] = task
+    return task
+
+
+def load_tasks() -> dict[str, "LogicTask"]:
+    """Imports the task modules, which register their tasks."""
+    for module in TASK_MODULES:
+        importlib.import_module(module)
+    return TASKS
+
+
+@contextmanager
+def seeded_globals(rng: np.random.Generator):
+    """
+    Seeds the global numpy and random generators from `rng` and restores them
+    afterwards, for tasks built on helpers and libraries (such as sudokum) that
+    only draw from the global generators.
+    """
+    states = np.random.get_state(), random.getstate()
+    seed = int(rng.integers(2**31))
+    np.random.seed(seed)
+    random.seed(seed)
+    try:
+        yield
+    finally:
+        np.random.set_state(states[0])
+        random.setstate(states[1])
+
+
+class LogicTask(ABC):
+    """
+    Base class of the tasks. Subclasses set `name` (also the name of the
+    exported directory) and `prompt_template`, and implement `base_asp`,
+    `generate`, `render_spec`, `serialize_spec` and `check`, without which
+    the task cannot be instantiated and registered.
+    """
+
+    name: str
+    prompt_template: str
+
+    @abstractmethod
+    def base_asp(self) -> str: ...
+
+    def num_specs(self, n_samples: int) -> int:
+        # One more spec than samples is generated for the prompt example.
+        return n_samples + 1
+
+    @abstractmethod
+    def generate(self, n: int, rng: np.random.Generator, **options) -> list[dict]: ...
+
+    @abstractmethod
+    def render_spec(self, spec: dict): ...
+
+    @abstractmethod
+    def serialize_spec(self, spec: dict) -> str: ...
+
+    @abstractmethod
+    def check(self, spec: dict, models: list[list[str]]) -> bool:
+        """Whether the shown atoms of (up to two) models match the answer."""
+
+    def answer_text(self, models: list[list[str]]) -> str | None:
+        """
+        Text of the correct option implied by the shown atoms of (up to two)
+        models, or None if they do not imply a single answer. Used to check
+        exported problems whose specs were not saved.
+        """
+        if len(models) != 1 or len(models[0]) != 1:
+            return None
+        atom = clingo.parse_term(models[0][0])
+        if atom.name != "answer":
+            return None
+        return " ".join(map(str, atom.arguments))
+
+    def pack_spec(self, spec: dict) -> dict:
+        """Compact JSON form of a spec, as written to `specs.jsonl`."""
+        return spec
+
+    def unpack_spec(self, packed: dict) -> dict:
+        """Inverse of `pack_spec`, also given specs that were never packed."""
+        return packed
+
+    def dedup_key(self, spec: dict) -> str:
+        """Specs with the same key describe the same problem."""
+        problem = {k: v for k, v in spec.items() if k not in PRESENTATION_FIELDS}
+        return json.dumps(problem, sort_keys=True)
+
+    def label(self, spec: dict):
+        """Class of a spec that is kept balanced when merging, if any."""
+        return None
+
+    def render(self, specs: list[dict]) -> list:
+        images = [self.render_spec(spec) for spec in specs]
+        augmented = [i for i, spec in enumerate(specs) if "augment_seed" in spec]
+        if augmented:
+            variants = augment_images(
+                [images[i] for i in augmented],
+                [specs[i]["augment_seed"] for i in augmented],
+            )
+            for i, image in zip(augmented, variants):
+                images[i] = image
+        return images
+
+    def serialize(self, specs: list[dict]) -> list[str]:
+        return [self.serialize_spec(spec) for spec in specs]
+
+    def verify(self, specs: list[dict]) -> list[bool]:
+        base_asp = self.base_asp()
+        return [
+            self.check(spec, ClingoSolver.get_models(base_asp + asp, max_models=2))
+            for spec, asp in zip(specs, self.serialize(specs))
+        ]
+
+    def split_examples(self, specs: list[dict]) -> tuple[dict[str, dict], list[dict]]:
+        """Takes the specs used as examples in the prompt templates."""
+        return {"sample": specs[-1]}, specs[:-1]
+
+    def prompt_values(self, spec: dict, asp: str) -> dict[str, str]:
+        """Values of the placeholders of a prompt example."""
+        return {
+            "ASP": self.base_asp() + asp,
+            "EXAMPLE": spec["question"],
+            "OPTIONS": "\n".join(spec["options"]),
+        }
+
+    def query_values(self, spec: dict) -> dict[str, str]:
+        """Values of the placeholders of the problem asked in a prompt."""
+        return {"PROBLEM": spec["question"], "QUESTION": "\n".join(spec["options"])}
+
+
+class ValidityTask(LogicTask):
+    """Tasks asking whether a problem has a solution, with balanced answers."""
+
+    def num_specs(self, n_samples: int) -> int:
+        return 2 * (n_samples + 1)
+
+    def check(self, spec: dict, models: list[list[str]]) -> bool:
+        return bool(models) == spec["valid"]
+
+    def answer_text(self, models: list[list[str]]) -> str:
+        return "Yes" if models else "No"
+
+    def label(self, spec: dict) -> bool:
+        return spec["valid"]
+
+    def split_examples(self, specs: list[dict]) -> tuple[dict[str, dict], list[dict]]:
+        valid = [i for i, spec in enumerate(specs) if spec["valid"]]
+        invalid = [i for i, spec in enumerate(specs) if not spec["valid"]]
+        examples = {"valid": specs[valid[-1]], "invalid": specs[invalid[-1]]}
+        rest = [
+            spec for i, spec in enumerate(specs) if i not in (valid[-1], invalid[-1])
+        ]
+        return examples, rest
+
+
+def write_specs(task: LogicTask, specs: list[dict], path: str):
+    with open(path, "w") as f:
+        for spec in specs:
+            f.write(json.dumps(task.pack_spec(spec), separators=(",", ":")) + "\n")
+
+
+def read_specs(task: LogicTask, path: str) -> list[dict]:
+    with open(path, "r") as f:
+        return [task.unpack_spec(json.loads(line)) for line in f if line.strip()]
+
+
+def write_examples(task: LogicTask, examples: dict[str, dict], path: str):
+    with open(path, "w") as f:
+        json.dump({name: task.pack_spec(spec) for name, spec in examples.items()}, f)
+
+
+def read_examples(task: LogicTask, path: str) -> dict[str, dict]:
+    with open(path, "r") as f:
+        return {name: task.unpack_spec(spec) for name, spec in json.load(f).items()}
+
+
+def problem_from_spec(spec: dict, asp: str) -> dict:
+    return {
+        "question": spec["question"],
+        "options": spec["options"],
+        "answer": spec["answer"],
+        "asp": asp,
+    }
+
+
+def _example_paths(name: str) -> tuple[str, str]:
+    if name == "sample":
+        return "prompt_template.txt", "sample_prompt.png"
+    return f"{name}_prompt_template.txt", f"{name}_prompt.png"
+
+
+def write_prompt_templates(task: LogicTask, examples: dict[str, dict], data_dir: str):
+    template = load_prompt_template(task.prompt_template)
+    for name, spec in examples.items():
+        template_path, _ = _example_paths(name)
+        asp = task.serialize([spec])[0]
+        with open(os.path.join(data_dir, template_path), "w") as f:
+            f.write(template.render([task.prompt_values(spec, asp)]))
+
+
+def render_examples(task: LogicTask, examples: dict[str, dict], data_dir: str):
+    paths = [os.path.join(data_dir, _example_paths(name)[1]) for name in examples]
+    render_to_files(task, list(examples.values()), paths)
+
+
+def render_to_files(task: LogicTask, specs: list[dict], paths: list[str]):
+    # Images are rendered and written a batch at a time, so that only one
+    # batch of figures is held in memory whatever the number of specs.
+    batches = memory.AdaptiveBatch(RENDER_BATCH)
+    start = 0
+    while start < len(specs):
+        end = start + batches.size()
+        before = memory.rss()
+        with metrics.timer("render_seconds"):
+            images = task.render(specs[start:end])
+        batches.update(len(images), memory.rss() - before)
+        for image, path in zip(images, paths[start:end]):
+            with metrics.timer("encode_seconds"):
+                save_image(image, path)
+        start = end
+
+
+def _render_chunk(
+    task: LogicTask,
+    specs: list[dict],
+    paths: list[str],
+    collect_metrics: bool,
+    labels: dict[str, str],
+    budget: int | None,
+) -> tuple[dict, int]:
+    # Runs in a worker process, whose metrics and peak memory are sent back
+    # to the parent.
+    metrics.enable(collect_metrics)
+    metrics.reset()
+    memory.set_budget(budget)
+    memory.reset_peak()
+    with metrics.scope(**labels):
+        render_to_files(task, specs, paths)
+    return metrics.snapshot(), memory.peak_rss()
+
+
+def render_all(task: LogicTask, specs: list[dict], paths: list[str], workers: int):
+    if workers <= 1 or len(specs) < 2:
+        render_to_files(task, specs, paths)
+        return
+
+    # With a memory budget the pool only gets as many workers as fit in it,
+    # and fewer chunks are kept in flight once the workers report more memory
+    # than expected.
+    free = memory.free_bytes()
+    workers = memory.in_flight(free, WORKER_BYTES, workers)
+    worker_budget = free // workers if free is not None else None
+    n_chunks = max(workers, -(-len(specs) // RENDER_CHUNK))
+    chunks = deque(np.array_split(np.arange(len(specs)), n_chunks))
+    depth = workers
+    running = set()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while chunks or running:
+            while chunks and len(running) < depth:
+                chunk = chunks.popleft()
+                running.add(
+                    executor.submit(
+                        _render_chunk,
+                        task,
+                        [specs[i] for i in chunk],
+                        [paths[i] for i in chunk],
+                        metrics.is_enabled(),
+                        metrics.current_scope(),
+                        worker_budget,
+                    )
+                )
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                snapshot, peak = future.result()
+                metrics.merge(snapshot)
+                metrics.observe("peak_rss_bytes", peak, stage="render_worker")
+                depth = memory.in_flight(memory.free_bytes(), peak, workers)
+
+
+@contextmanager
+def _stage(name: str):
+    # Time and peak memory of an export stage.
+    with metrics.timer("stage_seconds", stage=name), memory.track(name):
+        yield
+
+
+def export_task(
+    task: LogicTask,
+    root_dir: str,
+    n_samples: int,
+    rng: np.random.Generator | None = None,
+    output_format: str = "json",
+    workers: int = 1,
+    verify: bool = False,
+    save_specs: bool = True,
+    augment: bool = False,
+    **options,
+) -> list[dict]:
+    """
+    Generates the specs of a task and exports them to `<root_dir>/<task.name>`.
+    Extra options are passed to `task.generate`. Returns the exported specs,
+    which are also written to `specs.jsonl` in the order of the problem ids,
+    and the example specs to `examples.json`, unless `save_specs` is unset.
+    With `augment` every problem image is augmented with a seed of its own.
+    """
+    rng = rng or np.random.default_rng(np.random.randint(2**31))
+    data_dir = os.path.join(root_dir, task.name)
+    images_dir = os.path.join(data_dir, "images")
+    create_directory(data_dir)
+    create_directory(images_dir)
+
+    with metrics.scope(task=task.name), profiles.for_task(task.name):
+        with _stage("generate"):
+            specs = task.generate(task.num_specs(n_samples), rng, **options)
+        metrics.count("specs", len(specs))
+        if verify:
+            with _stage("verify"):
+                verified = task.verify(specs)
+            if not all(verified):
+                raise AssertionError(
+                    f"The solver disagrees with some {task.name} answers"
+                )
+
+        examples, specs = task.split_examples(specs)
+        np.random.shuffle(specs)
+        if augment:
+            # The seeds are saved with the specs, so rerendered images get the
+            # same variants.
+            for spec, seed in zip(specs, rng.integers(2**31, size=len(specs))):
+                spec["augment_seed"] = int(seed)
+
+        base_asp = task.base_asp()
+        write_prompt_templates(task, examples, data_dir)
+        render_examples(task, examples, data_dir)
+
+        image_paths = [
+            os.path.join(images_dir, f"problem_{i}.png") for i in range(len(specs))
+        ]
+        with _stage("render"):
+            render_all(task, specs, image_paths, workers)
+
+        with _stage("serialize"):
+            programs = task.serialize(specs)
+        problems = [problem_from_spec(spec, asp) for spec, asp in zip(specs, programs)]
+        with _stage("export"):
+            export_problems(problems, data_dir, base_asp, output_format=output_format)
+
+    if save_specs:
+        write_specs(task, specs, os.path.join(data_dir, SPECS_FILENAME))
+        write_examples(task, examples, os.path.join(data_dir, EXAMPLES_FILENAME))
+
+    return specs
@@ -4,20 +4,14 @@ The code is adapted from the notebook file
 `experiments/set/set_classification.ipynb` within this repository.
 """
 
-import copy
-import os
-import random
-
-import matplotlib.pyplot as plt
 import numpy as np
 
-from generators.set_game.set_game import SetGame
-
-np.random.seed(0)
-random.seed(0)
-
-from generators.utils import create_directory, export_problems
-from solvers.clingo_solver import ClingoSolver
+from generators.registry import TASKS, ValidityTask, export_task, register_task
+from generators.set_game.atlas import compose_hand
+from generators.set_game.engine import card_attributes
+from generators.set_game.hand_index import load_hand_index
+from generators.utils import generate_valid_options
+from solvers.asp_instance import AspInstance
 
 """
 Adds the card attributes from the txt files to a template
@@ -35,114 +29,143 @@ SHADING = "shading"
 NUM_CARDS = 4
 NUM_ROWS = 2
 NUM_COLS = int(np.ceil(NUM_CARDS / NUM_ROWS))
+IMAGE_SCALE = 3
 
 
-def create_asp_file(
-    cards,
-    input_use_numerical_numbers=False,
+ATTRIBUTE_VALUES = {
+    NUMBER: ["one", "two", "three"],
+    SHAPE: ["oval", "squiggle", "diamond"],
+    COLOR: ["red", "green", "purple"],
+    SHADING: ["solid", "striped", "empty"],
+}
+
+
+def create_rules_asp(
     output_use_numerical_numbers=False,
     card_proposition="card_in_play",
-    input_order=[NUMBER, COLOR, SHADING, SHAPE],
     output_order=[NUMBER, COLOR, SHADING, SHAPE],
 ):
     """
-        Creates an ASP file with the card attributes from the input list of cards.
-    s
-        Parameters
-        ----------
-        cards : list of str
-            List of strings with the card attributes. Each string should have the
-            format following `input_order`
+    Creates the ASP rules shared by all SET tasks: the attribute values, the
+    card object and the sets among the cards in play. Parameters are the same
+    as in `create_base_asp`.
+
+    The sets are derived with the third-card rule: the value indices of an
+    attribute are all the same or all different exactly when their sum is a
+    multiple of 3, so every pair of cards determines the only card completing
+    a set with it. This grounds one rule per pair of cards instead of joining
+    all triples of cards.
+    """
+    values = dict(ATTRIBUTE_VALUES)
+    if output_use_numerical_numbers:
+        values[NUMBER] = ["1", "2", "3"]
+
+    strings = [
+        "% Defining all possible numbers, shapes, colors, and shadings with an index for each value."
+    ]
+    for name in [NUMBER, SHAPE, COLOR, SHADING]:
+        strings.append(
+            " ".join(
+                f"value({name}, {value}, {index})."
+                for index, value in enumerate(values[name])
+            )
+        )
+    strings.append("\n")
 
-        input_use_numerical_numbers : bool
-            If True, the input cards use numerical numbers.
+    capital_props = [name.capitalize() for name in output_order]
+    names = ", ".join(["Id"] + [f"{cname}Name" for cname in capital_props])
+    indices = ", ".join(
+        [
+            f"value({name}, {cname}Name, {cname})"
+            for name, cname in zip(output_order, capital_props)
+        ]
+    )
+    strings.append(
+        "% Defining the card object. Card has an id and the value indices of its attributes."
+    )
+    strings.append(
+        f"card(Id, ({', '.join(capital_props)})) :- {card_proposition}(({names})), {indices}."
+    )
 
-        output_use_numerical_numbers : bool
-            If True, the output cards use numerical numbers.
+    # String of variables for the card attributes, e.g. "Number1, Color1, Shading1, Shape1".
+    # The order can be changed based on `output_order`.
+    capital_variables = lambda i: ", ".join(name + str(i) for name in capital_props)
+    third_card = ", ".join(f"(6 - {name}1 - {name}2) \\ 3" for name in capital_props)
 
-        card_proposition : str
-            Name of the card proposition.
+    strings.append(f"""
+    % The cards in a set have the same number or all different numbers, the same shape or all different shapes,
+    % the same color or all different colors, and the same shading or all different shadings.
+    % So the value indices of every attribute sum to a multiple of 3, and two cards determine the third card of a set.
+    completing_card(C1, C2, ({third_card})) :-
+        card(C1, ({capital_variables(1)})),
+        card(C2, ({capital_variables(2)})),
+        C1 < C2.
 
-        input_order : list of str (using the constants NUMBER, COLOR, SHAPE, SHADING)
-            Order of the card attributes in the input.
+    % A set is valid if the card completing two cards in play is also in play.
+    valid_set_in_play(C1, C2, C3) :- completing_card(C1, C2, Card), card(C3, Card), C2 < C3.
+    """)
 
-        output_order : list of str (using the constants NUMBER, COLOR, SHAPE, SHADING)
-            Order of the card attributes in the output.
+    return "\n".join(strings)
 
 
-        Returns a list of strings which can be written to a .asp file.
+def create_base_asp(
+    output_use_numerical_numbers=False,
+    card_proposition="card_in_play",
+    output_order=[NUMBER, COLOR, SHADING, SHAPE],
+):
     """
-    strings = ["% Defining all possible numbers, shapes, colors, and shadings."]
+    Creates the base ASP encoding shared by all hands: the attribute domains,
+    the card object and the SET rules. The cards themselves are added by
+    `create_instance_asp`.
 
-    if output_use_numerical_numbers:
-        strings.append("number(1; 2; 3).")
-    else:
-        strings.append("number(one; two; three).")
+    Parameters
+    ----------
+    output_use_numerical_numbers : bool
+        If True, the output cards use numerical numbers.
 
-    strings.append("shape(oval; squiggle; diamond).")
-    strings.append("color(red; green; purple).")
-    strings.append("shading(solid; striped; empty).")
-    strings.append("\n")
-
-    strings.append("% Defining the card ids.")
-    strings.append(f"card_id(1..{NUM_CARDS}).")
-
-    capital_props = [name.capitalize() for name in output_order]
-    propositions = ", ".join(
-        ["card_id(Id)"]
-        + [f"{name}({cname})" for name, cname in zip(output_order, capital_props)]
-    )
-    string_capitals = ", ".join(["Id"] + capital_props)
-    strings.append(
-        "% Defining the card object. Card has number of objects, shape, color, and shading."
-    )
-    strings.append(f"card(C) :- {propositions}, C = ({string_capitals}).")
+    card_proposition : str
+        Name of the card proposition.
 
-    # String of variables for the card attributes, e.g. "Number1, Shape1, Color1, Shading1".
-    # The order can be changed based on `output_order`.
-    capital_variables = lambda i: ", ".join(
-        ["_"] + [name + str(i) for name in capital_props]
-    )
+    output_order : list of str (using the constants NUMBER, COLOR, SHAPE, SHADING)
+        Order of the card attributes in the output.
 
-    strings.append(
-        f"""
-    % All cards in a set must have the same number or all different numbers.
-    all_same_or_all_different(A, B, C) :- A = B, B = C, number(A), number(B), number(C).
-    all_same_or_all_different(A, B, C) :- A < B < C, number(A), number(B), number(C).
 
-    % All cards in a set must have the same shape or all different shapes.
-    all_same_or_all_different(A, B, C) :- A = B, B = C, shape(A), shape(B), shape(C).
-    all_same_or_all_different(A, B, C) :- A != B, A != C, B != C, shape(A), shape(B), shape(C).
+    Returns a string which can be written to a .asp file.
+    """
+    strings = [
+        create_rules_asp(output_use_numerical_numbers, card_proposition, output_order)
+    ]
 
-    % All cards in a set must have the same color or all different colors.
-    all_same_or_all_different(A, B, C) :- A = B, B = C, color(A), color(B), color(C).
-    all_same_or_all_different(A, B, C) :- A != B, A != C, B != C, color(A), color(B), color(C).
+    strings.append("% The set is valid if there is a valid set in play. \n")
+    strings.append(":- not valid_set_in_play(_, _, _).")
 
-    % All cards in a set must have the same shading or all different shadings.
-    all_same_or_all_different(A, B, C) :- A = B, B = C, shading(A), shading(B), shading(C).
-    all_same_or_all_different(A, B, C) :- A != B, A != C, B != C, shading(A), shading(B), shading(C).
+    return "\n".join(strings)
 
-    % A set is valid if the cards have the same number or all different numbers, the same shape or all different shapes,
-    % the same color or all different colors, and the same shading or all different shadings.
-    valid_set(C1, C2, C3) :-
-        card(C1), card(C2), card(C3), C1 != C2, C1 != C3, C2 != C3,
-        C1 = ({capital_variables(1)}),
-        C2 = ({capital_variables(2)}),
-        C3 = ({capital_variables(3)}),
-        all_same_or_all_different(Number1, Number2, Number3),
-        all_same_or_all_different(Shape1, Shape2, Shape3),
-        all_same_or_all_different(Color1, Color2, Color3),
-        all_same_or_all_different(Shading1, Shading2, Shading3).
-
-    % A set is valid if the cards have the same number or all different numbers, the same shape or all different shapes,
-    valid_set_in_play(C1, C2, C3) :-
-        {card_proposition}(C1), {card_proposition}(C2), {card_proposition}(C3),
-        valid_set(C1, C2, C3).
 
+def create_instance(
+    cards,
+    input_use_numerical_numbers=False,
+    output_use_numerical_numbers=False,
+    card_proposition="card_in_play",
+    input_order=[NUMBER, COLOR, SHADING, SHAPE],
+    output_order=[NUMBER, COLOR, SHADING, SHAPE],
+    base: str | None = None,
+) -> AspInstance:
     """
-    )
+    Creates the instance facts for the input list of cards: the card ids and
+    the cards in play. Parameters are the same as in `create_asp_file`, `base`
+    replaces the validity encoding of `create_base_asp` for other tasks.
+    """
+    if base is None:
+        base = create_base_asp(
+            output_use_numerical_numbers, card_proposition, output_order
+        )
+    instance = AspInstance(base.replace("    ", ""))
+
+    instance.comment("Defining the card ids.")
+    instance.add_facts("card_id", [(id + 1,) for id in range(len(cards))])
 
-    strings.append("% The cards in play.")
+    instance.comment("The cards in play.")
 
     # Change the input's order and names of the attributes
     for id, card in enumerate(cards):
@@ -162,152 +185,160 @@ def create_asp_file(
                 card = card.replace(f, t)
 
         # Change the order of the card attributes to match with the card proposition.
-        attrs = card.replace("(", "").replace(")", "").replace(" ", "").split(",")
+        attrs = (
+            card.replace("(", "")
+            .replace(")", "")
+            .replace(" ", "")
+            .replace("'", "")
+            .split(",")
+        )
 
         index_mapping = {element: idx for idx, element in enumerate(input_order)}
         indices = [index_mapping[element] for element in output_order]
 
         ordered_card = [attrs[index] for index in indices]
-        ordered_card.insert(0, str(id + 1))
-
-        string_card = ", ".join(ordered_card).replace("'", "")
+        ordered_card = [int(attr) if attr.isdigit() else attr for attr in ordered_card]
 
-        strings.append(f"{card_proposition}(({string_card})).")
-
-    strings.append("\n")
-    strings.append("% The set is valid if there is a valid set in play. \n")
-    strings.append(":- not valid_set_in_play(_, _, _).")
-
-    return "\n".join(strings)
+        instance.add_fact(card_proposition, (id + 1, *ordered_card))
 
+    return instance
 
-def generate_asp(setgame) -> str:
-    hand = setgame.state.dealt_cards
-    cards = [str(setgame.attributes_of_card(*card)) for card in hand]
-
-    asp = create_asp_file(cards)
-    asp = asp.replace("    ", "")
-    return asp
 
+def create_instance_asp(
+    cards,
+    input_use_numerical_numbers=False,
+    output_use_numerical_numbers=False,
+    card_proposition="card_in_play",
+    input_order=[NUMBER, COLOR, SHADING, SHAPE],
+    output_order=[NUMBER, COLOR, SHADING, SHAPE],
+):
+    return create_instance(
+        cards,
+        input_use_numerical_numbers,
+        output_use_numerical_numbers,
+        card_proposition,
+        input_order,
+        output_order,
+    ).to_asp()
 
-def generate_image(setgame) -> plt.Figure:
-    hand = setgame.state.dealt_cards
 
-    fig, axarr = plt.subplots(nrows=NUM_ROWS, ncols=NUM_COLS)
+def create_asp_file(
+    cards,
+    input_use_numerical_numbers=False,
+    output_use_numerical_numbers=False,
+    card_proposition="card_in_play",
+    input_order=[NUMBER, COLOR, SHADING, SHAPE],
+    output_order=[NUMBER, COLOR, SHADING, SHAPE],
+):
+    """
+    Creates an ASP file with the card attributes from the input list of cards.
 
-    for i in range(len(hand)):
-        card = hand[i]
-        row = i // NUM_COLS
-        col = i % NUM_COLS
-        axarr[row, col].imshow(setgame.image_of_card(card[0], card[1]))
-        axarr[row, col].axis("off")
+    Parameters
+    ----------
+    cards : list of str
+        List of strings with the card attributes. Each string should have the
+        format following `input_order`
 
-    return fig
+    input_use_numerical_numbers : bool
+        If True, the input cards use numerical numbers.
 
+    output_use_numerical_numbers : bool
+        If True, the output cards use numerical numbers.
 
-def duplicate_cards(setgame):
-    _setgame = copy.deepcopy(setgame)
-    current_state = _setgame.state.dealt_cards
+    card_proposition : str
+        Name of the card proposition.
 
-    for i in range(random.randint(1, NUM_CARDS)):
-        # randaomly duplicate a card and replace it with a new card
-        card_to_duplicate = np.random.randint(0, NUM_CARDS)
-        card_to_replace = random.choice(
-            [i for i in range(NUM_CARDS) if i != card_to_duplicate]
-        )
-        new_card = _setgame.state.dealt_cards[card_to_duplicate]
-        current_state[card_to_replace] = new_card
+    input_order : list of str (using the constants NUMBER, COLOR, SHAPE, SHADING)
+        Order of the card attributes in the input.
 
-    return _setgame
+    output_order : list of str (using the constants NUMBER, COLOR, SHAPE, SHADING)
+        Order of the card attributes in the output.
 
 
-def generate_games(valid: bool, n_samples: int):
-    games = []
+    Returns a string which can be written to a .asp file.
+    """
+    base = create_base_asp(
+        output_use_numerical_numbers,
+        card_proposition,
+        output_order,
+    )
+    instance = create_instance_asp(
+        cards,
+        input_use_numerical_numbers,
+        output_use_numerical_numbers,
+        card_proposition,
+        input_order,
+        output_order,
+    )
+    return base + "\n" + instance
 
-    while len(games) < n_samples:
-        setgame = SetGame()
-        _ = setgame.init_state(num_cards=NUM_CARDS, shuffle=True)
-        if valid:
-            games.append(setgame)
-        else:
-            _setgame = duplicate_cards(setgame)
-            asp = generate_asp(_setgame)
-            if not ClingoSolver.solve(asp):
-                games.append(_setgame)
 
-    return games
+def generate_base_asp() -> str:
+    return create_base_asp().replace("    ", "")
 
 
-def _generate_valid_options(valid: bool) -> tuple[list[str], str]:
-    options = ["Yes", "No"]
-    np.random.shuffle(options)
-    formatted_options = [f"{chr(65 + i)}) {options[i]}" for i in range(2)]
-    correct_option = chr(65 + options.index("Yes" if valid else "No"))
-    return formatted_options, correct_option
+def generate_instance(hand) -> AspInstance:
+    cards = [str(card_attributes(card)) for card in hand]
 
+    return create_instance(cards)
 
-def format_problems(games, valid: bool) -> list[dict]:
-    problems = []
 
-    QUESTION = "You have a picture of SET card game deck. In the game, certain combinations of three cards are said to make up a "set". A set consists of three cards satisfying all of these conditions: they all have the same number or have three different numbers, shapes, shadings or colors. Can you tell if such set exists?"
+def generate_asp(hand) -> str:
+    return generate_instance(hand).to_asp()
 
-    for game in games:
-        asp = generate_asp(game)
-        image = generate_image(game)
-        options, answer = _generate_valid_options(valid)
 
-        problems.append(
-            {
-                "question": QUESTION,
-                "options": options,
-                "answer": answer,
-                "asp": asp,
-                "image": image,
-            }
-        )
+def generate_image(hand) -> np.ndarray:
+    return compose_hand(hand, NUM_ROWS, NUM_COLS, scale=IMAGE_SCALE)
 
-    return problems
 
+def generate_games(
+    valid: bool, n_samples: int, rng: np.random.Generator | None = None
+) -> np.ndarray:
+    """
+    Draws hands uniformly among the hands with at least one set if `valid`,
+    otherwise among the hands without a set.
+    """
+    rng = rng or np.random.default_rng(np.random.randint(2**31))
+    index = load_hand_index(NUM_CARDS)
 
-def export_data(root_dir: str, n_samples: int):
-    _dirname = os.path.dirname(__file__)
-    create_directory(root_dir)
+    return index.sample(int(valid), n_samples, rng, at_least=valid)
 
-    data_dir = os.path.join(root_dir, "set_validity")
-    create_directory(data_dir)
 
-    valid_games = generate_games(valid=True, n_samples=n_samples + 1)
-    invalid_games = generate_games(valid=False, n_samples=n_samples + 1)
+QUESTION = 'You have a picture of SET card game deck. In the game, certain combinations of three cards are said to make up a "set". A set consists of three cards satisfying all of these conditions: they all have the same number or have three different numbers, shapes, shadings or colors. Can you tell if such set exists?'
 
-    valid_problems = format_problems(valid_games, valid=True)
-    invalid_problems = format_problems(invalid_games, valid=False)
 
-    valid_problem_sample = valid_problems.pop()
-    invalid_problem_sample = invalid_problems.pop()
+class SetValidityTask(ValidityTask):
+    name = "set_validity"
+    prompt_template = "set_validity.txt"
 
-    all_problems = valid_problems + invalid_problems
-    np.random.shuffle(all_problems)
+    def base_asp(self) -> str:
+        return generate_base_asp() + "\n"
 
-    with open(os.path.join(_dirname, "prompt_templates/set_validity.txt"), "r") as f:
-        prompt_template = f.read()
+    def generate(self, n: int, rng: np.random.Generator) -> list[dict]:
+        specs = []
+        for valid in [True, False]:
+            for hand in generate_games(valid, n // 2, rng):
+                options, answer = generate_valid_options(valid, rng)
+                specs.append(
+                    {
+                        "question": QUESTION,
+                        "options": options,
+                        "answer": answer,
+                        "hand": hand.tolist(),
+                        "valid": valid,
+                    }
+                )
+        return specs
 
-    valid_prompt_template = prompt_template.replace(
-        "[[ASP]]", valid_problem_sample["asp"]
-    )
-    invalid_prompt_template = prompt_template.replace(
-        "[[ASP]]", invalid_problem_sample["asp"]
-    )
+    def render_spec(self, spec: dict) -> np.ndarray:
+        return generate_image(spec["hand"])
 
-    with open(os.path.join(data_dir, "valid_prompt_template.txt"), "w") as f:
-        f.write(valid_prompt_template)
+    def serialize_spec(self, spec: dict) -> str:
+        return generate_asp(spec["hand"])
 
-    with open(os.path.join(data_dir, "invalid_prompt_template.txt"), "w") as f:
-        f.write(invalid_prompt_template)
 
-    valid_problem_sample["image"].savefig(os.path.join(data_dir, "valid_prompt.png"))
-    invalid_problem_sample["image"].savefig(
-        os.path.join(data_dir, "invalid_prompt.png")
-    )
+register_task(SetValidityTask())
 
-    export_problems(all_problems, data_dir)
 
+def export_data(root_dir: str, n_samples: int, output_format: str = "json"):
+    export_task(TASKS["set_validity"], root_dir, n_samples, output_format=output_format)
@@ -0,0 +1,97 @@
+"""
+Card atlas: the 81 card tiles of `all-cards.png` sliced once into a
+contiguous (81, height, width, channels) uint8 array.
+
+The atlas is cached as a `.npy` file next to the card sheet and loaded with
+`mmap_mode="r"`, so worker processes share the same pages instead of each
+decoding the PNG. Hands are composed by placing tiles directly into an array.
+"""
+
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from generators.set_game.set_game import (
+    CARD_HEIGHT,
+    CARD_SHEET_PATH,
+    CARD_WIDTH,
+    HSPACE,
+    LEFT_MARGIN,
+    TOP_MARGIN,
+    VSPACE,
+    load_card_sheet,
+)
+
+ATLAS_PATH = os.path.splitext(CARD_SHEET_PATH)[0] + ".npy"
+BACKGROUND = 255
+
+
+def build_card_atlas() -> np.ndarray:
+    sheet = load_card_sheet()
+    rows, cols = np.divmod(np.arange(81), 9)
+    # Same geometry as `SetGame.image_of_card`.
+    tops = LEFT_MARGIN + rows * (CARD_HEIGHT + HSPACE)
+    lefts = TOP_MARGIN + cols * (CARD_WIDTH + VSPACE)
+
+    tiles = np.stack(
+        [
+            sheet[top : top + CARD_HEIGHT, left : left + CARD_WIDTH]
+            for top, left in zip(tops, lefts)
+        ]
+    )
+    return np.ascontiguousarray(np.round(tiles * 255).astype(np.uint8))
+
+
+@lru_cache(maxsize=None)
+def load_card_atlas(path: str = ATLAS_PATH) -> np.ndarray:
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(
+        CARD_SHEET_PATH
+    ):
+        # Write to a temporary file first so that concurrent workers never
+        # map a partially written atlas.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, build_card_atlas())
+        os.replace(tmp_path, path)
+
+    return np.load(path, mmap_mode="r")
+
+
+def card_index(card) -> int:
+    """Index of a card given as an index or as a (row, col) sheet position."""
+    if isinstance(card, (tuple, list)):
+        return int(card[0]) * 9 + int(card[1])
+    return int(card)
+
+
+def compose_hand(
+    cards, nrows: int, ncols: int, padding: int = 4, scale: int = 1
+) -> np.ndarray:
+    """
+    Places the card tiles on an (nrows, ncols) grid and returns the image as
+    an (H, W, channels) uint8 array. Empty grid cells are left blank.
+    """
+    atlas = load_card_atlas()
+    indices = [card_index(card) for card in cards]
+    if len(indices) > nrows * ncols:
+        raise ValueError(f"{len(indices)} cards do not fit a {nrows}x{ncols} grid")
+
+    tiles = np.full((nrows * ncols,) + atlas.shape[1:], BACKGROUND, dtype=np.uint8)
+    tiles[: len(indices)] = atlas[indices]
+    tiles = np.pad(
+        tiles,
+        ((0, 0), (padding, padding), (padding, padding), (0, 0)),
+        constant_values=BACKGROUND,
+    )
+
+    _, height, width, channels = tiles.shape
+    image = (
+        tiles.reshape(nrows, ncols, height, width, channels)
+        .transpose(0, 2, 1, 3, 4)
+        .reshape(nrows * height, ncols * width, channels)
+    )
+    if scale > 1:
+        image = image.repeat(scale, axis=0).repeat(scale, axis=1)
+
+    return image
@@ -0,0 +1,184 @@
+"""
+Vectorized version of the `SetGame` environment that steps B games at once.
+
+Cards are integer indices `row * 9 + col` into the card sheet, and all state
+lives in NumPy arrays. Observations are computed through integer lookup tables
+instead of the string encodings used by `SetGame.str_encode_attributes`, but
+they use the same `partial_voc` vocabulary, so both environments produce the
+same observations for the same states and actions.
+"""
+
+from math import comb
+
+import numpy as np
+
+from generators.set_game.set_game import PARTIAL_ATTRS
+
+NUM_CARD_TYPES = 81
+NUM_ATTRIBUTES = 4
+
+# Attributes of every card in the order of `SetGame.attributes_of_card`:
+# number, color, pattern and shape, each as an index in 0..2.
+_rows, _cols = np.divmod(np.arange(NUM_CARD_TYPES), 9)
+CARD_ATTRIBUTES = np.stack([_rows % 3, _cols // 3, _cols % 3, _rows // 3], axis=1)
+
+
+def _partial_code_table() -> np.ndarray:
+    # Maps an attribute group (a, b, c) with values in {-1, 0, 1} to its index
+    # in `PARTIAL_ATTRS` through the code 9 * (a + 1) + 3 * (b + 1) + (c + 1).
+    # Codes of impossible groups map to -1.
+    table = np.full(27, -1, dtype=np.int64)
+    values = {"*": -1, "0": 0, "1": 1}
+    for index, word in enumerate(PARTIAL_ATTRS):
+        a, b, c = (values[v] for v in word[1:-1].split(","))
+        table[9 * (a + 1) + 3 * (b + 1) + (c + 1)] = index
+    return table
+
+
+PARTIAL_CODE_TO_VOC = _partial_code_table()
+_CODE_WEIGHTS = np.array([9, 3, 1])
+
+# Partial attribute columns forgotten when the card in focus position A, B or C
+# changes (the pairs AB and AC, AB and BC, AC and BC of every attribute).
+_FORGET_COLUMNS = np.zeros((3, 12), dtype=bool)
+_FORGET_COLUMNS[0, [0, 1, 3, 4, 6, 7, 9, 10]] = True
+_FORGET_COLUMNS[1, [0, 2, 3, 5, 6, 8, 9, 11]] = True
+_FORGET_COLUMNS[2, [1, 2, 4, 5, 7, 8, 10, 11]] = True
+
+
+def third_card(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """Returns the card that completes a set with each pair of cards."""
+    attributes = (-CARD_ATTRIBUTES[first] - CARD_ATTRIBUTES[second]) % 3
+    number, color, pattern, shape = np.moveaxis(attributes, -1, 0)
+    return (shape * 3 + number) * 9 + color * 3 + pattern
+
+
+def focus_indices(num_cards: int) -> np.ndarray:
+    # Same order as `SetGame.State.focus_indices`.
+    return np.array(
+        [
+            [i, j, k]
+            for i in range(num_cards)
+            for j in range(i + 1, num_cards)
+            for k in range(num_cards)
+            if k != i and k != j
+        ]
+    )
+
+
+class BatchedSetGame:
+    def __init__(
+        self,
+        batch_size: int,
+        num_cards: int = 12,
+        rng: np.random.Generator | None = None,
+    ):
+        self.batch_size = batch_size
+        self.num_cards = num_cards
+        self.rng = rng or np.random.default_rng(np.random.randint(2**31))
+
+        self.focus_indices = focus_indices(num_cards)
+        self.set_rewards([3 * comb(num_cards, 3), -24, -1, -1])
+
+        self.num_actions = 3
+        self.state_dimension = NUM_ATTRIBUTES
+        self.state_values = len(PARTIAL_ATTRS)
+
+        self.dealt_cards = np.zeros((batch_size, num_cards), dtype=np.int64)
+        self.current_focus = np.zeros(batch_size, dtype=np.int64)
+        self.partial_attributes = np.full((batch_size, 12), -1, dtype=np.int8)
+        self.attribute_ind = np.zeros(batch_size, dtype=np.int64)
+
+    def set_rewards(self, rewards):
+        (
+            self.set_reward,
+            self.notset_reward,
+            self.swap_reward,
+            self.default_reward,
+        ) = rewards
+
+    def deal(self, n: int) -> np.ndarray:
+        """Deals n hands that each contain at least one set, like `init_state`."""
+        first = self.rng.integers(NUM_CARD_TYPES, size=n)
+        second = (first + self.rng.integers(1, NUM_CARD_TYPES, size=n)) % NUM_CARD_TYPES
+        planted = np.stack([first, second, third_card(first, second)], axis=1)
+
+        # The remaining cards are the lowest random keys among the cards that
+        # are not part of the planted set.
+        keys = self.rng.random((n, NUM_CARD_TYPES))
+        np.put_along_axis(keys, planted, 2.0, axis=1)
+        others = np.argsort(keys, axis=1)[:, : self.num_cards - 3]
+
+        hands = np.concatenate([planted, others], axis=1)
+        order = np.argsort(self.rng.random(hands.shape), axis=1)
+        return np.take_along_axis(hands, order, axis=1)
+
+    def reset(self, mask: np.ndarray | None = None):
+        if mask is None:
+            mask = np.ones(self.batch_size, dtype=bool)
+
+        self.dealt_cards[mask] = self.deal(int(mask.sum()))
+        self.current_focus[mask] = 0
+        self.partial_attributes[mask] = -1
+        self.attribute_ind[mask] = 0
+
+        return (
+            self.observations(),
+            np.zeros(self.batch_size),
+            np.zeros(self.batch_size, dtype=bool),
+        )
+
+    def focus_triples(self) -> np.ndarray:
+        positions = self.focus_indices[self.current_focus]
+        return np.take_along_axis(self.dealt_cards, positions, axis=1)
+
+    def focus_attributes(self) -> np.ndarray:
+        """(B, 12) equalities ordered as in `tabulate_attributes_for_triple`."""
+        attributes = CARD_ATTRIBUTES[self.focus_triples()]
+        a, b, c = attributes[:, 0], attributes[:, 1], attributes[:, 2]
+        return np.stack([a == b, a == c, b == c], axis=2).reshape(-1, 12)
+
+    def triples_are_sets(self) -> np.ndarray:
+        equal = self.focus_attributes().reshape(-1, NUM_ATTRIBUTES, 3)
+        return (equal.all(axis=2) | ~equal.any(axis=2)).all(axis=1)
+
+    def observations(self) -> np.ndarray:
+        groups = self.partial_attributes.reshape(-1, NUM_ATTRIBUTES, 3) + 1
+        return PARTIAL_CODE_TO_VOC[groups @ _CODE_WEIGHTS]
+
+    def step(self, actions: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        actions = np.asarray(actions)
+        rewards = np.zeros(self.batch_size)
+        dones = np.zeros(self.batch_size, dtype=bool)
+
+        # Measure attribute
+        measure = np.flatnonzero(actions == 0)
+        column = self.attribute_ind[measure]
+        self.partial_attributes[measure, column] = self.focus_attributes()[
+            measure, column
+        ]
+        self.attribute_ind[measure] = (column + 1) % 12
+        rewards[measure] = self.default_reward
+
+        # Swap in a new card
+        swap = np.flatnonzero(actions == 1)
+        previous = self.focus_indices[self.current_focus[swap]]
+        self.current_focus[swap] = (self.current_focus[swap] + 1) % len(
+            self.focus_indices
+        )
+        changed = previous != self.focus_indices[self.current_focus[swap]]
+        forget = (changed[:, :, None] & _FORGET_COLUMNS[None]).any(axis=1)
+        self.partial_attributes[swap] = np.where(
+            forget, -1, self.partial_attributes[swap]
+        )
+        rewards[swap] = self.swap_reward
+
+        # Declare SET!
+        declare = actions == 2
+        is_set = self.triples_are_sets()
+        rewards[declare] = np.where(
+            is_set[declare], self.set_reward, self.notset_reward
+        )
+        dones[declare] = is_set[declare]
+
+        return self.observations(), rewards, dones
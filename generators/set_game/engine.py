@@ -0,0 +1,57 @@
+"""
+Native SET engine on card indices `row * 9 + col` of the card sheet.
+
+Any two cards determine the only card that completes a set with them, so the
+sets of a hand are found by looking up the third card of every pair. This takes
+O(n^2) lookups instead of checking all O(n^3) triples of the hand.
+"""
+
+import numpy as np
+
+from generators.set_game.batched import CARD_ATTRIBUTES, NUM_CARD_TYPES, third_card
+
+# Attribute names in the order of `SetGame.attributes_of_card`.
+NUMBERS = ["one", "two", "three"]
+COLORS = ["red", "green", "purple"]
+PATTERNS = ["empty", "striped", "solid"]
+SHAPES = ["diamond", "oval", "squiggle"]
+
+
+def card_attributes(card: int) -> tuple[str, str, str, str]:
+    number, color, pattern, shape = CARD_ATTRIBUTES[card]
+    return (NUMBERS[number], COLORS[color], PATTERNS[pattern], SHAPES[shape])
+
+
+def deal_hand(num_cards: int, rng: np.random.Generator) -> np.ndarray:
+    return rng.choice(NUM_CARD_TYPES, size=num_cards, replace=False)
+
+
+def find_sets(hand) -> list[tuple[int, int, int]]:
+    """
+    Positions `(i, j, k)` with `i < j < k` of every set in a hand of distinct
+    cards, in lexicographic order.
+    """
+    hand = np.asarray(hand)
+    if len(np.unique(hand)) != len(hand):
+        raise ValueError("The cards of a hand must be distinct")
+
+    position = np.full(NUM_CARD_TYPES, -1)
+    position[hand] = np.arange(len(hand))
+
+    first, second = np.triu_indices(len(hand), k=1)
+    third = position[third_card(hand[first], hand[second])]
+    # Every set is found from each of its three pairs, keep the one where the
+    # third card comes last.
+    found = third > second
+
+    return list(
+        zip(
+            first[found].tolist(),
+            second[found].tolist(),
+            third[found].tolist(),
+        )
+    )
+
+
+def count_sets(hand) -> int:
+    return len(find_sets(hand))
@@ -0,0 +1,161 @@
+"""
+Index of all hands of a few distinct SET cards, stratified by set count.
+
+Every hand is identified by its rank in the colexicographic order of card
+combinations. The ranks are stored sorted by the number of sets in the hand,
+together with the offset of each stratum, so a hand with exactly (or at least)
+a given number of sets is drawn uniformly in constant time. The tables are
+built once, cached as `.npy` files next to the card sheet and loaded with
+`mmap_mode="r"`.
+
+There are C(81, 4) = 1,663,740 hands of 4 cards. Two distinct sets share at
+most one card, so these hands contain 0 or 1 set, while hands of 5 cards can
+contain 2.
+"""
+
+import os
+from functools import lru_cache
+from itertools import combinations
+from math import comb
+
+import numpy as np
+
+from generators.set_game.batched import NUM_CARD_TYPES, third_card
+
+INDEX_DIR = os.path.dirname(__file__)
+MAX_INDEXED_CARDS = 5
+_CHUNK_SIZE = 1 << 20
+
+# BINOMIALS[c, i] = C(c, i), the number of i-card hands among the first c cards.
+BINOMIALS = np.array(
+    [
+        [comb(c, i) for i in range(MAX_INDEXED_CARDS + 1)]
+        for c in range(NUM_CARD_TYPES + 1)
+    ],
+    dtype=np.int64,
+)
+
+
+def rank_hands(hands: np.ndarray) -> np.ndarray:
+    """Colexicographic ranks of (n, k) hands of distinct cards."""
+    hands = np.sort(hands, axis=1)
+    positions = np.arange(1, hands.shape[1] + 1)
+    return BINOMIALS[hands, positions].sum(axis=1)
+
+
+def unrank_hands(ranks: np.ndarray, num_cards: int) -> np.ndarray:
+    """(n, num_cards) hands with increasing cards for the given ranks."""
+    ranks = np.array(ranks, dtype=np.int64)
+    hands = np.empty((len(ranks), num_cards), dtype=np.int64)
+
+    for position in range(num_cards, 0, -1):
+        # The largest card c with C(c, position) <= rank.
+        card = np.searchsorted(BINOMIALS[:, position], ranks, side="right") - 1
+        hands[:, position - 1] = card
+        ranks -= BINOMIALS[card, position]
+
+    return hands
+
+
+def count_hand_sets(hands: np.ndarray) -> np.ndarray:
+    """Number of sets in each of the (n, k) hands of distinct cards."""
+    counts = np.zeros(len(hands), dtype=np.uint8)
+    for i, j, k in combinations(range(hands.shape[1]), 3):
+        counts += third_card(hands[:, i], hands[:, j]) == hands[:, k]
+    return counts
+
+
+def build_hand_index(num_cards: int) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the ranks sorted by set count and the offset of every count."""
+    num_hands = comb(NUM_CARD_TYPES, num_cards)
+    counts = np.concatenate(
+        [
+            count_hand_sets(
+                unrank_hands(
+                    np.arange(start, min(start + _CHUNK_SIZE, num_hands)), num_cards
+                )
+            )
+            for start in range(0, num_hands, _CHUNK_SIZE)
+        ]
+    )
+
+    ranks = np.argsort(counts, kind="stable").astype(np.int32)
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(counts))])
+    return ranks, offsets
+
+
+def _index_paths(num_cards: int) -> tuple[str, str]:
+    prefix = os.path.join(INDEX_DIR, f"hands-{num_cards}")
+    return f"{prefix}.npy", f"{prefix}-offsets.npy"
+
+
+def _save(path: str, array: np.ndarray):
+    # Write to a temporary file first so that concurrent workers never map a
+    # partially written table.
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+class HandIndex:
+    def __init__(self, num_cards: int, ranks: np.ndarray, offsets: np.ndarray):
+        self.num_cards = num_cards
+        self.ranks = ranks
+        self.offsets = offsets
+
+    @property
+    def max_sets(self) -> int:
+        return len(self.offsets) - 2
+
+    def _bounds(self, num_sets: int, at_least: bool) -> tuple[int, int]:
+        if num_sets > self.max_sets:
+            return 0, 0
+        end = self.offsets[-1] if at_least else self.offsets[num_sets + 1]
+        return int(self.offsets[num_sets]), int(end)
+
+    def stratum_size(self, num_sets: int, at_least: bool = False) -> int:
+        start, end = self._bounds(num_sets, at_least)
+        return end - start
+
+    def sample(
+        self,
+        num_sets: int,
+        n: int,
+        rng: np.random.Generator,
+        at_least: bool = False,
+    ) -> np.ndarray:
+        """
+        Draws n distinct hands uniformly among the hands with exactly
+        `num_sets` sets, or at least `num_sets` sets if `at_least` is set. The
+        cards of every hand are shuffled.
+        """
+        start, end = self._bounds(num_sets, at_least)
+        if n > end - start:
+            raise ValueError(
+                f"Only {end - start} hands of {self.num_cards} cards have "
+                f"{'at least' if at_least else 'exactly'} {num_sets} sets, "
+                f"{n} asked"
+            )
+
+        picks = start + rng.choice(end - start, size=n, replace=False)
+        hands = unrank_hands(self.ranks[picks], self.num_cards)
+        return rng.permuted(hands, axis=1)
+
+
+@lru_cache(maxsize=None)
+def load_hand_index(num_cards: int) -> HandIndex:
+    if not 3 <= num_cards <= MAX_INDEXED_CARDS:
+        raise ValueError(f"Hands of {num_cards} cards are not indexed")
+
+    ranks_path, offsets_path = _index_paths(num_cards)
+    if not os.path.exists(ranks_path) or not os.path.exists(offsets_path):
+        ranks, offsets = build_hand_index(num_cards)
+        _save(offsets_path, offsets)
+        _save(ranks_path, ranks)
+
+    return HandIndex(
+        num_cards,
+        np.load(ranks_path, mmap_mode="r"),
+        np.load(offsets_path),
+    )
@@ -1,59 +1,78 @@
 import os
 import random
+from functools import lru_cache
+from math import comb
 
-import matplotlib.pyplot as plt
 import numpy as np
-from matplotlib import image as mpimg
-from scipy.special import binom
+
+# Geometry of the cards on the transposed `all-cards.png` sheet.
+LEFT_MARGIN, TOP_MARGIN = (4, 8)
+VSPACE, HSPACE = (1, 0)
+CARD_HEIGHT, CARD_WIDTH = (70, 50)
+
+ATTRS = ["(0,0,0)", "(0,0,1)", "(0,1,0)", "(1,0,0)", "(1,1,1)"]
+PARTIAL_ATTRS = [
+    "(0,0,0)",
+    "(0,0,1)",
+    "(0,1,0)",
+    "(1,0,0)",
+    "(1,1,1)",
+    "(*,*,*)",
+    "(*,*,0)",
+    "(*,*,1)",
+    "(*,0,*)",
+    "(*,0,0)",
+    "(*,0,1)",
+    "(*,1,*)",
+    "(*,1,0)",
+    "(*,1,1)",
+    "(0,*,*)",
+    "(0,*,0)",
+    "(0,*,1)",
+    "(0,0,*)",
+    "(0,1,*)",
+    "(1,*,*)",
+    "(1,*,0)",
+    "(1,*,1)",
+    "(1,0,*)",
+    "(1,1,*)",
+]
+
+
+CARD_SHEET_PATH = os.path.join(os.path.dirname(__file__), "all-cards.png")
+
+
+@lru_cache(maxsize=None)
+def load_card_sheet() -> np.ndarray:
+    from matplotlib import image as mpimg
+
+    # Decoded once per process instead of once per game.
+    im = mpimg.imread(CARD_SHEET_PATH)
+    im.setflags(write=False)
+    return im.transpose((1, 0, 2))
 
 
 class SetGame:
     def __init__(self, verbose=0):
-        _dirname = os.path.dirname(__file__)
-
-        im = mpimg.imread(os.path.join(_dirname, "all-cards.png"))
-        self.cards = im.transpose((1, 0, 2))
+        self.cards = load_card_sheet()
         if verbose:
+            import matplotlib.pyplot as plt
+
             plt.figure(figsize=(10, 10))
             plt.imshow(self.cards)
             _ = plt.axis("off")
 
-        (self.leftmargin, self.topmargin) = (4, 8)
-        (self.vspace, self.hspace) = (1, 0)
-        (self.height, self.width) = (70, 50)
+        (self.leftmargin, self.topmargin) = (LEFT_MARGIN, TOP_MARGIN)
+        (self.vspace, self.hspace) = (VSPACE, HSPACE)
+        (self.height, self.width) = (CARD_HEIGHT, CARD_WIDTH)
 
         self.color = ["red", "green", "purple"]
         self.pattern = ["empty", "striped", "solid"]
         self.shape = ["diamond", "oval", "squiggle"]
         self.number = ["one", "two", "three"]
 
-        attrs = ["(0,0,0)", "(0,0,1)", "(0,1,0)", "(1,0,0)", "(1,1,1)"]
-        partial_attrs = [
-            "(0,0,0)",
-            "(0,0,1)",
-            "(0,1,0)",
-            "(1,0,0)",
-            "(1,1,1)",
-            "(*,*,*)",
-            "(*,*,0)",
-            "(*,*,1)",
-            "(*,0,*)",
-            "(*,0,0)",
-            "(*,0,1)",
-            "(*,1,*)",
-            "(*,1,0)",
-            "(*,1,1)",
-            "(0,*,*)",
-            "(0,*,0)",
-            "(0,*,1)",
-            "(0,0,*)",
-            "(0,1,*)",
-            "(1,*,*)",
-            "(1,*,0)",
-            "(1,*,1)",
-            "(1,0,*)",
-            "(1,1,*)",
-        ]
+        attrs = ATTRS
+        partial_attrs = PARTIAL_ATTRS
         self.voc = {attrs[j]: j for j in range(len(attrs))}
         self.ivoc = {j: attrs[j] for j in range(len(attrs))}
         self.partial_voc = {partial_attrs[j]: j for j in range(len(partial_attrs))}
@@ -121,7 +140,7 @@ class SetGame:
             self.partial_attributes = len(attr) * [-1]
             self.attribute_ind = 0
 
-            self.set_reward = 3 * int(binom(self.num_cards, 3))
+            self.set_reward = 3 * comb(self.num_cards, 3)
             self.notset_reward = -24
             self.default_reward = -1
 
@@ -244,6 +263,8 @@ class SetGame:
         return self.cards[topleft[0] : bottomright[0], topleft[1] : bottomright[1], :]
 
     def show_card(self, row, col):
+        import matplotlib.pyplot as plt
+
         c = self.image_of_card(row, col)
         plt.figure(figsize=(2, 2))
         plt.imshow(c)
@@ -259,6 +280,8 @@ class SetGame:
         )
 
     def show_cards(self, cards, nrow, ncol, labels=[]):
+        import matplotlib.pyplot as plt
+
         fig, axarr = plt.subplots(nrow, ncol, figsize=(1.3 * ncol, 1.3 * nrow))
         for i in np.arange(len(cards)):
             imcol = i % ncol
@@ -277,6 +300,8 @@ class SetGame:
         plt.show()
 
     def show_triple(self, cards):
+        import matplotlib.pyplot as plt
+
         fig, axarr = plt.subplots(1, 3, figsize=(3, 2))
         label = ["A", "B", "C"]
         for i in np.arange(len(cards)):
@@ -0,0 +1,228 @@
+"""
+SET tasks on large hands of 12, 15 or 18 cards: counting the sets in a hand,
+listing them and finding the card that completes a given pair.
+
+Hands are card indices of the card sheet, and the answers come from the native
+engine in `generators/set_game/engine.py` instead of the solver.
+"""
+
+import clingo
+import numpy as np
+
+from generators.registry import LogicTask, export_task, register_task
+from generators.set_cards import create_instance, create_rules_asp
+from generators.set_game.atlas import compose_hand
+from generators.set_game.batched import CARD_ATTRIBUTES, NUM_CARD_TYPES, third_card
+from generators.set_game.engine import card_attributes, deal_hand, find_sets
+from generators.utils import format_options
+from solvers.asp_instance import AspInstance
+
+HAND_SIZES = [12, 15, 18]
+SET_TASKS = ["count", "list", "complete"]
+NUM_ROWS = 3
+IMAGE_SCALE = 2
+
+SET_RULES = 'In the game, certain combinations of three cards are said to make up a "set". A set consists of three cards satisfying all of these conditions: they all have the same number or have three different numbers, shapes, shadings or colors.'
+CARD_NUMBERING = "The cards are numbered from 1 in reading order, from left to right and from top to bottom."
+COUNT_QUESTION = f"You have a picture of SET cards. {SET_RULES} How many sets are there among the cards?"
+LIST_QUESTION = f"You have a picture of SET cards. {SET_RULES} {CARD_NUMBERING} Which option lists all sets among the cards?"
+COMPLETE_QUESTION = f"You have a picture of SET cards. {SET_RULES} {CARD_NUMBERING} Which card completes a set with cards [[PAIR]]?"
+
+
+def get_count_base_asp() -> str:
+    return create_rules_asp().replace("    ", "") + (
+        "\n% Count the valid sets in play.\n"
+        "sets(N) :- N = #count { C1, C2, C3 : valid_set_in_play(C1, C2, C3) }.\n"
+        "#show sets/1.\n"
+    )
+
+
+def get_list_base_asp() -> str:
+    return create_rules_asp().replace("    ", "") + (
+        "\n% Show all valid sets in play.\n#show valid_set_in_play/3.\n"
+    )
+
+
+def get_complete_base_asp() -> str:
+    return create_rules_asp().replace("    ", "") + (
+        "\n% The card completing a set with the given pair of cards.\n"
+        "answer(Number, Color, Shading, Shape) :-\n"
+        "pair(C1, C2), completing_card(C1, C2, (N, C, S, P)),\n"
+        "value(number, Number, N), value(color, Color, C),\n"
+        "value(shading, Shading, S), value(shape, Shape, P).\n"
+        "#show answer/4.\n"
+    )
+
+
+BASE_ASP = {
+    "count": get_count_base_asp,
+    "list": get_list_base_asp,
+    "complete": get_complete_base_asp,
+}
+
+
+def build_hand_instance(task: str, hand: np.ndarray, pair=None) -> AspInstance:
+    cards = [str(card_attributes(card)) for card in hand]
+    instance = create_instance(cards, base=BASE_ASP[task]())
+    if pair is not None:
+        instance.comment("The pair of cards to complete.")
+        instance.add_fact("pair", pair[0] + 1, pair[1] + 1)
+    return instance
+
+
+def generate_image(hand: np.ndarray) -> np.ndarray:
+    num_cols = int(np.ceil(len(hand) / NUM_ROWS))
+    return compose_hand(hand, NUM_ROWS, num_cols, scale=IMAGE_SCALE)
+
+
+def describe_card(card: int) -> str:
+    return describe_attributes(*card_attributes(card))
+
+
+def describe_attributes(number: str, color: str, pattern: str, shape: str) -> str:
+    plural = "" if number == "one" else "s"
+    return f"{number} {color} {pattern} {shape}{plural}"
+
+
+def format_sets(sets: list[tuple[int, int, int]]) -> str:
+    if not sets:
+        return "No sets"
+    return ", ".join(f"{{{i + 1}, {j + 1}, {k + 1}}}" for i, j, k in sets)
+
+
+def generate_count_options(count: int, rng: np.random.Generator):
+    candidates = [c for c in range(max(count - 3, 0), count + 4) if c != count]
+    options = rng.choice(candidates, 3, replace=False).tolist() + [count]
+    return format_options(options, count, rng)
+
+
+def generate_list_options(hand: np.ndarray, sets: list, rng: np.random.Generator):
+    answer = format_sets(sets)
+    options = {answer}
+    while len(options) < 4:
+        # Drop one of the sets or add a triple that is not a set.
+        distractor = list(sets)
+        if distractor and rng.random() < 0.5:
+            del distractor[rng.integers(len(distractor))]
+        else:
+            triple = tuple(sorted(rng.choice(len(hand), 3, replace=False).tolist()))
+            if triple in sets:
+                continue
+            distractor = sorted(distractor + [triple])
+        options.add(format_sets(distractor))
+
+    return format_options(sorted(options), answer, rng)
+
+
+def generate_complete_options(card: int, rng: np.random.Generator):
+    # Cards differing from the answer in a single attribute.
+    differences = (CARD_ATTRIBUTES != CARD_ATTRIBUTES[card]).sum(axis=1)
+    similar = np.flatnonzero(differences == 1)
+    options = rng.choice(similar, 3, replace=False).tolist() + [card]
+    return format_options([describe_card(c) for c in options], describe_card(card), rng)
+
+
+class SetHandTask(LogicTask):
+    prompt_template = "set_hand.txt"
+
+    def __init__(self, task: str, num_cards: int):
+        if task not in BASE_ASP:
+            raise ValueError(f"Unknown SET task: {task}")
+        if num_cards < 3 or num_cards > NUM_CARD_TYPES:
+            raise ValueError(f"Cannot deal a hand of {num_cards} cards")
+        self.task = task
+        self.num_cards = num_cards
+
+    @property
+    def name(self) -> str:
+        return f"set_{self.task}_{self.num_cards}"
+
+    def base_asp(self) -> str:
+        return BASE_ASP[self.task]()
+
+    def generate_spec(self, rng: np.random.Generator) -> dict:
+        hand = deal_hand(self.num_cards, rng)
+        pair = None
+
+        if self.task == "count":
+            question = COUNT_QUESTION
+            options, answer = generate_count_options(len(find_sets(hand)), rng)
+        elif self.task == "list":
+            question = LIST_QUESTION
+            options, answer = generate_list_options(hand, find_sets(hand), rng)
+        else:
+            pair = sorted(rng.choice(self.num_cards, 2, replace=False).tolist())
+            question = COMPLETE_QUESTION.replace(
+                "[[PAIR]]", f"{pair[0] + 1} and {pair[1] + 1}"
+            )
+            card = third_card(hand[pair[0]], hand[pair[1]])
+            options, answer = generate_complete_options(int(card), rng)
+
+        return {
+            "question": question,
+            "options": options,
+            "answer": answer,
+            "hand": hand.tolist(),
+            "pair": pair,
+        }
+
+    def generate(self, n: int, rng: np.random.Generator) -> list[dict]:
+        return [self.generate_spec(rng) for _ in range(n)]
+
+    def render_spec(self, spec: dict) -> np.ndarray:
+        return generate_image(spec["hand"])
+
+    def serialize_spec(self, spec: dict) -> str:
+        return build_hand_instance(self.task, spec["hand"], spec["pair"]).to_asp()
+
+    def check(self, spec: dict, models: list[list[str]]) -> bool:
+        sets = find_sets(spec["hand"])
+        if self.task == "count":
+            expected = [f"sets({len(sets)})"]
+        elif self.task == "list":
+            expected = sorted(
+                f"valid_set_in_play({i + 1},{j + 1},{k + 1})" for i, j, k in sets
+            )
+        else:
+            first, second = (spec["hand"][i] for i in spec["pair"])
+            card = int(third_card(first, second))
+            expected = [f"answer({','.join(card_attributes(card))})"]
+        return models == [expected]
+
+    def answer_text(self, models: list[list[str]]) -> str | None:
+        if len(models) != 1:
+            return None
+        atoms = [clingo.parse_term(atom) for atom in models[0]]
+        if self.task == "list":
+            sets = sorted(
+                tuple(argument.number - 1 for argument in atom.arguments)
+                for atom in atoms
+            )
+            return format_sets(sets)
+        if len(atoms) != 1:
+            return None
+        if self.task == "count":
+            return str(atoms[0].arguments[0].number)
+        return describe_attributes(*map(str, atoms[0].arguments))
+
+
+for task in SET_TASKS:
+    for num_cards in HAND_SIZES:
+        register_task(SetHandTask(task, num_cards))
+
+
+def export_data(
+    root_dir: str,
+    n_samples: int,
+    task: str = "count",
+    num_cards: int = 12,
+    rng: np.random.Generator | None = None,
+    output_format: str = "json",
+):
+    export_task(
+        SetHandTask(task, num_cards),
+        root_dir,
+        n_samples,
+        rng=rng,
+        output_format=output_format,
+    )
@@ -0,0 +1,604 @@
+"""
+Large graph-coloring tasks (50 to 500 nodes) built without networkx.
+
+Graphs are kept as NumPy edge arrays of shape (m, 2) with `u < v` and
+converted to symmetric CSR matrices when neighbourhood queries are needed.
+"""
+
+from __future__ import annotations
+
+import io
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from generators.graph import (
+    COLOURS,
+    FILL_IN_QUESTION,
+    VALIDITY_QUESTION,
+    generate_fill_in_options,
+    get_fill_in_base_asp,
+    get_validity_base_asp,
+)
+from generators.registry import (
+    LogicTask,
+    ValidityTask,
+    export_task,
+    register_task,
+    seeded_globals,
+)
+from generators.utils import generate_valid_options
+from pipeline import metrics
+from solvers.clingo_solver import ClingoSolver
+
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+    from scipy import sparse
+
+GRAPH_KINDS = ["erdos_renyi", "geometric", "planar"]
+MIN_NODES = 50
+MAX_NODES = 500
+# Node positions in the unit square are kept to about a tenth of a pixel of the
+# rendered image, which keeps the specs short.
+POS_DECIMALS = 4
+# Average degrees of the Erdos-Renyi validity graphs, either side of the degree
+# above which sparse random graphs stop being 3-colorable.
+VALIDITY_DEGREES = (3.0, 7.0)
+# Graphs drawn looking for the other answer to a graph and its number of colors.
+PAIR_ATTEMPTS = 20
+# Seconds after which the solver gives up on coloring a validity graph, the
+# Erdos-Renyi graphs near the colorability threshold can take minutes.
+VALIDITY_SOLVE_SECONDS = 1.0
+# Graphs left without a pair in a row after which the generator gives up.
+MAX_REJECTED_IN_A_ROW = 100
+
+
+def _get_rng(rng: np.random.Generator | None) -> np.random.Generator:
+    # Derive from the global numpy state so that `np.random.seed` keeps runs
+    # reproducible, like the rest of the generators.
+    return rng or np.random.default_rng(np.random.randint(2**31))
+
+
+def _normalize_edges(edges: np.ndarray) -> np.ndarray:
+    edges = np.sort(edges.astype(np.int32), axis=1)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    return np.unique(edges, axis=0)
+
+
+def _random_spanning_tree(n: int, rng: np.random.Generator) -> np.ndarray:
+    # Attach every node of a random permutation to a uniformly chosen earlier one.
+    order = rng.permutation(n)
+    parents = (rng.random(n - 1) * np.arange(1, n)).astype(np.int64)
+    return np.stack([order[1:], order[parents]], axis=1)
+
+
+def _delaunay_edges(pos: np.ndarray) -> np.ndarray:
+    from scipy.spatial import Delaunay
+
+    simplices = Delaunay(pos).simplices
+    edges = np.concatenate(
+        [simplices[:, [0, 1]], simplices[:, [1, 2]], simplices[:, [0, 2]]]
+    )
+    return _normalize_edges(edges)
+
+
+def _euclidean_spanning_tree(pos: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    from scipy import sparse
+    from scipy.sparse.csgraph import minimum_spanning_tree
+
+    weights = np.linalg.norm(pos[edges[:, 0]] - pos[edges[:, 1]], axis=1)
+    graph = sparse.coo_matrix(
+        (weights, (edges[:, 0], edges[:, 1])), shape=(len(pos), len(pos))
+    )
+    tree = minimum_spanning_tree(graph).tocoo()
+    return np.stack([tree.row, tree.col], axis=1)
+
+
+def to_csr(n: int, edges: np.ndarray) -> sparse.csr_matrix:
+    from scipy import sparse
+
+    data = np.ones(2 * len(edges), dtype=np.int8)
+    rows = np.concatenate([edges[:, 0], edges[:, 1]])
+    cols = np.concatenate([edges[:, 1], edges[:, 0]])
+    return sparse.csr_matrix((data, (rows, cols)), shape=(n, n))
+
+
+def spectral_layout(n: int, edges: np.ndarray) -> np.ndarray:
+    adjacency = to_csr(n, edges).toarray().astype(np.float64)
+    laplacian = np.diag(adjacency.sum(axis=1)) - adjacency
+    _, vectors = np.linalg.eigh(laplacian)
+    pos = vectors[:, 1:3]
+    pos = pos - pos.min(axis=0)
+    return pos / np.maximum(pos.max(axis=0), 1e-12)
+
+
+def erdos_renyi_graph(
+    n: int, avg_degree: float = 4.0, rng: np.random.Generator | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    rng = _get_rng(rng)
+    tree = _random_spanning_tree(n, rng)
+    n_extra = max(int(avg_degree * n / 2) - (n - 1), 0)
+    extra = rng.integers(0, n, size=(n_extra, 2))
+    edges = _normalize_edges(np.concatenate([tree, extra]))
+    return edges, spectral_layout(n, edges)
+
+
+def geometric_graph(
+    n: int, radius: float | None = None, rng: np.random.Generator | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    from scipy.spatial import cKDTree
+
+    rng = _get_rng(rng)
+    pos = rng.random((n, 2))
+    # Expected degree of roughly 4 when no radius is given.
+    radius = radius or np.sqrt(4.0 / (np.pi * n))
+    close = cKDTree(pos).query_pairs(radius, output_type="ndarray")
+    # The Euclidean MST is a subgraph of the Delaunay triangulation and keeps
+    # the graph connected while only adding short edges.
+    tree = _euclidean_spanning_tree(pos, _delaunay_edges(pos))
+    edges = _normalize_edges(np.concatenate([close.reshape(-1, 2), tree]))
+    return edges, pos
+
+
+def planar_graph(
+    n: int, keep: float = 0.5, rng: np.random.Generator | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    rng = _get_rng(rng)
+    pos = rng.random((n, 2))
+    triangulation = _delaunay_edges(pos)
+    tree = _euclidean_spanning_tree(pos, triangulation)
+    # Any subgraph of a triangulation is planar with the given embedding.
+    kept = triangulation[rng.random(len(triangulation)) < keep]
+    edges = _normalize_edges(np.concatenate([tree, kept]))
+    return edges, pos
+
+
+def generate_sparse_graph(
+    kind: str, n: int, rng: np.random.Generator | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    if kind == "erdos_renyi":
+        return erdos_renyi_graph(n, rng=rng)
+    if kind == "geometric":
+        return geometric_graph(n, rng=rng)
+    if kind == "planar":
+        return planar_graph(n, rng=rng)
+    raise ValueError(f"Unknown graph kind: {kind}")
+
+
+def greedy_coloring(n: int, edges: np.ndarray) -> np.ndarray:
+    """Largest-first greedy coloring, returns a color index for every node."""
+    csr = to_csr(n, edges)
+    degrees = np.diff(csr.indptr)
+    colors = np.full(n, -1, dtype=np.int64)
+
+    for node in np.argsort(-degrees, kind="stable"):
+        neighbour_colors = colors[csr.indices[csr.indptr[node] : csr.indptr[node + 1]]]
+        # Only colors up to the degree can block the smallest free one.
+        used = np.zeros(degrees[node] + 1, dtype=bool)
+        used[
+            neighbour_colors[(neighbour_colors >= 0) & (neighbour_colors < len(used))]
+        ] = True
+        colors[node] = np.argmin(used) if not used.all() else len(used)
+
+    return colors
+
+
+def neighbour_color_counts(
+    n: int, edges: np.ndarray, colors: np.ndarray, n_colors: int
+) -> np.ndarray:
+    """Returns an (n, n_colors) matrix counting neighbours of each color."""
+    from scipy import sparse
+
+    one_hot = sparse.csr_matrix(
+        (np.ones(n, dtype=np.int32), (np.arange(n), colors)), shape=(n, n_colors)
+    )
+    return (to_csr(n, edges).astype(np.int32) @ one_hot).toarray()
+
+
+def greedy_clique(n: int, edges: np.ndarray) -> np.ndarray:
+    """Grows a clique greedily from every edge and returns the largest one."""
+    adjacency = to_csr(n, edges).toarray().astype(bool)
+    best = edges[0] if len(edges) else np.array([0])
+
+    for u, v in edges:
+        candidates = adjacency[u] & adjacency[v]
+        clique = [u, v]
+        while candidates.any():
+            node = np.flatnonzero(candidates)[0]
+            clique.append(node)
+            candidates &= adjacency[node]
+        if len(clique) > len(best):
+            best = np.array(clique)
+
+    return best
+
+
+def generate_color_facts(color_choices: list[str]) -> str:
+    color_facts = "% Define predefined colorings for specific nodes\n"
+    color_facts += "".join(f"color({color}).\n" for color in color_choices)
+    return color_facts + "\n"
+
+
+def generate_asp_facts(n: int, edges: np.ndarray) -> str:
+    buffer = io.StringIO()
+    buffer.write("% Define the nodes and edges in the graph\n")
+    buffer.write(f"node(0..{n - 1}).\n")
+    np.savetxt(buffer, edges, fmt="edge(%d, %d).")
+    return buffer.getvalue()
+
+
+def generate_coloring_facts(node_colors: np.ndarray, grey_node: int) -> str:
+    mask = np.arange(len(node_colors)) != grey_node
+    nodes = np.flatnonzero(mask)
+    names = np.array(COLOURS)[node_colors[mask]]
+
+    buffer = io.StringIO()
+    buffer.write("% Defining colored node facts\n")
+    np.savetxt(buffer, np.stack([nodes, names], axis=1), fmt="coloring(%s,%s).")
+    buffer.write(
+        f"\n% The grey node (node {grey_node}) has to be assigned a color\n"
+        f"grey({grey_node}).\n"
+    )
+    return buffer.getvalue()
+
+
+def visualize_graph(
+    pos: np.ndarray,
+    edges: np.ndarray,
+    node_colors: list[str] | None = None,
+    with_labels: bool | None = None,
+) -> plt.Figure:
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+
+    n = len(pos)
+    node_size = float(np.clip(30000 / n, 20, 300))
+    with_labels = n <= 100 if with_labels is None else with_labels
+
+    fig, ax = plt.subplots(figsize=(10, 10))
+    # All edges are drawn as one collection instead of one artist per edge.
+    ax.add_collection(LineCollection(pos[edges], colors="black", linewidths=1))
+    ax.scatter(
+        pos[:, 0],
+        pos[:, 1],
+        s=node_size,
+        c=node_colors or "grey",
+        edgecolors="black",
+        zorder=2,
+    )
+    if with_labels:
+        for node, (x, y) in enumerate(pos):
+            ax.text(x, y, str(node), ha="center", va="center", fontsize=6, zorder=3)
+    ax.set_axis_off()
+    ax.autoscale()
+    ax.set_aspect("equal")
+
+    return fig
+
+
+def _sample_graph(
+    kind: str, min_nodes: int, max_nodes: int, rng: np.random.Generator
+) -> tuple[int, np.ndarray, np.ndarray, np.ndarray]:
+    n = int(rng.integers(min_nodes, max_nodes + 1))
+    edges, pos = generate_sparse_graph(kind, n, rng)
+    return n, edges, pos, greedy_coloring(n, edges)
+
+
+def generate_fill_in_graphs(
+    n_samples: int,
+    kind: str = "erdos_renyi",
+    min_nodes: int = MIN_NODES,
+    max_nodes: int = MAX_NODES,
+    rng: np.random.Generator | None = None,
+) -> list[dict]:
+    rng = _get_rng(rng)
+    samples = []
+
+    while len(samples) < n_samples:
+        n, edges, pos, colors = _sample_graph(kind, min_nodes, max_nodes, rng)
+        n_colors = colors.max() + 1
+        if n_colors < 4 or n_colors > len(COLOURS):
+            metrics.attempt(f"graph_{kind}_fill_in", False, "color_count")
+            continue
+
+        # A grey node whose neighbours already use every color but one has a
+        # unique answer, so no solver call is needed to check uniqueness.
+        counts = neighbour_color_counts(n, edges, colors, n_colors)
+        candidates = np.flatnonzero((counts > 0).sum(axis=1) == n_colors - 1)
+        if len(candidates) == 0:
+            metrics.attempt(f"graph_{kind}_fill_in", False, "no_unique_node")
+            continue
+
+        metrics.attempt(f"graph_{kind}_fill_in", True)
+        samples.append(
+            {
+                "edges": edges,
+                "pos": pos,
+                "colors": colors,
+                "grey_node": int(rng.choice(candidates)),
+            }
+        )
+
+    return samples
+
+
+def is_colorable(sample: dict, colors: np.ndarray | None = None) -> bool | None:
+    """
+    Whether the graph of a validity sample can be colored with its colors.
+    The greedy coloring and the largest greedy clique decide most graphs,
+    clingo decides the others, or gives None if it runs out of time.
+    """
+    n, edges = len(sample["pos"]), sample["edges"]
+    n_colors = len(sample["color_choices"])
+    colors = greedy_coloring(n, edges) if colors is None else colors
+    if colors.max() + 1 <= n_colors:
+        return True
+    if len(greedy_clique(n, edges)) > n_colors:
+        return False
+    return ClingoSolver.solve(
+        get_validity_base_asp() + get_validity_asp(sample),
+        timeout=VALIDITY_SOLVE_SECONDS,
+    )
+
+
+def _sample_validity_graph(
+    kind: str, n: int, rng: np.random.Generator
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    if kind == "erdos_renyi":
+        edges, pos = erdos_renyi_graph(n, rng.uniform(*VALIDITY_DEGREES), rng)
+    else:
+        edges, pos = generate_sparse_graph(kind, n, rng)
+    return edges, pos, greedy_coloring(n, edges)
+
+
+def _validity_color_counts(lower: int, upper: int) -> range:
+    # Color counts whose answer is uncertain between the clique and greedy
+    # bounds, or either side of the chromatic number when they meet.
+    if lower == upper:
+        lower -= 1
+    else:
+        upper -= 1
+    return range(max(lower, 2), min(upper, len(COLOURS)) + 1)
+
+
+def generate_validity_graphs(
+    n_pairs: int,
+    kind: str = "erdos_renyi",
+    min_nodes: int = MIN_NODES,
+    max_nodes: int = MAX_NODES,
+    rng: np.random.Generator | None = None,
+) -> tuple[list[dict], list[dict]]:
+    """
+    n_pairs valid and n_pairs invalid samples. They come in pairs of a valid
+    and an invalid graph with the same numbers of nodes and colors, so that
+    neither the size nor the number of colors gives the answer away.
+    """
+    rng = _get_rng(rng)
+    name = f"graph_{kind}_validity"
+    samples = {True: [], False: []}
+    rejected = 0
+    # Every graph drawn is recorded once in the metrics, as accepted when it
+    # ends up in a pair or with the reason it was left out.
+
+    while len(samples[True]) < n_pairs:
+        if rejected >= MAX_REJECTED_IN_A_ROW:
+            raise ValueError(
+                f"{name}: no graphs of both answers found for {rejected} "
+                "sizes and numbers of colors in a row"
+            )
+        n = int(rng.integers(min_nodes, max_nodes + 1))
+        edges, pos, colors = _sample_validity_graph(kind, n, rng)
+        counts = _validity_color_counts(
+            len(greedy_clique(n, edges)), int(colors.max()) + 1
+        )
+        if len(counts) == 0:
+            metrics.attempt(name, False, "color_count")
+            rejected += 1
+            continue
+
+        color_choices = rng.choice(COLOURS, int(rng.choice(counts)), replace=False)
+        first = {"edges": edges, "pos": pos, "color_choices": color_choices.tolist()}
+        answer = is_colorable(first, colors)
+        if answer is None:
+            metrics.attempt(name, False, "solver_timeout")
+            rejected += 1
+            continue
+
+        for _ in range(PAIR_ATTEMPTS):
+            edges, pos, colors = _sample_validity_graph(kind, n, rng)
+            second = {
+                "edges": edges,
+                "pos": pos,
+                "color_choices": rng.permutation(color_choices).tolist(),
+            }
+            second_answer = is_colorable(second, colors)
+            if second_answer is None:
+                metrics.attempt(name, False, "solver_timeout")
+            elif second_answer != answer:
+                metrics.attempt(name, True)
+                break
+            else:
+                metrics.attempt(name, False, "same_answer")
+        else:
+            metrics.attempt(name, False, "no_pair")
+            rejected += 1
+            continue
+
+        metrics.attempt(name, True)
+        samples[answer].append(first)
+        samples[not answer].append(second)
+        rejected = 0
+
+    return samples[True], samples[False]
+
+
+def _sample_arrays(spec: dict) -> dict:
+    # Specs hold plain lists, the helpers below work on arrays.
+    arrays = dict(spec)
+    for key in ["edges", "pos", "colors"]:
+        if key in spec:
+            arrays[key] = np.asarray(spec[key])
+    arrays["edges"] = arrays["edges"].reshape(-1, 2)
+    return arrays
+
+
+def get_fill_in_asp(sample: dict) -> str:
+    sample = _sample_arrays(sample)
+    colors = sample["colors"]
+    color_facts = generate_color_facts([COLOURS[c] for c in np.unique(colors)])
+    return (
+        color_facts
+        + generate_asp_facts(len(colors), sample["edges"])
+        + generate_coloring_facts(colors, sample["grey_node"])
+    )
+
+
+def get_validity_asp(sample: dict) -> str:
+    sample = _sample_arrays(sample)
+    color_facts = generate_color_facts(sample["color_choices"])
+    return color_facts + generate_asp_facts(len(sample["pos"]), sample["edges"])
+
+
+def _to_spec(sample: dict) -> dict:
+    sample = {**sample, "pos": np.round(sample["pos"], POS_DECIMALS)}
+    return {
+        key: value.tolist() if isinstance(value, np.ndarray) else value
+        for key, value in sample.items()
+    }
+
+
+class LargeGraphTask(LogicTask):
+    def __init__(
+        self, kind: str, min_nodes: int = MIN_NODES, max_nodes: int = MAX_NODES
+    ):
+        self.kind = kind
+        self.min_nodes = min_nodes
+        self.max_nodes = max_nodes
+
+    def pack_spec(self, spec: dict) -> dict:
+        return {
+            **spec,
+            "edges": np.ravel(spec["edges"]).tolist(),
+            "pos": np.ravel(spec["pos"]).tolist(),
+        }
+
+    def unpack_spec(self, packed: dict) -> dict:
+        return {
+            **packed,
+            "edges": np.reshape(packed["edges"], (-1, 2)).tolist(),
+            "pos": np.reshape(packed["pos"], (-1, 2)).tolist(),
+        }
+
+
+class LargeGraphValidityTask(LargeGraphTask, ValidityTask):
+    prompt_template = "graph_validity.txt"
+
+    @property
+    def name(self) -> str:
+        return f"graph_{self.kind}_validity"
+
+    def base_asp(self) -> str:
+        return get_validity_base_asp()
+
+    def generate(self, n: int, rng: np.random.Generator) -> list[dict]:
+        # The options are drawn from the global generators.
+        with seeded_globals(rng):
+            specs = []
+            valid_samples, invalid_samples = generate_validity_graphs(
+                n // 2, self.kind, self.min_nodes, self.max_nodes, rng
+            )
+            for valid, samples in [(True, valid_samples), (False, invalid_samples)]:
+                for sample in samples:
+                    options, answer = generate_valid_options(valid)
+                    specs.append(
+                        {
+                            "question": VALIDITY_QUESTION
+                            + "\nAvailable colors:\n"
+                            + ", ".join(sample["color_choices"]),
+                            "options": options,
+                            "answer": answer,
+                            **_to_spec(sample),
+                            "valid": valid,
+                        }
+                    )
+            return specs
+
+    def render_spec(self, spec: dict) -> plt.Figure:
+        sample = _sample_arrays(spec)
+        return visualize_graph(sample["pos"], sample["edges"])
+
+    def serialize_spec(self, spec: dict) -> str:
+        return get_validity_asp(spec)
+
+    def prompt_values(self, spec: dict, asp: str) -> dict[str, str]:
+        values = super().prompt_values(spec, asp)
+        return {**values, "COLORS": ", ".join(spec["color_choices"])}
+
+
+class LargeGraphFillInTask(LargeGraphTask):
+    prompt_template = "graph_fill_in.txt"
+
+    @property
+    def name(self) -> str:
+        return f"graph_{self.kind}_fill_in"
+
+    def base_asp(self) -> str:
+        return get_fill_in_base_asp()
+
+    def generate(self, n: int, rng: np.random.Generator) -> list[dict]:
+        # The options are drawn from the global generators.
+        with seeded_globals(rng):
+            samples = generate_fill_in_graphs(
+                n, self.kind, self.min_nodes, self.max_nodes, rng
+            )
+
+            specs = []
+            for sample in samples:
+                original_node_colors = [COLOURS[c] for c in sample["colors"]]
+                node_colors = original_node_colors.copy()
+                node_colors[sample["grey_node"]] = "grey"
+
+                options, answer = generate_fill_in_options(
+                    node_colors, original_node_colors
+                )
+                specs.append(
+                    {
+                        "question": FILL_IN_QUESTION,
+                        "options": options,
+                        "answer": answer,
+                        **_to_spec(sample),
+                    }
+                )
+            return specs
+
+    def render_spec(self, spec: dict) -> plt.Figure:
+        sample = _sample_arrays(spec)
+        node_colors = [COLOURS[c] for c in spec["colors"]]
+        node_colors[spec["grey_node"]] = "grey"
+        return visualize_graph(sample["pos"], sample["edges"], node_colors)
+
+    def serialize_spec(self, spec: dict) -> str:
+        return get_fill_in_asp(spec)
+
+    def check(self, spec: dict, models: list[list[str]]) -> bool:
+        color = COLOURS[spec["colors"][spec["grey_node"]]]
+        return models == [[f"answer({color})"]]
+
+
+for kind in GRAPH_KINDS:
+    register_task(LargeGraphValidityTask(kind))
+    register_task(LargeGraphFillInTask(kind))
+
+
+def export_data(
+    root_dir: str,
+    n_samples: int,
+    fill_in: bool = False,
+    kind: str = "erdos_renyi",
+    min_nodes: int = MIN_NODES,
+    max_nodes: int = MAX_NODES,
+    output_format: str = "json",
+):
+    task_class = LargeGraphFillInTask if fill_in else LargeGraphValidityTask
+    task = task_class(kind, min_nodes, max_nodes)
+    export_task(task, root_dir, n_samples, output_format=output_format)
@@ -1,12 +1,42 @@
-import os
+from __future__ import annotations
 
-import matplotlib.pyplot as plt
+from typing import TYPE_CHECKING
+
+import clingo
 import numpy as np
-import sudokum
 
-from generators.utils import create_directory, export_problems
+from generators import sudoku_bank
+from generators.registry import (
+    TASKS,
+    LogicTask,
+    ValidityTask,
+    export_task,
+    register_task,
+    seeded_globals,
+)
+from generators.utils import format_options, generate_valid_options
+from pipeline import metrics
+from solvers.asp_instance import AspInstance
 from solvers.clingo_solver import ClingoSolver
 
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+
+VALIDITY_QUESTION = "Here you have a picture of a solved sudoku board. Can you tell me if it is valid? Give me a letter of a valid answer."
+FILL_IN_QUESTION = "Here you have a picture of a sudoku board with one number missing, marked red color. Can you say what number is missing? Give me a letter of a valid answer."
+VIOLATION_QUESTION = "Here you have a picture of a filled sudoku board with mistakes. Which of these cells holds a number that is repeated in its row, column or 3x3 box? Give me a letter of a valid answer."
+
+VIOLATIONS = ["row", "column", "box"]
+# Most violations injected per board, and the cells that every violation puts
+# in conflict: a swap repeats a digit in two rows or columns, a rectangle in
+# four boxes.
+MAX_VIOLATIONS = {"row": 3, "column": 3, "box": 2}
+CONFLICTS_PER_VIOLATION = {"row": 4, "column": 4, "box": 8}
+# Valid boards generated with sudokum, which the violation boards are shuffled
+# from.
+SOURCE_GRIDS = 8
+BOX_INDEX = np.arange(9)[:, None] // 3 * 3 + np.arange(9) // 3
+
 
 def get_base_asp() -> str:
     return """
@@ -40,32 +70,53 @@ def get_base_asp() -> str:
     """
 
 
-def get_find_missing_asp(x: int, y: int) -> str:
-    return f"""
-    % Find the missing number in cell ({x},{y})
-    1 {{ sudoku({x},{y},N) : n(N) }} 1.
-
-    % Define the answer predicate to store the missing number
-    answer(N) :- sudoku({x},{y},N).
+def get_fill_in_base_asp() -> str:
+    return get_base_asp() + """
+    % The answer is the number placed in the missing cell
+    answer(N) :- missing(X,Y), sudoku(X,Y,N).
     #show answer/1.
     """
 
 
+def get_violation_base_asp() -> str:
+    return """
+    % Each cell (X, Y) belongs to one of the nine 3x3 boxes
+    box(X,Y,(X-1)/3*3+(Y-1)/3) :- sudoku(X,Y,_).
+
+    % A cell conflicts if its number N is repeated in its row, column or box
+    conflict(X,Y) :- sudoku(X,Y,N), sudoku(X,B,N), Y != B.
+    conflict(X,Y) :- sudoku(X,Y,N), sudoku(A,Y,N), X != A.
+    conflict(X,Y) :- sudoku(X,Y,N), sudoku(A,B,N), box(X,Y,I), box(A,B,I), (X,Y) != (A,B).
+
+    % The answer is the option cell that conflicts
+    answer(X,Y) :- option(X,Y), conflict(X,Y).
+    #show answer/2.
+    """
+
+
 def generate_valid_sudoku() -> list[list[int]]:
+    if sudoku_bank.current() is not None:
+        return sudoku_bank.draw(1)[0].tolist()
+
+    import sudokum
+
     while True:
         grid = sudokum.generate(mask_rate=0.0)
         sudoku_valid, _ = sudokum.check(grid)
+        metrics.attempt("valid_sudoku", sudoku_valid)
         if sudoku_valid:
             return grid
 
 
 def generate_invalid_sudoku() -> list[list[int]]:
+    import sudokum
+
     while True:
-        grid = sudokum.generate(mask_rate=0.0)
-        grid = np.array(grid)
+        grid = np.array(generate_valid_sudoku())
         grid[np.random.randint(9), np.random.randint(9)] = np.random.randint(1, 10)
         grid = grid.tolist()
         sudoku_valid, _ = sudokum.check(grid)
+        metrics.attempt("invalid_sudoku", not sudoku_valid, "still_valid")
         if not sudoku_valid:
             return grid
 
@@ -74,7 +125,228 @@ def generate_sudoku(valid: bool = True) -> list[list[int]]:
     return generate_valid_sudoku() if valid else generate_invalid_sudoku()
 
 
+def unit_counts(grids: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Counts of every digit in the rows, columns and boxes of a batch of grids,
+    as (n, 9, 9) arrays indexed by unit and digit - 1. Empty cells are 0.
+    """
+    one_hot = np.asarray(grids)[..., None] == np.arange(1, 10)
+    rows = one_hot.sum(axis=2, dtype=np.int8)
+    columns = one_hot.sum(axis=1, dtype=np.int8)
+    boxes = one_hot.reshape(-1, 3, 3, 3, 3, 9).sum(axis=(2, 4), dtype=np.int8)
+    return rows, columns, boxes.reshape(-1, 9, 9)
+
+
+def violation_masks(grids: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Cells of a batch of grids whose digit is repeated in their row, column or
+    box, as (n, 9, 9) boolean arrays by kind of violation.
+    """
+    grids = np.asarray(grids)
+    rows, columns, boxes = unit_counts(grids)
+    batch = np.arange(len(grids))[:, None, None]
+    digits = np.maximum(grids - 1, 0)
+    filled = grids > 0
+    return {
+        "row": filled & (rows[batch, np.arange(9)[:, None], digits] > 1),
+        "column": filled & (columns[batch, np.arange(9), digits] > 1),
+        "box": filled & (boxes[batch, BOX_INDEX, digits] > 1),
+    }
+
+
+def conflicting_cells(grids: np.ndarray) -> np.ndarray:
+    masks = violation_masks(grids)
+    return masks["row"] | masks["column"] | masks["box"]
+
+
+def valid_grids(grids: np.ndarray) -> np.ndarray:
+    """Whether every grid of a batch is filled and breaks no rule."""
+    grids = np.asarray(grids)
+    return (grids > 0).all(axis=(1, 2)) & ~conflicting_cells(grids).any(axis=(1, 2))
+
+
+def _permutations(shape: tuple[int, ...], k: int, rng: np.random.Generator):
+    return rng.permuted(np.broadcast_to(np.arange(k), shape + (k,)), axis=-1)
+
+
+def _line_order(n: int, rng: np.random.Generator) -> np.ndarray:
+    # Bands (or stacks) keep their three lines together, so the grid stays
+    # valid.
+    bands = _permutations((n,), 3, rng)
+    lines = _permutations((n, 3), 3, rng)
+    return (bands[:, :, None] * 3 + lines).reshape(n, 9)
+
+
+def shuffle_grids(grids: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """
+    Random valid grids equivalent to a batch of valid grids: the digits are
+    relabelled, the bands, stacks, rows and columns permuted and half of the
+    grids transposed.
+    """
+    grids = np.asarray(grids)
+    n = len(grids)
+    batch = np.arange(n)[:, None, None]
+    digits = np.concatenate(
+        [np.zeros((n, 1), dtype=int), _permutations((n,), 9, rng) + 1], axis=1
+    )
+    rows, columns = _line_order(n, rng), _line_order(n, rng)
+    grids = digits[batch, grids[batch, rows[:, :, None], columns[:, None, :]]]
+    transposed = rng.random(n) < 0.5
+    return np.where(transposed[:, None, None], grids.transpose(0, 2, 1), grids)
+
+
+def random_valid_grids(
+    n: int, rng: np.random.Generator, sources: np.ndarray | None = None
+) -> np.ndarray:
+    """
+    n random valid grids, drawn from the sudoku bank if there is one or
+    shuffled from a few generated ones.
+    """
+    if sources is None:
+        if sudoku_bank.current() is not None:
+            return sudoku_bank.draw(n, rng)
+        sources = [generate_valid_sudoku() for _ in range(SOURCE_GRIDS)]
+    sources = np.asarray(sources)
+    return shuffle_grids(sources[rng.integers(len(sources), size=n)], rng)
+
+
+def _swap_rows_in_bands(grids, counts, rng):
+    # Two cells of a column are swapped within a box, which repeats a digit in
+    # both of their rows only. Every swap uses another band.
+    n = len(grids)
+    bands = _permutations((n,), 3, rng)
+    rows = bands[:, :, None] * 3 + _permutations((n, 3), 3, rng)[:, :, :2]
+    columns = rng.integers(9, size=(n, 3))
+    board, slot = np.nonzero(np.arange(3) < counts[:, None])
+    first = (board, rows[board, slot, 0], columns[board, slot])
+    second = (board, rows[board, slot, 1], columns[board, slot])
+    grids[first], grids[second] = grids[second], grids[first]
+
+
+def _swap_rectangles(grids, counts, rng):
+    # Two digits at the corners of a rectangle (a b / b a) with its corners in
+    # four boxes are exchanged in both of its rows. The rows and columns keep
+    # their digits, but each of the four boxes repeats one. Rectangles are
+    # searched among every (row, column, column) of every board at once.
+    n = len(grids)
+    boards = np.arange(n)[:, None]
+    r1, c1, c2 = (axis.ravel() for axis in np.indices((9, 9, 9)))
+    corners = c1 // 3 != c2 // 3
+    r1, c1, c2 = r1[corners], c1[corners], c2[corners]
+    for slot in range(counts.max(initial=0)):
+        # Row of every digit in every column, which are still valid.
+        rows_of = np.argsort(grids, axis=1)
+        a, b = grids[:, r1, c1], grids[:, r1, c2]
+        r2 = rows_of[boards, b - 1, c1]
+        conflicts = conflicting_cells(grids)
+        found = (
+            (grids[boards, r2, c2] == a)
+            & (r1 // 3 != r2 // 3)
+            & ~conflicts[:, r1, c1]
+            & ~conflicts[:, r1, c2]
+            & ~conflicts[boards, r2, c1]
+            & ~conflicts[boards, r2, c2]
+        )
+        choice = np.argmax(np.where(found, rng.random(found.shape), -1), axis=1)
+        board = np.nonzero((counts > slot) & found[np.arange(n), choice])[0]
+        j = choice[board]
+        top, bottom = r1[j], r2[board, j]
+        grids[board, top, c1[j]] = grids[board, bottom, c2[j]] = b[board, j]
+        grids[board, top, c2[j]] = grids[board, bottom, c1[j]] = a[board, j]
+
+
+def inject_violations(
+    grids: np.ndarray, kinds: np.ndarray, counts: np.ndarray, rng
+) -> np.ndarray:
+    """
+    Copies of a batch of valid grids with `counts[i]` violations of the kind
+    `VIOLATIONS[kinds[i]]` each, made by swapping cells so that only units of
+    that kind break the rules.
+    """
+    grids = np.array(grids)
+    kinds, counts = np.asarray(kinds), np.asarray(counts)
+    for kind, swap, transpose in [
+        ("row", _swap_rows_in_bands, False),
+        ("column", _swap_rows_in_bands, True),
+        ("box", _swap_rectangles, False),
+    ]:
+        selected = np.nonzero(kinds == VIOLATIONS.index(kind))[0]
+        if not len(selected):
+            continue
+        batch = grids[selected]
+        if transpose:
+            batch = batch.transpose(0, 2, 1).copy()
+        swap(batch, counts[selected], rng)
+        grids[selected] = batch.transpose(0, 2, 1) if transpose else batch
+    return grids
+
+
+def generate_violation_grids(
+    kinds: np.ndarray,
+    counts: np.ndarray,
+    rng: np.random.Generator,
+    sources: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Invalid grids with the given kinds and numbers of violations, and the mask
+    of their conflicting cells. Boards whose swaps do not put exactly
+    `CONFLICTS_PER_VIOLATION` cells in conflict per violation, in units of
+    their kind only, are drawn again, a batch at a time.
+    """
+    if sources is None and sudoku_bank.current() is None:
+        sources = [generate_valid_sudoku() for _ in range(SOURCE_GRIDS)]
+    kinds, counts = np.asarray(kinds), np.asarray(counts)
+    per_violation = np.array([CONFLICTS_PER_VIOLATION[kind] for kind in VIOLATIONS])
+    kind_of = np.eye(len(VIOLATIONS), dtype=int)
+    grids = np.zeros((len(kinds), 9, 9), dtype=int)
+    conflicts = np.zeros((len(kinds), 9, 9), dtype=bool)
+    todo = np.arange(len(kinds))
+    while len(todo):
+        batch = inject_violations(
+            random_valid_grids(len(todo), rng, sources), kinds[todo], counts[todo], rng
+        )
+        masks = np.stack([violation_masks(batch)[kind] for kind in VIOLATIONS], 1)
+        expected = per_violation[kinds[todo]] * counts[todo]
+        accepted = (
+            masks.sum(axis=(2, 3)) == expected[:, None] * kind_of[kinds[todo]]
+        ).all(1)
+        metrics.count(
+            "candidates",
+            int(accepted.sum()),
+            generator="sudoku_violation",
+            outcome="accepted",
+        )
+        metrics.count(
+            "candidates",
+            int((~accepted).sum()),
+            generator="sudoku_violation",
+            outcome="rejected",
+            reason="violations",
+        )
+        grids[todo[accepted]] = batch[accepted]
+        conflicts[todo[accepted]] = masks[accepted].any(axis=1)
+        todo = todo[~accepted]
+    return grids, conflicts
+
+
+def pick_option_cells(
+    conflicts: np.ndarray, rng: np.random.Generator, n_options: int = 4
+) -> np.ndarray:
+    """
+    (n, n_options, 2) cells of every board, the first one conflicting and the
+    others not, from masks of conflicting cells.
+    """
+    flat = conflicts.reshape(len(conflicts), 81)
+    keys = rng.random(flat.shape)
+    answer = np.argmax(np.where(flat, keys, -1), axis=1)
+    others = np.argsort(np.where(flat, 2, keys), axis=1)[:, : n_options - 1]
+    cells = np.concatenate([answer[:, None], others], axis=1)
+    return np.stack(np.divmod(cells, 9), axis=-1)
+
+
 def visualize_sudoku(sudoku: np.ndarray) -> plt.Axes:
+    import matplotlib.pyplot as plt
+
     _, ax = plt.subplots(figsize=(6, 6))
 
     # Wall color
@@ -109,32 +381,33 @@ def visualize_sudoku(sudoku: np.ndarray) -> plt.Axes:
     return ax
 
 
-def sudoku_grid_to_asp(sudoku_grid: np.ndarray) -> str:
-    asp = "% Defining the initial Sudoku grid\n"
-    for i in range(9):
-        for j in range(9):
-            if sudoku_grid[i, j] != 0:
-                asp += f"sudoku({i + 1},{j + 1},{sudoku_grid[i, j]}). "
-    return asp
+def get_base_asp_for_sudoku(sudoku_grid: np.ndarray) -> str:
+    if np.count_nonzero(sudoku_grid) < 81:
+        return get_fill_in_base_asp().replace("    ", "")
+    return get_base_asp().replace("    ", "")
 
 
-def get_missing_asp(sudoku_grid: np.ndarray) -> str:
-    missing_asp = ""
-    for i in range(1, 10):
-        for j in range(1, 10):
-            if sudoku_grid[i - 1, j - 1] == 0:
-                missing_asp += get_find_missing_asp(i, j)
-    return missing_asp
+def build_sudoku_instance(sudoku_grid: np.ndarray) -> AspInstance:
+    instance = AspInstance(get_base_asp_for_sudoku(sudoku_grid))
 
+    rows, cols = np.nonzero(sudoku_grid)
+    instance.comment("Defining the initial Sudoku grid")
+    instance.add_facts("sudoku", zip(rows + 1, cols + 1, sudoku_grid[rows, cols]))
 
-def get_asp_for_sudoku(sudoku_grid: np.ndarray) -> str:
-    asp_code = get_base_asp() + sudoku_grid_to_asp(sudoku_grid)
     if np.count_nonzero(sudoku_grid) < 81:
-        asp_code += get_missing_asp(sudoku_grid)
+        rows, cols = np.nonzero(sudoku_grid == 0)
+        instance.comment("Cells with a missing number")
+        instance.add_facts("missing", zip(rows + 1, cols + 1))
+
+    return instance
 
-    asp_code = asp_code.replace("    ", "")
 
-    return asp_code
+def get_instance_asp_for_sudoku(sudoku_grid: np.ndarray) -> str:
+    return build_sudoku_instance(sudoku_grid).to_asp()
+
+
+def get_asp_for_sudoku(sudoku_grid: np.ndarray) -> str:
+    return build_sudoku_instance(sudoku_grid).to_program()
 
 
 def generate_data(n_valid: int, n_invalid: int):
@@ -142,68 +415,26 @@ def generate_data(n_valid: int, n_invalid: int):
     invalid_data = []
     while len(valid_data) < n_valid:
         sudoku = generate_sudoku(valid=True)
+        metrics.attempt("sudoku_data", sudoku not in valid_data, "duplicate")
         if sudoku not in valid_data:
             valid_data.append(sudoku)
 
-    while len(invalid_data) < n_valid:
+    while len(invalid_data) < n_invalid:
         sudoku = generate_sudoku(valid=False)
+        metrics.attempt("sudoku_data", sudoku not in invalid_data, "duplicate")
         if sudoku not in invalid_data:
             invalid_data.append(sudoku)
 
     return valid_data, invalid_data
 
 
-def _generate_fill_in_options(missing_number: int) -> str:
+def _generate_fill_in_options(missing_number: int) -> tuple[list[str], str]:
     # generate_random three numbers that are not the missing number in range 1-9
     options = np.random.choice(
         [i for i in range(1, 10) if i != missing_number], 3, replace=False
     ).tolist()
     options.append(missing_number)
-    # shuffle the options
-    np.random.shuffle(options)
-    formatted_options = [f"{chr(65 + i)}) {options[i]}" for i in range(4)]
-    correct_option = chr(65 + options.index(missing_number))
-    return formatted_options, correct_option
-
-
-def _generate_valid_options(valid: bool) -> tuple[list[str], str]:
-    options = ["Yes", "No"]
-    np.random.shuffle(options)
-    formatted_options = [f"{chr(65 + i)}) {options[i]}" for i in range(2)]
-    correct_option = chr(65 + options.index("Yes" if valid else "No"))
-    return formatted_options, correct_option
-
-
-def format_sudoku_problem(
-    sudokus: list[np.ndarray],
-    problem_type: str,
-    missing_numbers: list[int] = None,
-    sudoku_is_valid: bool = True,
-) -> dict:
-    QUESTIONS = {
-        "validity": "Here you have a picture of a solved sudoku board. Can you tell me if it is valid? Give me a letter of a valid answer.",
-        "fill_in": "Here you have a picture of a sudoku board with one number missing, marked red color. Can you say what number is missing? Give me a letter of a valid answer.",
-    }
-
-    problems = []
-
-    for i, sudoku in enumerate(sudokus):
-        if problem_type == "validity":
-            options, answer = _generate_valid_options(sudoku_is_valid)
-        else:
-            missing_number = missing_numbers[i]
-            options, answer = _generate_fill_in_options(missing_number)
-
-        problems.append(
-            {
-                "question": QUESTIONS[problem_type],
-                "options": options,
-                "answer": answer,
-                "asp": get_asp_for_sudoku(np.array(sudoku)),
-                "image": visualize_sudoku(sudoku).get_figure(),
-            }
-        )
-    return problems
+    return format_options(options, missing_number)
 
 
 def remove_numbers(sudoku: np.ndarray, n: int) -> np.ndarray:
@@ -222,92 +453,169 @@ def _remove_random_number(sudoku: np.ndarray) -> tuple[np.ndarray, int]:
     return sudoku, original_value
 
 
-def export_data(root_dir: str, n_samples: int, fill_in: bool = False):
-    _dirname = os.path.dirname(__file__)
-
-    create_directory(root_dir)
-
-    if not fill_in:
-        data_dir = os.path.join(root_dir, "sudoku_validity")
-        create_directory(data_dir)
-
-        valid_data, invalid_data = generate_data(n_samples + 1, n_samples + 1)
-        valid_problems = format_sudoku_problem(
-            valid_data, "validity", sudoku_is_valid=True
-        )
-        invalid_problems = format_sudoku_problem(
-            invalid_data, "validity", sudoku_is_valid=False
-        )
-        valid_problem_sample = valid_problems.pop()
-        invalid_problem_sample = invalid_problems.pop()
-
-        all_problems = valid_problems + invalid_problems
-        np.random.shuffle(all_problems)
-
-        with open(
-            os.path.join(_dirname, "prompt_templates/sudoku_validity.txt"), "r"
-        ) as f:
-            prompt_template = f.read()
-
-        valid_prompt_template = prompt_template.replace(
-            "[[ASP]]", valid_problem_sample["asp"]
-        )
-        invalid_prompt_template = prompt_template.replace(
-            "[[ASP]]", invalid_problem_sample["asp"]
-        )
-
-        with open(os.path.join(data_dir, "valid_prompt_template.txt"), "w") as f:
-            f.write(valid_prompt_template)
-
-        with open(os.path.join(data_dir, "invalid_prompt_template.txt"), "w") as f:
-            f.write(invalid_prompt_template)
-
-        valid_problem_sample["image"].savefig(
-            os.path.join(data_dir, "valid_prompt.png")
-        )
-        invalid_problem_sample["image"].savefig(
-            os.path.join(data_dir, "invalid_prompt.png")
-        )
-
-        export_problems(all_problems, data_dir)
-
-    else:
-        data_dir = os.path.join(root_dir, "sudoku_fill_in")
-        create_directory(data_dir)
-
-        valid_data, _ = generate_data(n_samples + 1, 0)
-        removed_numbers_data = []
-        removed_numbers = []
-        for i, sudoku in enumerate(valid_data):
-            while True:
-                data, removed_number = _remove_random_number(np.array(sudoku))
-                asp = get_asp_for_sudoku(data)
-                if ClingoSolver.get_models_count(asp) == 1:
-                    break
-            removed_numbers_data.append(data)
-            removed_numbers.append(removed_number)
-
-        fill_in_problems = format_sudoku_problem(
-            removed_numbers_data, "fill_in", missing_numbers=removed_numbers
-        )
-
-        sample_fill_in_problem = fill_in_problems.pop()
-        with open(
-            os.path.join(_dirname, "prompt_templates/sudoku_fill_in.txt"), "r"
-        ) as f:
-            prompt_template = f.read()
-
-        prompt_template = prompt_template.replace(
-            "[[ASP]]", sample_fill_in_problem["asp"]
-        )
-        prompt_template = prompt_template.replace(
-            "[[OPTIONS]]", "\n".join(sample_fill_in_problem["options"])
-        )
-        with open(os.path.join(data_dir, "prompt_template.txt"), "w") as f:
-            f.write(prompt_template)
-
-        sample_fill_in_problem["image"].savefig(
-            os.path.join(data_dir, "sample_prompt.png")
-        )
-
-        export_problems(fill_in_problems, data_dir)
+def remove_number_with_unique_answer(sudoku: np.ndarray) -> tuple[np.ndarray, int]:
+    while True:
+        data, removed_number = _remove_random_number(sudoku)
+        instance = build_sudoku_instance(data)
+        unique = ClingoSolver.get_models_count(instance) == 1
+        metrics.attempt("sudoku_fill_in", unique, "multiple_solutions")
+        if unique:
+            return data, int(removed_number)
+
+
+class SudokuTask(LogicTask):
+    def render_spec(self, spec: dict) -> plt.Figure:
+        return visualize_sudoku(spec["grid"]).get_figure()
+
+    def serialize_spec(self, spec: dict) -> str:
+        return get_instance_asp_for_sudoku(np.array(spec["grid"]))
+
+    def pack_spec(self, spec: dict) -> dict:
+        # The cells in reading order as a string of digits, 0 for empty cells.
+        return {**spec, "grid": "".join(map(str, np.ravel(spec["grid"])))}
+
+    def unpack_spec(self, packed: dict) -> dict:
+        grid = packed["grid"]
+        if isinstance(grid, str):
+            grid = np.array(list(grid), dtype=int).reshape(9, 9).tolist()
+        return {**packed, "grid": grid}
+
+
+class SudokuValidityTask(SudokuTask, ValidityTask):
+    name = "sudoku_validity"
+    prompt_template = "sudoku_validity.txt"
+
+    def base_asp(self) -> str:
+        return get_base_asp().replace("    ", "")
+
+    def generate(self, n: int, rng: np.random.Generator) -> list[dict]:
+        # sudokum and the helpers above draw from the global generators.
+        with seeded_globals(rng):
+            valid_data, invalid_data = generate_data(n // 2, n - n // 2)
+            specs = []
+            for valid, grids in [(True, valid_data), (False, invalid_data)]:
+                for grid in grids:
+                    options, answer = generate_valid_options(valid)
+                    specs.append(
+                        {
+                            "question": VALIDITY_QUESTION,
+                            "options": options,
+                            "answer": answer,
+                            "grid": grid,
+                            "valid": valid,
+                        }
+                    )
+        return specs
+
+
+class SudokuFillInTask(SudokuTask):
+    name = "sudoku_fill_in"
+    prompt_template = "sudoku_fill_in.txt"
+
+    def base_asp(self) -> str:
+        return get_fill_in_base_asp().replace("    ", "")
+
+    def generate(self, n: int, rng: np.random.Generator) -> list[dict]:
+        # sudokum and the helpers above draw from the global generators.
+        with seeded_globals(rng):
+            valid_data, _ = generate_data(n, 0)
+            specs = []
+            for sudoku in valid_data:
+                grid, missing_number = remove_number_with_unique_answer(
+                    np.array(sudoku)
+                )
+                options, answer = _generate_fill_in_options(missing_number)
+                specs.append(
+                    {
+                        "question": FILL_IN_QUESTION,
+                        "options": options,
+                        "answer": answer,
+                        "grid": grid.tolist(),
+                        "missing_number": missing_number,
+                    }
+                )
+        return specs
+
+    def check(self, spec: dict, models: list[list[str]]) -> bool:
+        return models == [[f"answer({spec['missing_number']})"]]
+
+
+def _cell_text(row: int, column: int) -> str:
+    return f"row {row}, column {column}"
+
+
+class SudokuViolationTask(SudokuTask):
+    name = "sudoku_violation"
+    prompt_template = "sudoku_violation.txt"
+
+    def base_asp(self) -> str:
+        return get_violation_base_asp().replace("    ", "")
+
+    def generate(self, n: int, rng: np.random.Generator) -> list[dict]:
+        # sudokum, which makes the source grids without a sudoku bank, and
+        # `format_options` draw from the global generators.
+        with seeded_globals(rng):
+            kinds = np.arange(n) % len(VIOLATIONS)
+            maxima = np.array([MAX_VIOLATIONS[kind] for kind in VIOLATIONS])
+            counts = rng.integers(1, maxima[kinds] + 1)
+            grids, conflicts = generate_violation_grids(kinds, counts, rng)
+            cells = pick_option_cells(conflicts, rng) + 1
+
+            specs = []
+            for grid, mask, options, kind, count in zip(
+                grids, conflicts, cells.tolist(), kinds, counts
+            ):
+                answer_cell = options[0]
+                texts = [_cell_text(*cell) for cell in options]
+                formatted, answer = format_options(texts, texts[0])
+                specs.append(
+                    {
+                        "question": VIOLATION_QUESTION,
+                        "options": formatted,
+                        "answer": answer,
+                        "grid": grid.tolist(),
+                        "violation": VIOLATIONS[kind],
+                        "n_violations": int(count),
+                        "conflicts": (np.argwhere(mask) + 1).tolist(),
+                        "option_cells": sorted(options),
+                        "answer_cell": answer_cell,
+                    }
+                )
+            return specs
+
+    def serialize_spec(self, spec: dict) -> str:
+        grid = np.array(spec["grid"])
+        instance = AspInstance(self.base_asp())
+        rows, cols = np.nonzero(grid)
+        instance.comment("Defining the filled Sudoku grid")
+        instance.add_facts("sudoku", zip(rows + 1, cols + 1, grid[rows, cols]))
+        instance.comment("Cells given as options")
+        instance.add_facts("option", spec["option_cells"])
+        return instance.to_asp()
+
+    def check(self, spec: dict, models: list[list[str]]) -> bool:
+        row, column = spec["answer_cell"]
+        return models == [[f"answer({row},{column})"]]
+
+    def answer_text(self, models: list[list[str]]) -> str | None:
+        if len(models) != 1 or len(models[0]) != 1:
+            return None
+        atom = clingo.parse_term(models[0][0])
+        if atom.name != "answer" or len(atom.arguments) != 2:
+            return None
+        return _cell_text(*(argument.number for argument in atom.arguments))
+
+    def label(self, spec: dict) -> str:
+        return spec["violation"]
+
+
+register_task(SudokuValidityTask())
+register_task(SudokuFillInTask())
+register_task(SudokuViolationTask())
+
+
+def export_data(
+    root_dir: str, n_samples: int, fill_in: bool = False, output_format: str = "json"
+):
+    task = TASKS["sudoku_fill_in" if fill_in else "sudoku_validity"]
+    export_task(task, root_dir, n_samples, output_format=output_format)
@@ -0,0 +1,196 @@
+"""
+A memory-mapped bank of solved sudoku grids that generators draw from instead
+of generating grids with sudokum while exporting.
+
+The bank is built offline with `python -m pipeline.bank build`. It is a header
+followed by one fixed-size record per grid:
+
+    magic, version, record size, number of grids, sha256 of the records
+    rows 2 to 9 of every grid, two cells per byte
+
+Grids are stored in a canonical form whose digits are relabelled so that the
+first row reads 1 to 9, which is therefore not stored, and all grids of a bank
+are distinct in that form. Drawn grids get a random relabelling of their
+digits, so no two draws give the same grid up to the names of the digits.
+
+A bitmap next to the bank (`<path>.used`) marks the grids handed out, and is
+updated under a file lock, so that no grid is drawn twice by any run or shard
+using the same bank. Draws read single records, whatever the size of the bank.
+"""
+
+import fcntl
+import hashlib
+import os
+import struct
+from contextlib import contextmanager
+
+import numpy as np
+
+MAGIC = b"SUDOKUB\0"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQ32s")
+RECORD_BYTES = 36
+USED_SUFFIX = ".used"
+# Records hashed at a time when checking a bank.
+HASH_CHUNK = 2**16
+# Rounds of random probes before the unused grids are listed from the bitmap.
+PROBE_ROUNDS = 4
+
+_bank: "SudokuBank | None" = None
+
+
+def canonicalize(grids: np.ndarray) -> np.ndarray:
+    """Relabels the digits of a batch of grids so the first rows read 1 to 9."""
+    grids = np.asarray(grids)
+    n = len(grids)
+    labels = np.zeros((n, 10), dtype=np.uint8)
+    labels[np.arange(n)[:, None], grids[:, 0, :]] = np.arange(1, 10)
+    return labels[np.arange(n)[:, None, None], grids]
+
+
+def relabel(grids: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Gives the digits of every grid of a batch a random relabelling."""
+    n = len(grids)
+    digits = np.zeros((n, 10), dtype=int)
+    digits[:, 1:] = rng.permuted(np.broadcast_to(np.arange(1, 10), (n, 9)), axis=1)
+    return digits[np.arange(n)[:, None, None], grids]
+
+
+def pack(grids: np.ndarray) -> np.ndarray:
+    """(n, RECORD_BYTES) records of a batch of canonical grids."""
+    cells = np.asarray(grids, dtype=np.uint8)[:, 1:, :].reshape(len(grids), 72)
+    return (cells[:, ::2] << 4) | cells[:, 1::2]
+
+
+def unpack(records: np.ndarray) -> np.ndarray:
+    """Canonical (n, 9, 9) grids of a batch of records."""
+    n = len(records)
+    cells = np.empty((n, 72), dtype=np.uint8)
+    cells[:, ::2] = records >> 4
+    cells[:, 1::2] = records & 0x0F
+    first_row = np.broadcast_to(np.arange(1, 10, dtype=np.uint8), (n, 9))
+    return np.concatenate([first_row, cells], axis=1).reshape(n, 9, 9)
+
+
+def records_digest(records: np.ndarray) -> bytes:
+    digest = hashlib.sha256()
+    for start in range(0, len(records), HASH_CHUNK):
+        digest.update(np.ascontiguousarray(records[start : start + HASH_CHUNK]))
+    return digest.digest()
+
+
+def write_bank(path: str, records: np.ndarray):
+    """Writes the records of distinct canonical grids as a bank file."""
+    records = np.ascontiguousarray(records, dtype=np.uint8)
+    header = HEADER.pack(
+        MAGIC, VERSION, RECORD_BYTES, len(records), records_digest(records)
+    )
+    # The bank replaces an older one only once it is complete, and the grids
+    # marked as used in the old bank are meaningless in the new one.
+    with open(path + ".tmp", "wb") as f:
+        f.write(header)
+        f.write(records.tobytes())
+    os.replace(path + ".tmp", path)
+    if os.path.exists(path + USED_SUFFIX):
+        os.remove(path + USED_SUFFIX)
+
+
+class SudokuBank:
+    def __init__(self, path: str, verify: bool = True):
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+        if len(header) != HEADER.size:
+            raise ValueError(f"{path} is not a sudoku bank")
+        magic, version, record_bytes, count, digest = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a sudoku bank")
+        if version != VERSION or record_bytes != RECORD_BYTES:
+            raise ValueError(f"{path} has unsupported bank version {version}")
+        if os.path.getsize(path) != HEADER.size + count * RECORD_BYTES:
+            raise ValueError(f"{path} is truncated")
+        self.records = np.memmap(
+            path, np.uint8, "r", offset=HEADER.size, shape=(count, RECORD_BYTES)
+        )
+        self.digest = digest
+        if verify and records_digest(self.records) != digest:
+            raise ValueError(f"{path} does not match its checksum")
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def grids(self, indices: np.ndarray) -> np.ndarray:
+        """Canonical grids at the given indices."""
+        return unpack(np.asarray(self.records[np.asarray(indices)]))
+
+    @contextmanager
+    def _used(self):
+        # The bitmap is read and written under an exclusive lock, which lockf
+        # also takes on network filesystems shared by the shards.
+        path = self.path + USED_SUFFIX
+        size = (len(self) + 7) // 8
+        with open(path, "a+b") as f:
+            fcntl.lockf(f, fcntl.LOCK_EX)
+            try:
+                if os.fstat(f.fileno()).st_size < size:
+                    f.truncate(size)
+                used = np.memmap(f, np.uint8, "r+", shape=(size,))
+                yield used
+                used.flush()
+            finally:
+                fcntl.lockf(f, fcntl.LOCK_UN)
+
+    def remaining(self) -> int:
+        with self._used() as used:
+            return len(self) - int(np.unpackbits(used).sum())
+
+    def take(self, n: int, rng: np.random.Generator) -> np.ndarray:
+        """
+        n grids that were never drawn before, with randomly relabelled digits.
+        Raises ValueError if fewer than n grids are left.
+        """
+        with self._used() as used:
+            indices = _draw_unused(used, len(self), n, rng)
+            np.bitwise_or.at(used, indices >> 3, (1 << (indices & 7)).astype(np.uint8))
+        return relabel(self.grids(np.sort(indices)), rng)
+
+
+def _is_used(used: np.ndarray, indices: np.ndarray) -> np.ndarray:
+    return (used[indices >> 3] >> (indices & 7)) & 1 == 1
+
+
+def _draw_unused(
+    used: np.ndarray, count: int, n: int, rng: np.random.Generator
+) -> np.ndarray:
+    # Random probes find unused grids in constant time while the bank is
+    # mostly unused. Only a nearly exhausted bank lists its unused grids.
+    found = np.empty(0, dtype=np.int64)
+    for _ in range(PROBE_ROUNDS if count else 0):
+        need = n - len(found)
+        if need <= 0:
+            break
+        probes = rng.integers(count, size=2 * need)
+        probes = probes[~_is_used(used, probes)]
+        found = np.unique(np.concatenate([found, probes]))
+    if len(found) < n:
+        unused = np.flatnonzero(np.unpackbits(used, bitorder="little")[:count] == 0)
+        if len(unused) < n:
+            raise ValueError(f"The sudoku bank has only {len(unused)} grids left")
+        return rng.choice(unused, n, replace=False)
+    return rng.permutation(found)[:n]
+
+
+def set_bank(path: str | None, verify: bool = False):
+    """Makes the sudoku generators of this process draw from a bank."""
+    global _bank
+    _bank = SudokuBank(path, verify) if path is not None else None
+
+
+def current() -> SudokuBank | None:
+    return _bank
+
+
+def draw(n: int, rng: np.random.Generator | None = None) -> np.ndarray:
+    """n unused grids of the current bank, seeded from np.random by default."""
+    rng = rng or np.random.default_rng(np.random.randint(2**31))
+    return _bank.take(n, rng)
@@ -1,5 +1,13 @@
+import io
 import json
 import os
+from functools import lru_cache
+
+import numpy as np
+
+BASE_ASP_FILENAME = "base.lp"
+OUTPUT_FORMATS = ["json", "jsonl"]
+INCLUDE_BASE_ASP = f'#include "{BASE_ASP_FILENAME}".\n'
 
 
 def create_directory(path: str):
@@ -7,10 +15,100 @@ def create_directory(path: str):
         os.makedirs(path)
 
 
+@lru_cache(maxsize=None)
+def _read_base_asp(path: str, mtime_ns: int, size: int) -> str:
+    # The modification time and size are part of the key, so a base encoding rewritten
+    # in the same process (e.g. by `pipeline.rebuild reserialize`) is read again.
+    with open(path, "r") as f:
+        return f.read()
+
+
+def load_asp_program(asp_path: str) -> str:
+    """
+    Reads an exported `.asp` file and joins it with the shared base encoding
+    it includes, if any. The exported files are valid clingo input on their
+    own, this is only needed when the full program text is required.
+    """
+    with open(asp_path, "r") as f:
+        program = f.read()
+
+    if not program.startswith(INCLUDE_BASE_ASP):
+        return program
+
+    base_path = os.path.join(os.path.dirname(asp_path), BASE_ASP_FILENAME)
+    stat = os.stat(base_path)
+    base_asp = _read_base_asp(base_path, stat.st_mtime_ns, stat.st_size)
+    return base_asp + program[len(INCLUDE_BASE_ASP) :]
+
+
+def save_image(image, path: str):
+    """
+    Saves a matplotlib figure or an (H, W, channels) uint8 image array.
+    Figures are closed once saved.
+    """
+    import matplotlib.pyplot as plt
+
+    if isinstance(image, np.ndarray):
+        plt.imsave(path, image)
+    else:
+        image.savefig(path)
+        plt.close(image)
+
+
+def image_to_array(image) -> np.ndarray:
+    """
+    Converts a matplotlib figure or an image array with an alpha channel to an
+    (H, W, 3) uint8 array. Figures are closed once drawn.
+    """
+    if isinstance(image, np.ndarray):
+        return image[..., :3]
+    import matplotlib.pyplot as plt
+
+    image.canvas.draw()
+    array = np.asarray(image.canvas.buffer_rgba())[..., :3].copy()
+    plt.close(image)
+    return array
+
+
+def encode_image(image) -> bytes:
+    """PNG bytes of a matplotlib figure or an image array."""
+    buffer = io.BytesIO()
+    save_image(image, buffer)
+    return buffer.getvalue()
+
+
+def format_options(
+    options: list, answer, rng: np.random.Generator | None = None
+) -> tuple[list[str], str]:
+    """
+    Shuffles the options, with the global generator unless an rng is given,
+    and labels them with letters A, B, C...
+    """
+    (rng or np.random).shuffle(options)
+    formatted_options = [f"{chr(65 + i)}) {option}" for i, option in enumerate(options)]
+    correct_option = chr(65 + options.index(answer))
+    return formatted_options, correct_option
+
+
+def option_text(option: str) -> str:
+    """Text of an option formatted by `format_options`, without its letter."""
+    return option.split(") ", 1)[-1]
+
+
+def generate_valid_options(
+    valid: bool, rng: np.random.Generator | None = None
+) -> tuple[list[str], str]:
+    return format_options(["Yes", "No"], "Yes" if valid else "No", rng)
+
+
 def export_problems(
     problems: list[dict],
     data_dir: str,
+    base_asp: str | None = None,
+    output_format: str = "json",
 ):
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
 
     asp_dir = os.path.join(data_dir, "asp_code")
     images_dir = os.path.join(data_dir, "images")
@@ -19,19 +117,41 @@ def export_problems(
     create_directory(asp_dir)
     create_directory(images_dir)
 
+    # The base encoding is shared by all problems of a task, so it is written
+    # once and every problem file only holds its instance facts.
+    if base_asp is not None:
+        with open(os.path.join(asp_dir, BASE_ASP_FILENAME), "w") as f:
+            f.write(base_asp)
+
     for i, problem in enumerate(problems):
         id = f"problem_{i}"
         asp_path = os.path.join(asp_dir, f"{id}.asp")
         image_path = os.path.join(images_dir, f"{id}.png")
 
-        problem["image"].savefig(image_path)
+        # Images may already have been written to `images/<id>.png`.
+        if "image" in problem:
+            save_image(problem.pop("image"), image_path)
         with open(asp_path, "w") as f:
+            if base_asp is not None:
+                f.write(INCLUDE_BASE_ASP)
             f.write(problem["asp"])
 
         del problems[i]["asp"]
-        del problems[i]["image"]
         problems[i]["id"] = id
 
-    # Save the problems to a json file
-    with open(os.path.join(data_dir, "data.json"), "w") as f:
-        json.dump(problems, f, indent=4)
+    # Save the problems to a json file, or a json lines file with one problem
+    # per line
+    with open(os.path.join(data_dir, f"data.{output_format}"), "w") as f:
+        if output_format == "jsonl":
+            for problem in problems:
+                f.write(json.dumps(problem) + "\n")
+        else:
+            json.dump(problems, f, indent=4)
+
+
+def read_problems(data_dir: str, output_format: str = "json") -> list[dict]:
+    """Reads the problems written by `export_problems`."""
+    with open(os.path.join(data_dir, f"data.{output_format}"), "r") as f:
+        if output_format == "jsonl":
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
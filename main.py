@@ -1,22 +1,147 @@
-from generators.graph import export_data as export_graph_data
-from generators.set_cards import export_data as export_set_data
-from generators.sudoku import export_data as export_sudoku_data
+import argparse
+import json
+import os
+import sys
+
+from generators.sudoku_bank import SudokuBank
+from generators.utils import OUTPUT_FORMATS
+from pipeline import memory, metrics
+from pipeline.scheduler import run
+from pipeline.tasks import TASKS, sample_counts, select_tasks
+from solvers import profiles
 
 N_SAMPLES = 200
 ROOT_DIR = "./data"
 
-if __name__ == "__main__":
-    print("Exporting data...")
 
-    print("Exporting Sudoku data...")
-    export_sudoku_data(ROOT_DIR, N_SAMPLES, fill_in=False)
-    export_sudoku_data(ROOT_DIR, N_SAMPLES, fill_in=True)
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Export logic task data.")
+    parser.add_argument(
+        "--tasks",
+        nargs="+",
+        default=["*"],
+        metavar="PATTERN",
+        help="Tasks to export, as names or shell patterns such as 'set_*'.",
+    )
+    parser.add_argument(
+        "--list-tasks", action="store_true", help="List the tasks and exit."
+    )
+    parser.add_argument(
+        "--n-samples",
+        type=int,
+        default=N_SAMPLES,
+        help="Number of samples of every task.",
+    )
+    parser.add_argument(
+        "--samples",
+        action="append",
+        default=[],
+        metavar="TASK=N",
+        help="Number of samples of the matching tasks, can be repeated.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of worker processes shared by all tasks.",
+    )
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="json")
+    parser.add_argument("--output-dir", default=ROOT_DIR)
+    parser.add_argument(
+        "--memory-budget",
+        type=memory.parse_bytes,
+        default=None,
+        metavar="SIZE",
+        help="Memory of the whole run, e.g. 4G. Batch sizes and the number of "
+        "jobs in flight are adapted to stay within it.",
+    )
+    parser.add_argument(
+        "--solver-profiles",
+        metavar="PATH",
+        help="Clingo configuration of every task, as written by "
+        "benchmarks.autotune.",
+    )
+    parser.add_argument(
+        "--sudoku-bank",
+        metavar="PATH",
+        help="Draw the sudoku grids from a bank built with pipeline.bank, "
+        "never reusing a grid drawn by an earlier run.",
+    )
+    parser.add_argument(
+        "--augment",
+        action="store_true",
+        help="Augment the problem images with color jitter, palette swaps, "
+        "scaling, rotations, noise and JPEG-like artifacts.",
+    )
+    parser.add_argument(
+        "--no-specs",
+        action="store_true",
+        help="Do not save the specs needed to rebuild images and programs.",
+    )
+    parser.add_argument(
+        "--metrics-report",
+        metavar="PATH",
+        help="Write the timings, counters and rejection rates as JSON.",
+    )
+    parser.add_argument(
+        "--prometheus",
+        metavar="PATH",
+        help="Write the metrics in the Prometheus text format.",
+    )
+    return parser.parse_args(argv)
+
+
+def _write_metrics(args: argparse.Namespace):
+    if args.metrics_report:
+        with open(args.metrics_report, "w") as f:
+            json.dump(metrics.report(), f, indent=4)
+        print(f"Metrics report written to {args.metrics_report}")
+    if args.prometheus:
+        with open(args.prometheus, "w") as f:
+            f.write(metrics.to_prometheus())
+        print(f"Prometheus metrics written to {args.prometheus}")
 
-    print("Exporting Graph data...")
-    export_graph_data(ROOT_DIR, N_SAMPLES, fill_in=False)
-    export_graph_data(ROOT_DIR, N_SAMPLES, fill_in=True)
 
-    print("Exporting SET data...")
-    export_set_data(ROOT_DIR, N_SAMPLES)
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    if args.list_tasks:
+        print("\n".join(TASKS))
+        return 0
 
-    print("Data exported successfully!")
+    try:
+        names = select_tasks(args.tasks)
+        n_samples = sample_counts(names, args.n_samples, args.samples)
+        solver_profiles = None
+        if args.solver_profiles:
+            solver_profiles = profiles.load_table(args.solver_profiles)
+            profiles.set_table(solver_profiles)
+        if args.sudoku_bank:
+            SudokuBank(args.sudoku_bank)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    collect_metrics = bool(args.metrics_report or args.prometheus)
+    metrics.enable(collect_metrics)
+    print(f"Exporting {len(names)} tasks with {args.workers} workers...")
+    exit_code = run(
+        names,
+        args.output_dir,
+        n_samples,
+        seed=args.seed,
+        workers=args.workers,
+        output_format=args.format,
+        collect_metrics=collect_metrics,
+        save_specs=not args.no_specs,
+        memory_budget=args.memory_budget,
+        solver_profiles=solver_profiles,
+        sudoku_bank=args.sudoku_bank,
+        augment=args.augment,
+    )
+    _write_metrics(args)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
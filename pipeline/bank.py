@@ -0,0 +1,112 @@
+"""
+Builds and inspects the sudoku bank that the sudoku tasks draw grids from.
+
+Grids are generated with sudokum in worker processes, canonicalized and
+deduplicated, then written as a memory-mapped bank (see
+`generators.sudoku_bank`):
+
+    python -m pipeline.bank build --output sudoku.bank --size 1000000 --workers 8
+    python -m pipeline.bank info sudoku.bank
+    python main.py --tasks "sudoku_*" --sudoku-bank sudoku.bank
+
+Building is seeded, so the same seed and size give the same bank.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from generators.sudoku import generate_valid_sudoku
+from generators.sudoku_bank import (
+    USED_SUFFIX,
+    SudokuBank,
+    canonicalize,
+    pack,
+    write_bank,
+)
+
+# Grids generated by a worker at a time.
+CHUNK = 1000
+
+
+def _generate_chunk(seed: int, n: int) -> np.ndarray:
+    # sudokum draws from the random module, the other generators from numpy.
+    random.seed(seed)
+    np.random.seed(seed)
+    return pack(canonicalize([generate_valid_sudoku() for _ in range(n)]))
+
+
+def build_records(
+    size: int, workers: int = 1, seed: int = 0, progress_seconds: float = 5.0
+) -> np.ndarray:
+    """Records of `size` distinct canonical grids, in the order generated."""
+    seen = {}
+    chunk = 0
+    last = time.monotonic()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while len(seen) < size:
+            # Chunks are seeded by their index, so the bank does not depend on
+            # the number of workers.
+            n_chunks = max(1, min(workers, -(-(size - len(seen)) // CHUNK)))
+            seeds = [seed * 2**20 + chunk + i for i in range(n_chunks)]
+            chunk += n_chunks
+            for chunk_records in executor.map(
+                _generate_chunk, seeds, [CHUNK] * n_chunks
+            ):
+                for record in chunk_records:
+                    seen.setdefault(record.tobytes(), None)
+            if time.monotonic() - last >= progress_seconds:
+                print(f"{min(len(seen), size)}/{size} grids", flush=True)
+                last = time.monotonic()
+
+    keys = list(seen)[:size]
+    return np.frombuffer(b"".join(keys), dtype=np.uint8).reshape(size, -1)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Build a bank of distinct grids.")
+    build.add_argument("--output", required=True)
+    build.add_argument("--size", type=int, required=True)
+    build.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    build.add_argument("--seed", type=int, default=0)
+
+    info = commands.add_parser("info", help="Check a bank and count its grids.")
+    info.add_argument("path")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    if args.command == "build":
+        if args.size < 1:
+            print("--size must be positive", file=sys.stderr)
+            return 2
+        start = time.perf_counter()
+        write_bank(args.output, build_records(args.size, args.workers, args.seed))
+        print(
+            f"{args.size} grids written to {args.output} "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+        return 0
+
+    try:
+        bank = SudokuBank(args.path)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+    print(f"{args.path}: {len(bank)} grids, checksum {bank.digest.hex()} ok")
+    if os.path.exists(args.path + USED_SUFFIX):
+        print(f"{bank.remaining()} grids never drawn")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
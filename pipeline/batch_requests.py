@@ -0,0 +1,267 @@
+"""
+Batch-request JSONL files for LLM batch APIs, built from generated problems.
+
+Problems are generated, rendered and PNG-encoded in memory one chunk at a time
+and written as requests whose prompt is the task template filled with k
+examples and the problem, with the example and problem images inlined as
+base64. Only one chunk is held in memory and the output is split into files of
+at most `--max-requests` requests and `--max-bytes` bytes:
+
+    python -m pipeline.batch_requests --tasks "sudoku_*" --n-samples 1000 \\
+        --shots 2 --api openai --model gpt-4o --output-dir ./requests
+
+Every task gets `requests-<i>.jsonl` files and an `answers.jsonl` file with
+the answer and spec of every request id.
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+
+import numpy as np
+
+from generators.prompts import load_prompt_template
+from generators.registry import LogicTask
+from generators.utils import create_directory, encode_image
+from pipeline.tasks import TASKS, sample_counts, select_tasks
+
+APIS = ["openai", "anthropic"]
+MAX_BYTES = 100 * 1024 * 1024
+MAX_REQUESTS = 50_000
+# Matplotlib warns when more than 20 figures are open at once.
+CHUNK_SIZE = 16
+
+
+def _image_url(png: bytes) -> str:
+    return "data:image/png;base64," + base64.b64encode(png).decode("ascii")
+
+
+def openai_request(
+    custom_id: str, model: str, prompt: str, images: list[bytes], max_tokens: int
+) -> dict:
+    content = [
+        {"type": "image_url", "image_url": {"url": _image_url(image)}}
+        for image in images
+    ]
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": model,
+            "max_tokens": max_tokens,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": content + [{"type": "text", "text": prompt}],
+                }
+            ],
+        },
+    }
+
+
+def anthropic_request(
+    custom_id: str, model: str, prompt: str, images: list[bytes], max_tokens: int
+) -> dict:
+    content = [
+        {
+            "type": "image",
+            "source": {
+                "type": "base64",
+                "media_type": "image/png",
+                "data": base64.b64encode(image).decode("ascii"),
+            },
+        }
+        for image in images
+    ]
+    return {
+        "custom_id": custom_id,
+        "params": {
+            "model": model,
+            "max_tokens": max_tokens,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": content + [{"type": "text", "text": prompt}],
+                }
+            ],
+        },
+    }
+
+
+REQUEST_BUILDERS = {"openai": openai_request, "anthropic": anthropic_request}
+
+
+class ShardedWriter:
+    """
+    Writes lines to `<prefix>-<i>.jsonl` files, starting a new file before one
+    would exceed `max_lines` lines or `max_bytes` bytes.
+    """
+
+    def __init__(self, prefix: str, max_bytes: int, max_lines: int):
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_lines = max_lines
+        self.paths: list[str] = []
+        self._file = None
+        self._bytes = 0
+        self._lines = 0
+
+    def write(self, line: str):
+        data = (line + "\n").encode()
+        if len(data) > self.max_bytes:
+            raise ValueError(f"A line of {len(data)} bytes exceeds the size limit")
+        if (
+            self._file is None
+            or self._bytes + len(data) > self.max_bytes
+            or self._lines >= self.max_lines
+        ):
+            self._open_next()
+        self._file.write(data)
+        self._bytes += len(data)
+        self._lines += 1
+
+    def _open_next(self):
+        self.close()
+        path = f"{self.prefix}-{len(self.paths)}.jsonl"
+        self.paths.append(path)
+        self._file = open(path, "wb")
+        self._bytes = self._lines = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _generate(task: LogicTask, n: int, rng: np.random.Generator) -> list[dict]:
+    """
+    At least n specs of a task, shuffled. Validity tasks generate half of the
+    count for each label, so odd counts are rounded up to even ones.
+    """
+    specs = []
+    while len(specs) < n:
+        wanted = n - len(specs)
+        generated = task.generate(wanted + wanted % 2, rng)
+        if not generated:
+            raise ValueError(f"{task.name} generated no problems")
+        specs += generated
+    return [specs[i] for i in rng.permutation(len(specs))]
+
+
+def _rendered(task: LogicTask, specs: list[dict]) -> list[tuple[dict, str, bytes]]:
+    images = [encode_image(image) for image in task.render(specs)]
+    return list(zip(specs, task.serialize(specs), images))
+
+
+def build_batch_requests(
+    task: LogicTask,
+    output_dir: str,
+    n_samples: int,
+    model: str,
+    api: str = "openai",
+    shots: int = 1,
+    max_tokens: int = 4096,
+    rng: np.random.Generator | None = None,
+    max_bytes: int = MAX_BYTES,
+    max_requests: int = MAX_REQUESTS,
+    chunk_size: int = CHUNK_SIZE,
+) -> list[str]:
+    """
+    Writes the batch requests of n problems of a task to
+    `<output_dir>/<task.name>` and returns the paths of the request files.
+    """
+    rng = rng or np.random.default_rng(np.random.randint(2**31))
+    build_request = REQUEST_BUILDERS[api]
+    template = load_prompt_template(task.prompt_template)
+    data_dir = os.path.join(output_dir, task.name)
+    create_directory(data_dir)
+
+    # The same examples are used in every prompt of the task.
+    examples = _rendered(task, _generate(task, shots, rng)[:shots]) if shots else []
+    example_values = [task.prompt_values(spec, asp) for spec, asp, _ in examples]
+    example_images = [image for _, _, image in examples]
+
+    requests = ShardedWriter(
+        os.path.join(data_dir, "requests"), max_bytes, max_requests
+    )
+    with requests, open(os.path.join(data_dir, "answers.jsonl"), "w") as answers:
+        written = 0
+        while written < n_samples:
+            specs = _generate(task, min(chunk_size, n_samples - written), rng)
+            for spec, asp, image in _rendered(task, specs)[: n_samples - written]:
+                custom_id = f"{task.name}-{written}"
+                prompt = template.render(example_values, task.query_values(spec))
+                request = build_request(
+                    custom_id, model, prompt, example_images + [image], max_tokens
+                )
+                requests.write(json.dumps(request))
+                answers.write(
+                    json.dumps(
+                        {
+                            "custom_id": custom_id,
+                            "answer": spec["answer"],
+                            "asp": asp,
+                            "spec": spec,
+                        }
+                    )
+                    + "\n"
+                )
+                written += 1
+
+    return requests.paths
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tasks", nargs="+", default=["*"], metavar="PATTERN")
+    parser.add_argument("--n-samples", type=int, default=200)
+    parser.add_argument("--samples", action="append", default=[], metavar="TASK=N")
+    parser.add_argument("--shots", type=int, default=1)
+    parser.add_argument("--api", choices=APIS, default="openai")
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--max-tokens", type=int, default=4096)
+    parser.add_argument("--max-bytes", type=int, default=MAX_BYTES)
+    parser.add_argument("--max-requests", type=int, default=MAX_REQUESTS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", default="./requests")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    try:
+        names = select_tasks(args.tasks)
+        n_samples = sample_counts(names, args.n_samples, args.samples)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    for name in names:
+        np.random.seed(args.seed)
+        paths = build_batch_requests(
+            TASKS[name],
+            args.output_dir,
+            n_samples[name],
+            args.model,
+            api=args.api,
+            shots=args.shots,
+            max_tokens=args.max_tokens,
+            rng=np.random.default_rng(args.seed),
+            max_bytes=args.max_bytes,
+            max_requests=args.max_requests,
+        )
+        print(f"{name}: {n_samples[name]} requests in {len(paths)} files", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
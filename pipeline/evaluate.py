@@ -0,0 +1,339 @@
+"""
+Evaluation of model outputs against exported datasets.
+
+Outputs are JSONL records with a `task` and the `id` of a problem in
+`<data_dir>/<task>/data.json`, or a `custom_id` of a request written by
+`pipeline.batch_requests`, whose batch results can be passed as they are. The
+answer letter of every output is scored against the dataset and accuracy is
+aggregated by task and label, the text of the correct option:
+
+    python -m pipeline.evaluate --data-dir ./data --outputs outputs.jsonl
+
+With `--run-asp`, the program between `###ASP_START###` and `###ASP_END###` of
+every output is solved in a pool of sandboxed clingo processes and checked
+against the problem spec. Solver statistics are printed while the results
+arrive and the final report can be written as JSON.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+from generators.registry import SPECS_FILENAME, read_specs
+from generators.utils import (
+    INCLUDE_BASE_ASP,
+    OUTPUT_FORMATS,
+    option_text,
+    read_problems,
+)
+from pipeline.tasks import TASKS
+from solvers.sandbox import STATUSES, SolverPool
+
+# Option letters are uppercase, and only count after "answer", when formatted
+# as an option like "B)" or "(B)", or alone on a line.
+ANSWER_PATTERNS = [
+    re.compile(r"(?i:answer)(?:\s+is)?[\s:*(\-]*\b([A-Z])\b(?![-'])"),
+    re.compile(r"(?:^|[\s*:])\(?([A-Z])\)", re.MULTILINE),
+    re.compile(r"^\s*\**([A-Z])\**\s*$", re.MULTILINE),
+]
+ASP_BLOCK = re.compile(r"###ASP_START###(.*?)(?:###ASP_END###|$)", re.DOTALL)
+
+
+def extract_answer(text: str) -> str:
+    """The answer letter of a model output, or "" if there is none."""
+    # Programs use words like "answer" and uppercase variables.
+    text = ASP_BLOCK.sub("", text)
+    for pattern in ANSWER_PATTERNS:
+        matches = pattern.findall(text)
+        if matches:
+            return matches[-1]
+    return ""
+
+
+def extract_asp(text: str) -> str | None:
+    blocks = ASP_BLOCK.findall(text)
+    return blocks[-1].strip() if blocks else None
+
+
+def output_text(record: dict) -> str:
+    """Text of a plain output record or of an OpenAI or Anthropic batch result."""
+    if "output" in record:
+        return record["output"]
+    if "response" in record:
+        return record["response"]["body"]["choices"][0]["message"]["content"]
+    if "result" in record:
+        content = record["result"].get("message", {}).get("content", [])
+        return "".join(block.get("text", "") for block in content)
+    raise ValueError(f"No output text in record {record}")
+
+
+class Problems:
+    """Answers, labels and specs of the problems of the evaluated tasks."""
+
+    def __init__(self):
+        self.keys: dict[tuple[str, str], int] = {}
+        self.tasks: list[str] = []
+        self.labels: list[str] = []
+        self.task_index: list[int] = []
+        self.label_index: list[int] = []
+        self.answers: list[str] = []
+        self.specs: list[dict | None] = []
+
+    def add(self, task: str, id: str, answer: str, label: str, spec: dict | None):
+        if task not in self.tasks:
+            self.tasks.append(task)
+        if label not in self.labels:
+            self.labels.append(label)
+        self.keys[task, id] = len(self.answers)
+        self.task_index.append(self.tasks.index(task))
+        self.label_index.append(self.labels.index(label))
+        self.answers.append(answer)
+        self.specs.append(spec)
+
+    def __len__(self) -> int:
+        return len(self.answers)
+
+
+def load_problems(data_dir: str, names: list[str] | None = None) -> Problems:
+    """Reads the exported datasets, or the answers of batch requests."""
+    problems = Problems()
+    for name in sorted(os.listdir(data_dir)):
+        task_dir = os.path.join(data_dir, name)
+        if names is not None and name not in names:
+            continue
+
+        answers_path = os.path.join(task_dir, "answers.jsonl")
+        if os.path.exists(answers_path):
+            with open(answers_path, "r") as f:
+                for line in f:
+                    record = json.loads(line)
+                    spec = record["spec"]
+                    label = option_text(
+                        spec["options"][ord(record["answer"]) - ord("A")]
+                    )
+                    problems.add(
+                        name, record["custom_id"], record["answer"], label, spec
+                    )
+            continue
+
+        for output_format in OUTPUT_FORMATS:
+            if os.path.exists(os.path.join(task_dir, f"data.{output_format}")):
+                break
+        else:
+            continue
+        data = read_problems(task_dir, output_format)
+        specs_path = os.path.join(task_dir, SPECS_FILENAME)
+        specs = []
+        if name in TASKS and os.path.exists(specs_path):
+            specs = read_specs(TASKS[name], specs_path)
+        for i, problem in enumerate(data):
+            label = option_text(problem["options"][ord(problem["answer"]) - ord("A")])
+            spec = specs[i] if i < len(specs) else None
+            problems.add(name, problem["id"], problem["answer"], label, spec)
+
+    return problems
+
+
+def read_outputs(paths: list[str]) -> dict[tuple[str, str], str]:
+    """Output text of every (task, id) in the output files."""
+    outputs = {}
+    for path in paths:
+        with open(path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if "custom_id" in record:
+                    task = record["custom_id"].rpartition("-")[0]
+                    key = (task, record["custom_id"])
+                else:
+                    key = (record["task"], record["id"])
+                outputs[key] = output_text(record)
+    return outputs
+
+
+def score_answers(problems: Problems, outputs: dict) -> tuple[np.ndarray, np.ndarray]:
+    """Whether every problem was answered and whether the answer is correct."""
+    predicted = np.array(
+        [
+            extract_answer(outputs[key]) if key in outputs else ""
+            for key in problems.keys
+        ],
+        dtype="U1",
+    )
+    answers = np.array(problems.answers, dtype="U1")
+    return predicted != "", predicted == answers
+
+
+def aggregate(problems: Problems, values: dict[str, np.ndarray]) -> dict:
+    """Sums of every value array per (task, label) cell."""
+    n_cells = len(problems.tasks) * len(problems.labels)
+    cells = np.ravel_multi_index(
+        (problems.task_index, problems.label_index),
+        (len(problems.tasks), len(problems.labels)),
+    )
+    sums = {"n": np.bincount(cells, minlength=n_cells)}
+    for name, value in values.items():
+        sums[name] = np.bincount(cells, weights=value, minlength=n_cells)
+    return {
+        name: total.reshape(len(problems.tasks), len(problems.labels))
+        for name, total in sums.items()
+    }
+
+
+def answer_report(problems: Problems, answered: np.ndarray, correct: np.ndarray):
+    sums = aggregate(problems, {"answered": answered, "correct": correct})
+    report = {}
+    for t, task in enumerate(problems.tasks):
+        n = sums["n"][t].sum()
+        report[task] = {
+            "n": int(n),
+            "answered": int(sums["answered"][t].sum()),
+            "accuracy": float(sums["correct"][t].sum() / n),
+            "labels": {
+                label: {
+                    "n": int(sums["n"][t, j]),
+                    "accuracy": float(sums["correct"][t, j] / sums["n"][t, j]),
+                }
+                for j, label in enumerate(problems.labels)
+                if sums["n"][t, j]
+            },
+        }
+    return report
+
+
+def _program(task: str, asp: str) -> str:
+    # Programs copied from an exported file include the shared base encoding.
+    return asp.replace(INCLUDE_BASE_ASP.strip(), TASKS[task].base_asp())
+
+
+class AspStats:
+    """Solver outcomes per task, updated while results arrive."""
+
+    def __init__(self, problems: Problems):
+        self.problems = problems
+        self.status = np.zeros((len(problems.tasks), len(STATUSES)), dtype=np.int64)
+        self.correct = np.zeros(len(problems.tasks), dtype=np.int64)
+        self.checked = np.zeros(len(problems.tasks), dtype=np.int64)
+        self.seconds = np.zeros(len(problems.tasks))
+
+    def update(self, row: int, result) -> None:
+        task = self.problems.task_index[row]
+        self.status[task, STATUSES.index(result.status)] += 1
+        self.seconds[task] += result.seconds
+        spec = self.problems.specs[row]
+        if spec is not None:
+            self.checked[task] += 1
+            if result.models is not None:
+                name = self.problems.tasks[task]
+                self.correct[task] += TASKS[name].check(spec, result.models)
+
+    def summary(self) -> str:
+        done = self.status.sum()
+        failed = self.status[:, STATUSES.index("error") :].sum()
+        checked = max(self.checked.sum(), 1)
+        return (
+            f"{done} programs solved, {failed / max(done, 1):.1%} failed, "
+            f"{self.correct.sum() / checked:.1%} correct"
+        )
+
+    def report(self) -> dict:
+        report = {}
+        for t, task in enumerate(self.problems.tasks):
+            n = int(self.status[t].sum())
+            if not n:
+                continue
+            solved = self.status[t, : STATUSES.index("error")].sum()
+            report[task] = {
+                "n": n,
+                "statuses": {
+                    status: int(count)
+                    for status, count in zip(STATUSES, self.status[t])
+                    if count
+                },
+                "failure_rate": float(1 - solved / n),
+                "accuracy": (
+                    float(self.correct[t] / self.checked[t])
+                    if self.checked[t]
+                    else None
+                ),
+                "mean_seconds": float(self.seconds[t] / n),
+            }
+        return report
+
+
+def run_asp(
+    problems: Problems,
+    outputs: dict,
+    pool: SolverPool,
+    progress_seconds: float = 5.0,
+) -> AspStats:
+    stats = AspStats(problems)
+    jobs = []
+    for key, row in problems.keys.items():
+        asp = extract_asp(outputs[key]) if key in outputs else None
+        if asp is not None:
+            jobs.append((row, _program(key[0], asp)))
+
+    last = time.monotonic()
+    for row, result in pool.imap_unordered(jobs):
+        stats.update(row, result)
+        if time.monotonic() - last >= progress_seconds:
+            print(stats.summary(), flush=True)
+            last = time.monotonic()
+    print(stats.summary(), flush=True)
+    return stats
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--data-dir", required=True)
+    parser.add_argument("--outputs", nargs="+", required=True)
+    parser.add_argument("--tasks", nargs="+", default=None)
+    parser.add_argument("--run-asp", action="store_true")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--time-limit", type=float, default=10.0, help="Seconds per program."
+    )
+    parser.add_argument(
+        "--memory-limit", type=int, default=1024, help="Megabytes per worker."
+    )
+    parser.add_argument("--report", default=None, help="Write the report as JSON.")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    problems = load_problems(args.data_dir, args.tasks)
+    if not len(problems):
+        print(f"No problems found in {args.data_dir}", file=sys.stderr)
+        return 2
+    outputs = read_outputs(args.outputs)
+
+    answered, correct = score_answers(problems, outputs)
+    report = {"answers": answer_report(problems, answered, correct)}
+    for task, scores in report["answers"].items():
+        print(
+            f"{task}: {scores['accuracy']:.1%} accuracy, "
+            f"{scores['answered']}/{scores['n']} answered",
+            flush=True,
+        )
+
+    if args.run_asp:
+        pool = SolverPool(args.workers, args.time_limit, args.memory_limit)
+        report["asp"] = run_asp(problems, outputs, pool).report()
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=4)
+        print(f"Report written to {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
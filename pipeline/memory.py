@@ -0,0 +1,147 @@
+"""
+Memory watching and memory-budgeted batch sizes for the export pipeline.
+
+A budget in bytes is set per process with `set_budget`, the scheduler splits
+the run budget among the job processes and a job among its render workers.
+`AdaptiveBatch` then sizes batches from the resident set size (RSS) growth per
+item measured on the previous batches, so that a process stays under its
+budget whatever the size of the images. Without a budget batches have a fixed
+size, which already keeps memory independent of the number of samples.
+
+`track` records the peak RSS of a stage in the metrics as `peak_rss_bytes`.
+Peaks are read from the kernel high-water mark, which is reset at the start of
+every stage on Linux; elsewhere the peak of the whole process is reported.
+"""
+
+import resource
+import sys
+from contextlib import contextmanager
+
+from pipeline import metrics
+
+# Share of the free budget that a batch may take, the rest absorbs estimation
+# errors and memory that the allocator does not return.
+HEADROOM = 0.5
+# Smallest estimate of the bytes per item. A batch that reuses freed memory
+# does not grow the RSS, which would otherwise leave nothing to size from.
+MIN_ITEM_BYTES = 64 * 1024
+
+_budget: int | None = None
+
+
+def set_budget(budget: int | None):
+    global _budget
+    _budget = budget
+
+
+def budget() -> int | None:
+    return _budget
+
+
+def _status_kb(field: str) -> int | None:
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _maxrss() -> int:
+    # Kilobytes on Linux, bytes on macOS.
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+def rss() -> int:
+    """Resident set size of this process in bytes."""
+    kb = _status_kb("VmRSS")
+    return kb * 1024 if kb is not None else _maxrss()
+
+
+def peak_rss() -> int:
+    """Peak resident set size since the last `reset_peak`, in bytes."""
+    kb = _status_kb("VmHWM")
+    return kb * 1024 if kb is not None else _maxrss()
+
+
+def reset_peak():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+@contextmanager
+def track(stage: str):
+    """Records the peak RSS of the block when metrics are enabled."""
+    if not metrics.is_enabled():
+        yield
+        return
+    reset_peak()
+    try:
+        yield
+    finally:
+        metrics.observe("peak_rss_bytes", peak_rss(), stage=stage)
+
+
+def free_bytes() -> int | None:
+    """Bytes left in the budget of this process, or None without a budget."""
+    if _budget is None:
+        return None
+    return _budget - rss()
+
+
+class AdaptiveBatch:
+    """
+    Sizes of successive batches that fit in the free budget, given the bytes
+    per item measured on the batches done so far.
+    """
+
+    def __init__(self, default: int, maximum: int | None = None):
+        self.default = default
+        self.maximum = maximum or default
+        self.item_bytes: float | None = None
+
+    def size(self) -> int:
+        free = free_bytes()
+        if free is None:
+            return self.default
+        if self.item_bytes is None:
+            # Nothing is measured yet, so the first batch is kept small.
+            return 1 if free <= 0 else min(self.default, 2)
+        return max(1, min(self.maximum, int(free * HEADROOM / self.item_bytes)))
+
+    def update(self, n_items: int, grown_bytes: int):
+        # Memory freed by earlier batches is reused without growing the RSS,
+        # so older estimates only decay slowly.
+        if n_items <= 0:
+            return
+        item_bytes = max(grown_bytes / n_items, MIN_ITEM_BYTES)
+        if self.item_bytes is None:
+            self.item_bytes = item_bytes
+        else:
+            self.item_bytes = max(item_bytes, 0.9 * self.item_bytes)
+
+
+def in_flight(free: int | None, item_bytes: int, limit: int) -> int:
+    """How many items of `item_bytes` bytes may be in flight at once."""
+    if free is None:
+        return limit
+    return max(1, min(limit, free // max(item_bytes, 1)))
+
+
+def format_bytes(n: float) -> str:
+    return f"{n / 2**20:.0f} MB"
+
+
+def parse_bytes(text: str) -> int:
+    """Bytes of a size such as "512M", "4G" or a plain number of bytes."""
+    units = {"K": 2**10, "M": 2**20, "G": 2**30, "T": 2**40}
+    text = text.strip().upper().removesuffix("B")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
@@ -0,0 +1,223 @@
+"""
+Counters, histograms and timers for the generation pipeline.
+
+Recording is disabled by default, so the calls left in the generators cost a
+single flag check. When enabled, values are kept per metric name and label set
+in the current process. Worker processes send a `snapshot` back to the parent,
+which `merge`s them before writing the run `report` or the Prometheus text.
+
+Rejection loops record every candidate with `attempt`, from which the report
+derives the rejection rate of every generator.
+"""
+
+import math
+import time
+from contextlib import contextmanager, nullcontext
+
+# Upper bounds of the histogram buckets, in seconds for timers.
+BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, math.inf]
+
+_enabled = False
+_scope: dict[str, str] = {}
+_counters: dict[tuple, float] = {}
+_histograms: dict[tuple, list] = {}
+_NULL_CONTEXT = nullcontext()
+
+
+def enable(enabled: bool = True):
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    _counters.clear()
+    _histograms.clear()
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted({**_scope, **labels}.items())))
+
+
+def current_scope() -> dict[str, str]:
+    return dict(_scope)
+
+
+@contextmanager
+def scope(**labels: str):
+    """Adds the labels to every value recorded inside the block."""
+    global _scope
+    previous = _scope
+    _scope = {**previous, **labels}
+    try:
+        yield
+    finally:
+        _scope = previous
+
+
+def count(name: str, value: float = 1, **labels: str):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels: str):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        # count, sum, min, max and the count of every bucket
+        histogram = _histograms[key] = [0, 0.0, math.inf, -math.inf, [0] * len(BUCKETS)]
+    histogram[0] += 1
+    histogram[1] += value
+    histogram[2] = min(histogram[2], value)
+    histogram[3] = max(histogram[3], value)
+    for i, bound in enumerate(BUCKETS):
+        if value <= bound:
+            histogram[4][i] += 1
+            break
+
+
+@contextmanager
+def _timer(name: str, labels: dict):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def timer(name: str, **labels: str):
+    """Context manager observing the seconds spent in the block."""
+    if not _enabled:
+        return _NULL_CONTEXT
+    return _timer(name, labels)
+
+
+def attempt(generator: str, accepted: bool, reason: str | None = None):
+    """Records a candidate of a rejection loop and why it was rejected."""
+    if not _enabled:
+        return
+    if accepted:
+        count("candidates", generator=generator, outcome="accepted")
+    else:
+        count(
+            "candidates",
+            generator=generator,
+            outcome="rejected",
+            reason=reason or "invalid",
+        )
+
+
+def snapshot() -> dict:
+    """JSON-serializable copy of the values recorded in this process."""
+    return {
+        "counters": [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in _counters.items()
+        ],
+        "histograms": [
+            {
+                "name": name,
+                "labels": dict(labels),
+                "count": histogram[0],
+                "sum": histogram[1],
+                "min": histogram[2],
+                "max": histogram[3],
+                "buckets": list(histogram[4]),
+            }
+            for (name, labels), histogram in _histograms.items()
+        ],
+    }
+
+
+def merge(values: dict):
+    """Adds the values of a snapshot, e.g. one taken in a worker process."""
+    for counter in values["counters"]:
+        key = (counter["name"], tuple(sorted(counter["labels"].items())))
+        _counters[key] = _counters.get(key, 0) + counter["value"]
+
+    for entry in values["histograms"]:
+        key = (entry["name"], tuple(sorted(entry["labels"].items())))
+        histogram = _histograms.setdefault(
+            key, [0, 0.0, math.inf, -math.inf, [0] * len(BUCKETS)]
+        )
+        histogram[0] += entry["count"]
+        histogram[1] += entry["sum"]
+        histogram[2] = min(histogram[2], entry["min"])
+        histogram[3] = max(histogram[3], entry["max"])
+        histogram[4] = [a + b for a, b in zip(histogram[4], entry["buckets"])]
+
+
+def _rejection_rates() -> list[dict]:
+    totals = {}
+    for (name, labels), value in _counters.items():
+        if name != "candidates":
+            continue
+        labels = dict(labels)
+        outcome = labels.pop("outcome")
+        labels.pop("reason", None)
+        key = tuple(sorted(labels.items()))
+        attempts, accepted = totals.get(key, (0, 0))
+        totals[key] = (
+            attempts + value,
+            accepted + (value if outcome == "accepted" else 0),
+        )
+
+    return [
+        {
+            "labels": dict(key),
+            "attempts": attempts,
+            "accepted": accepted,
+            "rejection_rate": 1 - accepted / attempts,
+        }
+        for key, (attempts, accepted) in totals.items()
+    ]
+
+
+def report() -> dict:
+    """Run report with every value and the rejection rate of every generator."""
+    values = snapshot()
+    for histogram in values["histograms"]:
+        histogram["mean"] = histogram["sum"] / histogram["count"]
+    return {**values, "rejection_rates": _rejection_rates()}
+
+
+def _format_labels(labels: tuple, extra: dict | None = None) -> str:
+    items = list(labels) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in items) + "}"
+
+
+def to_prometheus(prefix: str = "llm_data_") -> str:
+    """The values in the Prometheus text exposition format."""
+    lines = []
+    for name in sorted({name for name, _ in _counters}):
+        lines.append(f"# TYPE {prefix}{name}_total counter")
+        for (other, labels), value in _counters.items():
+            if other == name:
+                lines.append(f"{prefix}{name}_total{_format_labels(labels)} {value}")
+
+    for name in sorted({name for name, _ in _histograms}):
+        lines.append(f"# TYPE {prefix}{name} histogram")
+        for (other, labels), histogram in _histograms.items():
+            if other != name:
+                continue
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS, histogram[4]):
+                cumulative += bucket
+                le = "+Inf" if math.isinf(bound) else repr(bound)
+                lines.append(
+                    f"{prefix}{name}_bucket{_format_labels(labels, {'le': le})} "
+                    f"{cumulative}"
+                )
+            lines.append(f"{prefix}{name}_sum{_format_labels(labels)} {histogram[1]}")
+            lines.append(f"{prefix}{name}_count{_format_labels(labels)} {histogram[0]}")
+
+    return "\n".join(lines) + "\n"
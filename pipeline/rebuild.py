@@ -0,0 +1,133 @@
+"""
+Rebuilds the images or ASP programs of exported tasks from their saved specs.
+
+Exports keep the spec of every problem in `specs.jsonl` and the specs of the
+prompt examples in `examples.json`. Images can therefore be redrawn after a
+change of image style, and programs rewritten after a change of the ASP
+encoding, without generating or solving anything again:
+
+    python -m pipeline.rebuild rerender --data-dir ./data --tasks "graph_*"
+    python -m pipeline.rebuild reserialize --data-dir ./data --workers 8
+
+`data.json` is left as it is, since the problem ids follow the order of the
+specs.
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+
+from generators.registry import (
+    EXAMPLES_FILENAME,
+    SPECS_FILENAME,
+    LogicTask,
+    read_examples,
+    read_specs,
+    render_all,
+    render_examples,
+    write_prompt_templates,
+)
+from generators.utils import BASE_ASP_FILENAME, INCLUDE_BASE_ASP, create_directory
+from pipeline.tasks import TASKS, select_tasks
+
+COMMANDS = ["rerender", "reserialize"]
+
+
+def load_task_specs(task: LogicTask, task_dir: str) -> tuple[list[dict], dict]:
+    """The problem specs and the example specs of an exported task."""
+    specs_path = os.path.join(task_dir, SPECS_FILENAME)
+    if not os.path.exists(specs_path):
+        raise ValueError(f"{task_dir} has no {SPECS_FILENAME}, export it again")
+    examples_path = os.path.join(task_dir, EXAMPLES_FILENAME)
+    examples = {}
+    if os.path.exists(examples_path):
+        examples = read_examples(task, examples_path)
+    return read_specs(task, specs_path), examples
+
+
+def rerender_task(task: LogicTask, task_dir: str, workers: int = 1) -> int:
+    specs, examples = load_task_specs(task, task_dir)
+    images_dir = os.path.join(task_dir, "images")
+    create_directory(images_dir)
+    paths = [os.path.join(images_dir, f"problem_{i}.png") for i in range(len(specs))]
+    render_all(task, specs, paths, workers)
+    render_examples(task, examples, task_dir)
+    return len(specs)
+
+
+def _serialize_chunk(task: LogicTask, specs: list[dict]) -> list[str]:
+    return task.serialize(specs)
+
+
+def serialize_all(task: LogicTask, specs: list[dict], workers: int) -> list[str]:
+    if workers <= 1 or len(specs) < 2:
+        return task.serialize(specs)
+
+    chunks = np.array_split(np.arange(len(specs)), workers)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        programs = executor.map(
+            _serialize_chunk,
+            repeat(task),
+            [[specs[i] for i in chunk] for chunk in chunks if len(chunk)],
+        )
+        return [asp for chunk in programs for asp in chunk]
+
+
+def reserialize_task(task: LogicTask, task_dir: str, workers: int = 1) -> int:
+    specs, examples = load_task_specs(task, task_dir)
+    asp_dir = os.path.join(task_dir, "asp_code")
+    create_directory(asp_dir)
+    with open(os.path.join(asp_dir, BASE_ASP_FILENAME), "w") as f:
+        f.write(task.base_asp())
+    for i, asp in enumerate(serialize_all(task, specs, workers)):
+        with open(os.path.join(asp_dir, f"problem_{i}.asp"), "w") as f:
+            f.write(INCLUDE_BASE_ASP + asp)
+    write_prompt_templates(task, examples, task_dir)
+    return len(specs)
+
+
+REBUILDERS = {"rerender": rerender_task, "reserialize": reserialize_task}
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=COMMANDS)
+    parser.add_argument("--data-dir", required=True)
+    parser.add_argument("--tasks", nargs="+", default=["*"], metavar="PATTERN")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    try:
+        names = select_tasks(args.tasks)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    failed = []
+    for name in names:
+        task_dir = os.path.join(args.data_dir, name)
+        if not os.path.isdir(task_dir):
+            continue
+        try:
+            n = REBUILDERS[args.command](TASKS[name], task_dir, args.workers)
+        except ValueError as e:
+            print(e, file=sys.stderr, flush=True)
+            failed.append(name)
+            continue
+        print(f"{name}: {n} problems rebuilt", flush=True)
+
+    if failed:
+        print(f"Failed tasks: {', '.join(failed)}", file=sys.stderr, flush=True)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
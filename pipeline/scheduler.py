@@ -0,0 +1,229 @@
+"""
+Runs task exports concurrently on a shared pool of worker processes.
+
+Selected tasks are grouped into jobs (see `pipeline.tasks.GROUPS`), each job
+runs in one worker and every finished task is reported with its throughput.
+A failing task does not stop the other jobs, `run` returns a non-zero exit
+code instead. With `collect_metrics` every job records its metrics (see
+`pipeline.metrics`), which are merged in the parent process once all jobs
+finished. With a `memory_budget` in bytes, the jobs in flight and their batch
+sizes are adapted to stay within it (see `pipeline.memory`). A table of
+`solver_profiles` selects the clingo configuration of every task (see
+`solvers.profiles`), and the sudoku tasks draw their grids from a
+`sudoku_bank` file if one is given (see `generators.sudoku_bank`). With
+`augment` the problem images are augmented (see `generators.augment`).
+"""
+
+import random
+import sys
+import time
+import traceback
+import zlib
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+
+import numpy as np
+
+from generators import sudoku_bank as bank
+from generators.registry import export_task
+from pipeline import memory, metrics
+from pipeline.tasks import GROUP_STATE, TASKS, task_job
+from solvers import profiles
+
+# Memory of a job process assumed until a job has reported its peak.
+JOB_BYTES = 512 * 2**20
+
+
+@dataclass
+class TaskResult:
+    name: str
+    n_samples: int
+    seconds: float
+    error: str | None = None
+    peak_rss: int | None = None
+
+
+def job_seed(seed: int, job: str) -> int:
+    # Every job is seeded on its own so that its output does not depend on
+    # which worker runs it or in which order.
+    return zlib.crc32(f"{seed}:{job}".encode())
+
+
+def run_job(
+    job: str,
+    names: list[str],
+    root_dir: str,
+    n_samples: dict[str, int],
+    seed: int,
+    output_format: str,
+    workers: int = 1,
+    collect_metrics: bool = False,
+    save_specs: bool = True,
+    solver_profiles: dict | None = None,
+    sudoku_bank: str | None = None,
+    augment: bool = False,
+    memory_budget: int | None = None,
+) -> tuple[list[TaskResult], dict]:
+    """Exports the tasks of a job, returns their results and metrics."""
+    np.random.seed(job_seed(seed, job))
+    random.seed(job_seed(seed, job))
+    metrics.enable(collect_metrics)
+    metrics.reset()
+    memory.set_budget(memory_budget)
+    profiles.set_table(solver_profiles)
+    bank.set_bank(sudoku_bank)
+    state = GROUP_STATE[job]() if job in GROUP_STATE else {}
+
+    results = []
+    for name in names:
+        start = time.perf_counter()
+        error = None
+        memory.reset_peak()
+        try:
+            export_task(
+                TASKS[name],
+                root_dir,
+                n_samples[name],
+                output_format=output_format,
+                workers=workers,
+                save_specs=save_specs,
+                augment=augment,
+                **state,
+            )
+        except Exception:
+            error = traceback.format_exc()
+
+        results.append(
+            TaskResult(
+                name,
+                n_samples[name],
+                time.perf_counter() - start,
+                error,
+                memory.peak_rss(),
+            )
+        )
+
+    return results, metrics.snapshot()
+
+
+def group_jobs(names: list[str]) -> dict[str, list[str]]:
+    jobs = {}
+    for name in names:
+        jobs.setdefault(task_job(name), []).append(name)
+    return jobs
+
+
+def _report(result: TaskResult, done: int, total: int):
+    prefix = f"[{done}/{total}] {result.name}"
+    if result.error is not None:
+        print(f"{prefix}: failed after {result.seconds:.1f}s", flush=True)
+        print(result.error, file=sys.stderr, flush=True)
+    else:
+        throughput = result.n_samples / max(result.seconds, 1e-9)
+        peak = ""
+        if result.peak_rss is not None:
+            peak = f", peak {memory.format_bytes(result.peak_rss)}"
+        print(
+            f"{prefix}: {result.n_samples} samples in {result.seconds:.1f}s "
+            f"({throughput:.1f} samples/s{peak})",
+            flush=True,
+        )
+
+
+def run(
+    names: list[str],
+    root_dir: str,
+    n_samples: dict[str, int],
+    seed: int = 0,
+    workers: int = 1,
+    output_format: str = "json",
+    collect_metrics: bool = False,
+    save_specs: bool = True,
+    memory_budget: int | None = None,
+    solver_profiles: dict | None = None,
+    sudoku_bank: str | None = None,
+    augment: bool = False,
+) -> int:
+    jobs = group_jobs(names)
+    results = []
+    snapshots = []
+    start = time.perf_counter()
+
+    def finish(job_results: list[TaskResult], snapshot: dict | None = None):
+        if snapshot is not None:
+            snapshots.append(snapshot)
+        for result in job_results:
+            results.append(result)
+            _report(result, len(results), len(names))
+
+    # Workers left over when there are fewer jobs than workers render the
+    # images of the jobs in parallel.
+    job_workers = max(workers // len(jobs), 1) if jobs else 1
+    arguments = (
+        root_dir,
+        n_samples,
+        seed,
+        output_format,
+        job_workers,
+        collect_metrics,
+        save_specs,
+        solver_profiles,
+        sudoku_bank,
+        augment,
+    )
+    if workers <= 1:
+        for job, job_names in jobs.items():
+            finish(*run_job(job, job_names, *arguments, memory_budget))
+    else:
+        # With a memory budget every running job gets an equal share of it,
+        # and fewer jobs are started at once after a job reports a higher
+        # peak than expected. Every job then runs in a fresh process, which
+        # returns its memory when the job is done.
+        pool_size = min(workers, len(jobs))
+        depth = memory.in_flight(memory_budget, JOB_BYTES, pool_size)
+        pending = deque(jobs.items())
+        running = {}
+        with ProcessPoolExecutor(
+            max_workers=pool_size,
+            max_tasks_per_child=1 if memory_budget is not None else None,
+        ) as executor:
+            while pending or running:
+                while pending and len(running) < depth:
+                    job, job_names = pending.popleft()
+                    job_budget = memory_budget // depth if memory_budget else None
+                    future = executor.submit(
+                        run_job, job, job_names, *arguments, job_budget
+                    )
+                    running[future] = job_names
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_names = running.pop(future)
+                    try:
+                        job_results, snapshot = future.result()
+                    except Exception:
+                        # The worker itself died, e.g. it ran out of memory.
+                        error = traceback.format_exc()
+                        finish([TaskResult(name, 0, 0.0, error) for name in job_names])
+                        continue
+                    finish(job_results, snapshot)
+                    peak = max(result.peak_rss or 0 for result in job_results)
+                    if memory_budget is not None and peak:
+                        depth = memory.in_flight(memory_budget, peak, pool_size)
+
+    # Jobs run in this process when there is a single worker, so the metrics
+    # are rebuilt from the snapshots of the jobs in both cases.
+    metrics.reset()
+    for snapshot in snapshots:
+        metrics.merge(snapshot)
+
+    failed = [result.name for result in results if result.error is not None]
+    print(
+        f"Exported {len(results) - len(failed)}/{len(results)} tasks "
+        f"in {time.perf_counter() - start:.1f}s",
+        flush=True,
+    )
+    if failed:
+        print(f"Failed tasks: {', '.join(failed)}", file=sys.stderr, flush=True)
+        return 1
+    return 0
@@ -0,0 +1,464 @@
+"""
+Sharded generation with a deterministic merge step.
+
+A shard is an export of the selected tasks seeded from the run seed and the
+shard index, written to `<shards_dir>/shard-<index>/<task>/`. Shards only share
+the filesystem, so any process or host can generate any of them:
+
+    python -m pipeline.shards generate --shards-dir /shared/run --shards 0 1
+    python -m pipeline.shards generate --shards-dir /shared/run --shards 2 3
+    python -m pipeline.shards merge --shards-dir /shared/run --output-dir ./data
+
+Every task of a shard gets a `manifest.json` with the hashes of its files once
+it is fully exported. `merge` checks the manifests, drops problems already seen
+in a shard with a lower index, balances the labels of validity tasks and
+numbers the merged problems from 0 in shard order, so the same shards always
+merge into the same dataset.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import zlib
+from dataclasses import dataclass
+
+from generators.registry import (
+    SPECS_FILENAME,
+    LogicTask,
+    read_specs,
+    write_specs,
+)
+from generators.sudoku_bank import SudokuBank
+from generators.utils import (
+    BASE_ASP_FILENAME,
+    INCLUDE_BASE_ASP,
+    OUTPUT_FORMATS,
+    create_directory,
+    export_problems,
+    read_problems,
+)
+from pipeline.scheduler import run
+from pipeline.tasks import TASKS, sample_counts, select_tasks
+
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 1
+SHARD_DIR_PATTERN = re.compile(r"shard-(\d+)")
+# Files of a shard that are rewritten by the merge instead of being copied.
+MERGED_FILES = [MANIFEST_FILENAME, SPECS_FILENAME] + [
+    f"data.{output_format}" for output_format in OUTPUT_FORMATS
+]
+
+
+@dataclass
+class ShardProblem:
+    shard: int
+    index: int
+    task_dir: str
+    spec: dict
+    problem: dict
+
+
+def shard_seed(seed: int, shard: int) -> int:
+    return zlib.crc32(f"{seed}:shard-{shard}".encode())
+
+
+def shard_dir(shards_dir: str, shard: int) -> str:
+    return os.path.join(shards_dir, f"shard-{shard:05d}")
+
+
+def shard_dirs(shards_dir: str) -> list[tuple[int, str]]:
+    """
+    (shard, path) of the shard directories, by shard index. Other entries,
+    like `.DS_Store` or `shard-tmp`, are skipped.
+    """
+    shards = []
+    for entry in os.listdir(shards_dir):
+        match = SHARD_DIR_PATTERN.fullmatch(entry)
+        path = os.path.join(shards_dir, entry)
+        if match and os.path.isdir(path):
+            shards.append((int(match.group(1)), path))
+    return sorted(shards)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_json(path: str, data: dict):
+    # Written to a temporary file first, so a manifest is never half-written.
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def _hashed_files(output_format: str) -> list[str]:
+    return [
+        f"data.{output_format}",
+        SPECS_FILENAME,
+        os.path.join("asp_code", BASE_ASP_FILENAME),
+    ]
+
+
+def write_manifest(
+    task_dir: str, name: str, shard: int, seed: int, output_format: str
+) -> dict:
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "task": name,
+        "shard": shard,
+        "seed": seed,
+        "shard_seed": shard_seed(seed, shard),
+        "output_format": output_format,
+        "n_problems": len(
+            read_specs(TASKS[name], os.path.join(task_dir, SPECS_FILENAME))
+        ),
+        "files": {
+            path: _sha256(os.path.join(task_dir, path))
+            for path in _hashed_files(output_format)
+        },
+    }
+    _write_json(os.path.join(task_dir, MANIFEST_FILENAME), manifest)
+    return manifest
+
+
+def generate_shards(
+    names: list[str],
+    shards_dir: str,
+    shards: list[int],
+    n_samples: dict[str, int],
+    seed: int = 0,
+    workers: int = 1,
+    output_format: str = "json",
+    sudoku_bank: str | None = None,
+) -> int:
+    """Exports the tasks of every shard and writes the manifests."""
+    exit_code = 0
+    for shard in shards:
+        root_dir = shard_dir(shards_dir, shard)
+        # Files left by an interrupted attempt must not end up in the shard.
+        for name in names:
+            shutil.rmtree(os.path.join(root_dir, name), ignore_errors=True)
+
+        print(f"Generating shard {shard} in {root_dir}", flush=True)
+        exit_code = max(
+            exit_code,
+            run(
+                names,
+                root_dir,
+                n_samples,
+                seed=shard_seed(seed, shard),
+                workers=workers,
+                output_format=output_format,
+                save_specs=True,
+                sudoku_bank=sudoku_bank,
+            ),
+        )
+        # The specs are written last, so only fully exported tasks have them.
+        for name in names:
+            task_dir = os.path.join(root_dir, name)
+            if os.path.exists(os.path.join(task_dir, SPECS_FILENAME)):
+                write_manifest(task_dir, name, shard, seed, output_format)
+
+    return exit_code
+
+
+def check_shard(task_dir: str, manifest: dict, name: str, shard: int) -> list[str]:
+    """Descriptions of everything wrong with a shard of a task."""
+    if manifest.get("version") != MANIFEST_VERSION:
+        return [f"unsupported manifest version {manifest.get('version')}"]
+
+    errors = []
+    if manifest["task"] != name:
+        errors.append(f"manifest of task {manifest['task']}")
+    if manifest["shard"] != shard:
+        errors.append(f"manifest of shard {manifest['shard']}")
+    if manifest["shard_seed"] != shard_seed(manifest["seed"], manifest["shard"]):
+        errors.append("shard seed does not match the run seed")
+
+    for path, digest in manifest["files"].items():
+        full_path = os.path.join(task_dir, path)
+        if not os.path.exists(full_path):
+            errors.append(f"missing {path}")
+        elif _sha256(full_path) != digest:
+            errors.append(f"{path} changed after the manifest was written")
+    if errors:
+        return errors
+
+    n_problems = len(read_problems(task_dir, manifest["output_format"]))
+    if n_problems != manifest["n_problems"]:
+        errors.append(f"{n_problems} problems, {manifest['n_problems']} expected")
+    for i in range(manifest["n_problems"]):
+        for path in [f"images/problem_{i}.png", f"asp_code/problem_{i}.asp"]:
+            if not os.path.exists(os.path.join(task_dir, path)):
+                errors.append(f"missing {path}")
+    return errors
+
+
+def load_shards(
+    shards_dir: str, name: str, num_shards: int | None = None
+) -> list[tuple[int, str, dict]]:
+    """
+    (shard, task directory, manifest) of every finished shard of a task, by
+    shard index. Raises a ValueError if a shard is invalid or missing.
+    """
+    shards = []
+    for shard, path in shard_dirs(shards_dir):
+        task_dir = os.path.join(path, name)
+        manifest_path = os.path.join(task_dir, MANIFEST_FILENAME)
+        if not os.path.exists(manifest_path):
+            continue
+
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+        errors = check_shard(task_dir, manifest, name, shard)
+        if errors:
+            raise ValueError(f"Invalid shard {task_dir}: {'; '.join(errors)}")
+        shards.append((shard, task_dir, manifest))
+
+    if num_shards is not None:
+        missing = sorted(set(range(num_shards)) - {shard for shard, _, _ in shards})
+        if missing:
+            raise ValueError(f"Shards {missing} of {name} are missing")
+
+    for key in ["seed", "output_format"]:
+        values = {manifest[key] for _, _, manifest in shards}
+        if len(values) > 1:
+            raise ValueError(f"Shards of {name} have different {key}s: {values}")
+    base_hashes = {
+        manifest["files"][os.path.join("asp_code", BASE_ASP_FILENAME)]
+        for _, _, manifest in shards
+    }
+    if len(base_hashes) > 1:
+        raise ValueError(f"Shards of {name} have different base encodings")
+
+    return shards
+
+
+def sharded_tasks(shards_dir: str) -> set[str]:
+    """Names of the tasks with at least one finished shard."""
+    names = set()
+    for _, path in shard_dirs(shards_dir):
+        for name in os.listdir(path):
+            if os.path.exists(os.path.join(path, name, MANIFEST_FILENAME)):
+                names.add(name)
+    return names
+
+
+def rebalance(
+    task: LogicTask, problems: list[ShardProblem], n_samples: int | None = None
+) -> list[ShardProblem]:
+    """
+    Keeps the same number of problems of every label, the first ones in shard
+    order, and at most `n_samples` problems in total.
+    """
+    groups: dict = {}
+    for problem in problems:
+        groups.setdefault(task.label(problem.spec), []).append(problem)
+
+    if list(groups) == [None]:
+        return problems[:n_samples]
+
+    size = min(len(group) for group in groups.values())
+    if n_samples is not None:
+        size = min(size, n_samples // len(groups))
+    kept = [problem for group in groups.values() for problem in group[:size]]
+    return sorted(kept, key=lambda problem: (problem.shard, problem.index))
+
+
+def _read_asp(task_dir: str, index: int) -> str:
+    with open(os.path.join(task_dir, "asp_code", f"problem_{index}.asp"), "r") as f:
+        asp = f.read()
+    return asp.removeprefix(INCLUDE_BASE_ASP)
+
+
+def merge_task(
+    task: LogicTask,
+    shards_dir: str,
+    output_dir: str,
+    n_samples: int | None = None,
+    num_shards: int | None = None,
+) -> dict:
+    """Merges the shards of a task into `<output_dir>/<task.name>`."""
+    shards = load_shards(shards_dir, task.name, num_shards)
+    if not shards:
+        raise ValueError(f"No finished shards of {task.name} in {shards_dir}")
+    output_format = shards[0][2]["output_format"]
+
+    problems = []
+    seen = set()
+    for shard, task_dir, manifest in shards:
+        specs = read_specs(task, os.path.join(task_dir, SPECS_FILENAME))
+        shard_problems = read_problems(task_dir, output_format)
+        for i, (spec, problem) in enumerate(zip(specs, shard_problems)):
+            key = task.dedup_key(spec)
+            if key not in seen:
+                seen.add(key)
+                problems.append(ShardProblem(shard, i, task_dir, spec, problem))
+    n_unique = len(problems)
+    problems = rebalance(task, problems, n_samples)
+
+    data_dir = os.path.join(output_dir, task.name)
+    shutil.rmtree(data_dir, ignore_errors=True)
+    create_directory(os.path.join(data_dir, "images"))
+
+    # Prompt templates and their example images come from the first shard.
+    first_dir = shards[0][1]
+    for entry in os.listdir(first_dir):
+        path = os.path.join(first_dir, entry)
+        if os.path.isfile(path) and entry not in MERGED_FILES:
+            shutil.copyfile(path, os.path.join(data_dir, entry))
+
+    for i, problem in enumerate(problems):
+        shutil.copyfile(
+            os.path.join(problem.task_dir, "images", f"problem_{problem.index}.png"),
+            os.path.join(data_dir, "images", f"problem_{i}.png"),
+        )
+    with open(os.path.join(first_dir, "asp_code", BASE_ASP_FILENAME), "r") as f:
+        base_asp = f.read()
+    export_problems(
+        [
+            {
+                **{k: v for k, v in problem.problem.items() if k != "id"},
+                "asp": _read_asp(problem.task_dir, problem.index),
+            }
+            for problem in problems
+        ],
+        data_dir,
+        base_asp,
+        output_format=output_format,
+    )
+    write_specs(
+        task,
+        [problem.spec for problem in problems],
+        os.path.join(data_dir, SPECS_FILENAME),
+    )
+
+    n_shard_problems = sum(manifest["n_problems"] for _, _, manifest in shards)
+    summary = {
+        "task": task.name,
+        "seed": shards[0][2]["seed"],
+        "shards": [shard for shard, _, _ in shards],
+        "n_shard_problems": n_shard_problems,
+        "duplicates": n_shard_problems - n_unique,
+        "dropped_for_balance": n_unique - len(problems),
+        "n_problems": len(problems),
+    }
+    _write_json(os.path.join(data_dir, MANIFEST_FILENAME), summary)
+    return summary
+
+
+def merge_shards(
+    names: list[str],
+    shards_dir: str,
+    output_dir: str,
+    n_samples: dict[str, int | None],
+    num_shards: int | None = None,
+) -> int:
+    failed = []
+    for name in names:
+        try:
+            summary = merge_task(
+                TASKS[name], shards_dir, output_dir, n_samples[name], num_shards
+            )
+        except ValueError as e:
+            print(e, file=sys.stderr, flush=True)
+            failed.append(name)
+            continue
+        print(
+            f"{name}: {summary['n_problems']} problems from "
+            f"{len(summary['shards'])} shards, {summary['duplicates']} duplicates, "
+            f"{summary['dropped_for_balance']} dropped to balance the labels",
+            flush=True,
+        )
+
+    if failed:
+        print(f"Failed tasks: {', '.join(failed)}", file=sys.stderr, flush=True)
+        return 1
+    return 0
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="Generate shards.")
+    generate.add_argument("--shards", nargs="+", type=int, required=True)
+    generate.add_argument(
+        "--n-samples",
+        type=int,
+        default=200,
+        help="Number of samples of every task in every shard.",
+    )
+    generate.add_argument("--samples", action="append", default=[], metavar="TASK=N")
+    generate.add_argument("--seed", type=int, default=0)
+    generate.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    generate.add_argument("--format", choices=OUTPUT_FORMATS, default="json")
+    generate.add_argument(
+        "--sudoku-bank", help="Bank of sudoku grids shared by all shards."
+    )
+
+    merge = commands.add_parser("merge", help="Merge the finished shards.")
+    merge.add_argument("--output-dir", required=True)
+    merge.add_argument(
+        "--num-shards",
+        type=int,
+        default=None,
+        help="Fail unless shards 0 to N-1 of every task are finished.",
+    )
+    merge.add_argument(
+        "--n-samples",
+        type=int,
+        default=None,
+        help="Keep at most this many problems of every task.",
+    )
+    merge.add_argument("--samples", action="append", default=[], metavar="TASK=N")
+
+    for command in [generate, merge]:
+        command.add_argument("--shards-dir", required=True)
+        command.add_argument("--tasks", nargs="+", default=["*"], metavar="PATTERN")
+
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    try:
+        names = select_tasks(args.tasks)
+        n_samples = sample_counts(names, args.n_samples, args.samples)
+        if args.command == "generate" and args.sudoku_bank:
+            SudokuBank(args.sudoku_bank)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    if args.command == "generate":
+        return generate_shards(
+            names,
+            args.shards_dir,
+            args.shards,
+            n_samples,
+            seed=args.seed,
+            workers=args.workers,
+            output_format=args.format,
+            sudoku_bank=args.sudoku_bank,
+        )
+
+    # Tasks selected by a pattern are skipped if they have no shards.
+    sharded = sharded_tasks(args.shards_dir)
+    names = [name for name in names if name in args.tasks or name in sharded]
+    return merge_shards(
+        names, args.shards_dir, args.output_dir, n_samples, args.num_shards
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""
+Endless stream of problems generated in memory, for training without exports.
+
+The stream is cut into batches of a single task. Every batch is seeded from
+the stream seed, its task and its index, and batch i of every task belongs to
+worker `i % num_workers`, so the dataloader workers of a training job produce
+disjoint and reproducible streams. Every worker takes its batches from all the
+selected tasks in turn, whatever the number of workers:
+
+    stream = ProblemStream(["sudoku_*", "set_count_*"], seed=1, processes=4)
+    for problem in stream:
+        ...
+
+Problems hold the question, the options, the answer, the full ASP program and
+the image as an (H, W, 3) uint8 array or PNG bytes. With `processes` set,
+batches are generated by a pool of background processes that keeps `prefetch`
+batches in flight. With an `augment` configuration every problem is rendered
+once and yielded as `variants` problems with differently augmented images (see
+`generators.augment`).
+"""
+
+import itertools
+import random
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from generators.augment import Augmentation, augment_images
+from generators.utils import encode_image, image_to_array
+from pipeline.tasks import TASKS, select_tasks
+from solvers import profiles
+
+IMAGE_FORMATS = ["array", "png"]
+
+
+def batch_seed(seed: int, name: str, index: int) -> int:
+    return zlib.crc32(f"{seed}:{name}:{index}".encode())
+
+
+def generate_batch(
+    name: str,
+    index: int,
+    seed: int,
+    batch_size: int,
+    image_format: str = "array",
+    verify: bool = False,
+    augment: Augmentation | None = None,
+    variants: int = 1,
+) -> list[dict]:
+    """Generates batch `index` of a task in memory."""
+    task = TASKS[name]
+    seed = batch_seed(seed, name, index)
+    # The generators draw from the global RNGs, which are restored afterwards
+    # so that the training loop running in this process is not affected.
+    states = np.random.get_state(), random.getstate()
+    np.random.seed(seed)
+    random.seed(seed)
+    try:
+        rng = np.random.default_rng(seed)
+        with profiles.for_task(name):
+            specs = task.generate(batch_size, rng)
+            specs = [specs[i] for i in rng.permutation(len(specs))]
+            if verify and not all(task.verify(specs)):
+                raise AssertionError(f"The solver disagrees with some {name} answers")
+
+        base_asp = task.base_asp()
+        convert = image_to_array if image_format == "array" else encode_image
+        programs = task.serialize(specs)
+        images = task.render(specs)
+        if augment is None:
+            ids = [f"{name}-{index}-{i}" for i in range(len(specs))]
+            return [
+                _problem(name, id, spec, base_asp + asp, convert(image))
+                for id, spec, asp, image in zip(ids, specs, programs, images)
+            ]
+
+        # Every variant of a problem is augmented from the same render.
+        images = [image_to_array(image) for image in images]
+        problems = []
+        for variant in range(variants):
+            ids = [f"{name}-{index}-{i}-v{variant}" for i in range(len(specs))]
+            seeds = [zlib.crc32(f"{seed}:{id}".encode()) for id in ids]
+            problems.extend(
+                _problem(name, id, spec, base_asp + asp, convert(image))
+                for id, spec, asp, image in zip(
+                    ids, specs, programs, augment_images(images, seeds, augment)
+                )
+            )
+        return problems
+    finally:
+        np.random.set_state(states[0])
+        random.setstate(states[1])
+
+
+def _problem(name: str, id: str, spec: dict, asp: str, image) -> dict:
+    return {
+        "task": name,
+        "id": id,
+        "question": spec["question"],
+        "options": spec["options"],
+        "answer": spec["answer"],
+        "asp": asp,
+        "image": image,
+    }
+
+
+def _worker_info() -> tuple[int, int]:
+    # Inside a torch DataLoader worker the stream is split between workers.
+    try:
+        from torch.utils.data import get_worker_info
+    except ImportError:
+        return 0, 1
+    info = get_worker_info()
+    return (info.id, info.num_workers) if info is not None else (0, 1)
+
+
+class ProblemStream:
+    """
+    Iterable of in-memory problems of the tasks matching the patterns.
+
+    `worker_id` and `num_workers` default to the torch DataLoader worker, if
+    any. DataLoader workers cannot start processes of their own, so leave
+    `processes` at 0 there and let the DataLoader prefetch instead.
+    """
+
+    def __init__(
+        self,
+        tasks: list[str] | None = None,
+        seed: int = 0,
+        batch_size: int = 16,
+        image_format: str = "array",
+        verify: bool = False,
+        worker_id: int | None = None,
+        num_workers: int | None = None,
+        processes: int = 0,
+        prefetch: int = 4,
+        augment: Augmentation | None = None,
+        variants: int = 1,
+    ):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format: {image_format}")
+        if variants > 1 and augment is None:
+            raise ValueError("Variants of a problem need an augmentation")
+        self.names = select_tasks(tasks or ["*"])
+        self.seed = seed
+        self.batch_size = batch_size
+        self.image_format = image_format
+        self.verify = verify
+        self.worker_id = worker_id
+        self.num_workers = num_workers
+        self.processes = processes
+        self.prefetch = max(prefetch, processes)
+        self.augment = augment
+        self.variants = variants
+
+    def batches(self):
+        """(task, index) of the batches of this worker, without end."""
+        worker_id, num_workers = _worker_info()
+        if self.worker_id is not None:
+            worker_id = self.worker_id
+        if self.num_workers is not None:
+            num_workers = self.num_workers
+
+        # Workers start from different tasks, so that the batches of a round
+        # of workers cover the tasks evenly.
+        for index in itertools.count(worker_id, num_workers):
+            for task in range(len(self.names)):
+                yield self.names[(worker_id + task) % len(self.names)], index
+
+    def _arguments(self, name: str, index: int) -> tuple:
+        return (
+            name,
+            index,
+            self.seed,
+            self.batch_size,
+            self.image_format,
+            self.verify,
+            self.augment,
+            self.variants,
+        )
+
+    def __iter__(self):
+        batches = self.batches()
+        if self.processes <= 0:
+            for name, index in batches:
+                yield from generate_batch(*self._arguments(name, index))
+            return
+
+        executor = ProcessPoolExecutor(max_workers=self.processes)
+        try:
+            pending = deque(
+                executor.submit(generate_batch, *self._arguments(name, index))
+                for name, index in itertools.islice(batches, self.prefetch)
+            )
+            while True:
+                batch = pending.popleft().result()
+                name, index = next(batches)
+                pending.append(
+                    executor.submit(generate_batch, *self._arguments(name, index))
+                )
+                yield from batch
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,56 @@
+"""
+Exportable tasks, named after the directory each of them writes to.
+
+Tasks with the same group run one after another in a single job so that they
+can share state, e.g. the graph tasks share one `GraphDedupIndex` so that no
+graph structure appears in both of them.
+"""
+
+import fnmatch
+
+from generators.graph_index import GraphDedupIndex
+from generators.registry import load_tasks
+
+TASKS = load_tasks()
+
+GROUPS = {
+    "graph_validity": "graph",
+    "graph_fill_in": "graph",
+}
+
+# Shared state of every group, created once per job and passed to `generate`.
+GROUP_STATE = {
+    "graph": lambda: {"index": GraphDedupIndex()},
+}
+
+
+def task_job(name: str) -> str:
+    return GROUPS.get(name, name)
+
+
+def select_tasks(patterns: list[str]) -> list[str]:
+    """Names of the tasks matching any of the shell patterns, in order."""
+    names = []
+    for pattern in patterns:
+        matches = fnmatch.filter(TASKS, pattern)
+        if not matches:
+            raise ValueError(f"No task matches {pattern!r}, see --list-tasks")
+        names.extend(name for name in matches if name not in names)
+    return names
+
+
+def sample_counts(
+    names: list[str], default: int, overrides: list[str]
+) -> dict[str, int]:
+    """Number of samples of every task, with `TASK=N` pattern overrides."""
+    n_samples = {name: default for name in names}
+    for override in overrides:
+        pattern, _, count = override.rpartition("=")
+        if not pattern:
+            raise ValueError(f"Expected TASK=N, got {override!r}")
+        matches = fnmatch.filter(names, pattern)
+        if not matches:
+            raise ValueError(f"No selected task matches {pattern!r} in {override!r}")
+        for name in matches:
+            n_samples[name] = int(count)
+    return n_samples
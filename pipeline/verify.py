@@ -0,0 +1,298 @@
+"""
+Consistency checks of exported datasets against their ASP programs.
+
+Every `asp_code/<id>.asp` program of a task is solved again in a pool of clingo
+processes, and the answer of its problem in `data.json` must be the option
+implied by the models, e.g. the `answer/1` atom of a fill-in problem or the
+satisfiability of a validity problem. Saved specs must also pass the check of
+their task. Options, images and duplicate instances are checked without the
+solver:
+
+    python -m pipeline.verify --data-dir ./data --workers 8 --report report.json
+
+Identical programs are only solved once, and with `--cache` the models are kept
+in a SQLite file so that only new programs are solved when checking again.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from generators.registry import SPECS_FILENAME, read_specs
+from generators.utils import (
+    OUTPUT_FORMATS,
+    load_asp_program,
+    option_text,
+    read_problems,
+)
+from pipeline.tasks import TASKS
+from solvers.cache import SolverCache, program_key
+from solvers.sandbox import STATUSES, SolverPool
+
+ISSUES = [
+    "asp",
+    "options",
+    "image",
+    "duplicate",
+    "solver",
+    "ambiguous",
+    "answer",
+    "spec",
+]
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Problem ids listed per issue and task in the report.
+MAX_IDS = 20
+MAX_MODELS = 2
+
+
+def task_formats(data_dir: str, names: list[str] | None = None) -> dict[str, str]:
+    """Output format of every exported task directory."""
+    formats = {}
+    for name in sorted(os.listdir(data_dir)):
+        if names is not None and name not in names:
+            continue
+        for output_format in OUTPUT_FORMATS:
+            if os.path.exists(os.path.join(data_dir, name, f"data.{output_format}")):
+                formats[name] = output_format
+                break
+    return formats
+
+
+def check_options(problem: dict) -> bool:
+    """Whether the options are lettered in order, distinct and hold the answer."""
+    options = problem.get("options") or []
+    letters = [chr(65 + i) for i in range(len(options))]
+    texts = [option_text(option) for option in options]
+    return (
+        bool(options)
+        and all(
+            option.startswith(f"{letter}) ") for letter, option in zip(letters, options)
+        )
+        and len(set(texts)) == len(texts)
+        and problem.get("answer") in letters
+    )
+
+
+def check_image(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(PNG_SIGNATURE)) == PNG_SIGNATURE
+    except OSError:
+        return False
+
+
+class TaskReport:
+    """Issues of the problems of a task, with the ids of the first ones."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.n = 0
+        self.counts = dict.fromkeys(ISSUES, 0)
+        self.ids: dict[str, list[str]] = {issue: [] for issue in ISSUES}
+        self.statuses = dict.fromkeys(STATUSES, 0)
+        self.cached = 0
+
+    def add(self, issue: str, id: str):
+        self.counts[issue] += 1
+        if len(self.ids[issue]) < MAX_IDS:
+            self.ids[issue].append(id)
+
+    @property
+    def ok(self) -> bool:
+        return not any(self.counts.values())
+
+    def to_dict(self) -> dict:
+        return {
+            "n": self.n,
+            "ok": self.ok,
+            "cached": self.cached,
+            "statuses": {status: n for status, n in self.statuses.items() if n},
+            "issues": {issue: n for issue, n in self.counts.items() if n},
+            "ids": {issue: ids for issue, ids in self.ids.items() if ids},
+        }
+
+
+class _Problem:
+    def __init__(self, report: TaskReport, problem: dict, spec: dict | None, key):
+        self.report = report
+        self.problem = problem
+        self.spec = spec
+        self.key = key
+
+
+def scan_task(
+    data_dir: str, name: str, output_format: str
+) -> tuple[TaskReport, list[_Problem], dict[str, str]]:
+    """
+    Checks the problems of a task that need no solver and returns them with
+    the program path of every program key.
+    """
+    task_dir = os.path.join(data_dir, name)
+    report = TaskReport(name)
+    problems = read_problems(task_dir, output_format)
+    specs_path = os.path.join(task_dir, SPECS_FILENAME)
+    specs = []
+    if name in TASKS and os.path.exists(specs_path):
+        specs = read_specs(TASKS[name], specs_path)
+    if specs and len(specs) != len(problems):
+        # Specs that do not line up with the problems cannot be checked.
+        report.add("spec", SPECS_FILENAME)
+        specs = []
+
+    scanned = []
+    paths = {}
+    seen = {}
+    for i, problem in enumerate(problems):
+        report.n += 1
+        id = problem.get("id", f"problem_{i}")
+        if not check_options(problem):
+            report.add("options", id)
+        if not check_image(os.path.join(task_dir, "images", f"{id}.png")):
+            report.add("image", id)
+
+        spec = specs[i] if specs else None
+        if spec is not None and any(
+            spec[field] != problem.get(field) for field in ("options", "answer")
+        ):
+            report.add("spec", id)
+
+        asp_path = os.path.join(task_dir, "asp_code", f"{id}.asp")
+        try:
+            key = program_key(load_asp_program(asp_path), MAX_MODELS)
+        except OSError:
+            report.add("asp", id)
+            key = None
+        if key is not None:
+            if key in seen:
+                report.add("duplicate", id)
+            seen.setdefault(key, id)
+            paths.setdefault(key, asp_path)
+        scanned.append(_Problem(report, problem, spec, key))
+    return report, scanned, paths
+
+
+def check_models(item: _Problem, models: list[list[str]]):
+    report, problem = item.report, item.problem
+    id = problem.get("id")
+    task = TASKS.get(report.name)
+    if task is None:
+        return
+    if item.spec is not None and not task.check(item.spec, models):
+        report.add("spec", id)
+
+    expected = task.answer_text(models)
+    if expected is None:
+        report.add("ambiguous", id)
+        return
+    options = [option_text(option) for option in problem.get("options") or []]
+    if expected not in options:
+        report.add("answer", id)
+    elif chr(65 + options.index(expected)) != problem.get("answer"):
+        report.add("answer", id)
+
+
+def verify_dataset(
+    data_dir: str,
+    pool: SolverPool,
+    names: list[str] | None = None,
+    cache: SolverCache | None = None,
+    progress_seconds: float = 5.0,
+) -> dict[str, TaskReport]:
+    reports = {}
+    scanned: list[_Problem] = []
+    paths: dict[str, str] = {}
+    for name, output_format in task_formats(data_dir, names).items():
+        report, problems, task_paths = scan_task(data_dir, name, output_format)
+        reports[name] = report
+        scanned.extend(problems)
+        for key, path in task_paths.items():
+            paths.setdefault(key, path)
+
+    models = cache.get_many(list(paths)) if cache is not None else {}
+    for item in scanned:
+        if item.key in models:
+            item.report.cached += 1
+    todo = [key for key in paths if key not in models]
+    print(
+        f"{len(scanned)} problems, {len(paths)} programs, "
+        f"{len(paths) - len(todo)} cached",
+        flush=True,
+    )
+
+    # Programs are read again when submitted so that they are not all held in
+    # memory at once.
+    jobs = ((key, load_asp_program(paths[key])) for key in todo)
+    failed = {}
+    solved = {}
+    last = time.monotonic()
+    for key, result in pool.imap_unordered(jobs):
+        if result.models is not None:
+            solved[key] = models[key] = result.models
+        else:
+            failed[key] = result.status
+        if cache is not None and len(solved) >= 1000:
+            cache.put_many(solved)
+            solved = {}
+        if time.monotonic() - last >= progress_seconds:
+            print(f"{len(models) + len(failed)}/{len(paths)} programs solved")
+            last = time.monotonic()
+    if cache is not None:
+        cache.put_many(solved)
+
+    for item in scanned:
+        if item.key is None:
+            continue
+        if item.key in failed:
+            item.report.statuses[failed[item.key]] += 1
+            item.report.add("solver", item.problem.get("id"))
+            continue
+        item_models = models[item.key]
+        item.report.statuses["sat" if item_models else "unsat"] += 1
+        check_models(item, item_models)
+    return reports
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--data-dir", required=True)
+    parser.add_argument("--tasks", nargs="+", default=None)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--time-limit", type=float, default=60.0, help="Seconds per program."
+    )
+    parser.add_argument(
+        "--memory-limit", type=int, default=2048, help="Megabytes per worker."
+    )
+    parser.add_argument("--cache", default=None, help="SQLite file of solved models.")
+    parser.add_argument("--report", default=None, help="Write the report as JSON.")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    pool = SolverPool(args.workers, args.time_limit, args.memory_limit, MAX_MODELS)
+    cache = SolverCache(args.cache) if args.cache else None
+    try:
+        reports = verify_dataset(args.data_dir, pool, args.tasks, cache)
+    finally:
+        if cache is not None:
+            cache.close()
+    if not reports:
+        print(f"No problems found in {args.data_dir}", file=sys.stderr)
+        return 2
+
+    for name, report in reports.items():
+        issues = ", ".join(f"{n} {issue}" for issue, n in report.counts.items() if n)
+        print(f"{name}: {report.n} problems, {issues or 'ok'}", flush=True)
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({name: r.to_dict() for name, r in reports.items()}, f, indent=4)
+        print(f"Report written to {args.report}")
+    return 0 if all(report.ok for report in reports.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+import sys
+from functools import lru_cache
+
+import clingo
+import clingo.ast
+
+Term = int | str | tuple | clingo.Symbol
+
+
+def to_symbol(term: Term) -> clingo.Symbol:
+    if isinstance(term, clingo.Symbol):
+        return term
+    if isinstance(term, tuple):
+        return clingo.Tuple_([to_symbol(t) for t in term])
+    if isinstance(term, str):
+        return clingo.Function(term)
+    return clingo.Number(int(term))
+
+
+@lru_cache(maxsize=None)
+def parse_base(base: str) -> tuple[clingo.ast.AST, ...]:
+    # Base encodings are shared by every instance of a task, so they are
+    # parsed once and the AST is reused for each new control object.
+    statements = []
+    clingo.ast.parse_string(base, statements.append)
+    return tuple(statements)
+
+
+def _logger(code: clingo.MessageCode, message: str):
+    # Facts added through the backend are unknown to the parser, which would
+    # otherwise report them as undefined atoms.
+    if code != clingo.MessageCode.AtomUndefined:
+        print(message, file=sys.stderr)
+
+
+class AspInstance:
+    """
+    Instance facts kept as clingo symbols together with the base encoding.
+
+    Facts are added to a control object through its backend, so nothing but
+    the (cached) base encoding is parsed when solving. `to_asp` serializes the
+    facts to text and is only needed when exporting the program.
+    """
+
+    def __init__(self, base: str):
+        self.base = base
+        self._sections: list[tuple[str | None, list[clingo.Symbol]]] = []
+
+    def comment(self, comment: str):
+        self._sections.append((comment, []))
+
+    def add_fact(self, name: str, *arguments: Term):
+        self.add_facts(name, [arguments])
+
+    def add_facts(self, name: str, rows):
+        if not self._sections:
+            self._sections.append((None, []))
+        self._sections[-1][1].extend(
+            clingo.Function(name, [to_symbol(argument) for argument in row])
+            for row in rows
+        )
+
+    @property
+    def facts(self) -> list[clingo.Symbol]:
+        return [fact for _, facts in self._sections for fact in facts]
+
+    @property
+    def size(self) -> int:
+        """Number of statements, as counted by `profiles.program_size`."""
+        size = self.base.count(".\n")
+        for comment, facts in self._sections:
+            # Comments that end with a period are counted in the text too.
+            size += len(facts) + (comment or "").endswith(".")
+        return size
+
+    def control(self, arguments: list[str] | None = None) -> clingo.Control:
+        control = clingo.Control(arguments or [], logger=_logger)
+        with clingo.ast.ProgramBuilder(control) as builder:
+            for statement in parse_base(self.base):
+                builder.add(statement)
+        with control.backend() as backend:
+            for fact in self.facts:
+                backend.add_rule([backend.add_atom(fact)])
+        control.ground([("base", [])])
+        return control
+
+    def to_asp(self) -> str:
+        lines = []
+        for comment, facts in self._sections:
+            if lines:
+                lines.append("")
+            if comment is not None:
+                lines.append(f"% {comment}")
+            lines.extend(f"{fact}." for fact in facts)
+        return "\n".join(lines) + "\n"
+
+    def to_program(self) -> str:
+        return self.base + self.to_asp()
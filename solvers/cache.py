@@ -0,0 +1,58 @@
+"""
+On-disk cache of solver results, keyed by the hash of the full program.
+
+Results are kept in a SQLite file, so a dataset that is checked again only
+solves the programs that changed. Only the process that owns the cache reads
+and writes it; workers of a pool send their results back to it.
+"""
+
+import hashlib
+import json
+import sqlite3
+
+# Programs are looked up in batches below SQLite's limit of host parameters.
+BATCH_SIZE = 500
+
+
+def program_key(program: str, max_models: int) -> str:
+    digest = hashlib.sha256(program.encode()).hexdigest()
+    return f"{digest}:{max_models}"
+
+
+class SolverCache:
+    """Shown atoms of the models of the solved programs."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS models (key TEXT PRIMARY KEY, models TEXT)"
+        )
+
+    def get_many(self, keys: list[str]) -> dict[str, list[list[str]]]:
+        found = {}
+        for start in range(0, len(keys), BATCH_SIZE):
+            batch = keys[start : start + BATCH_SIZE]
+            rows = self._connection.execute(
+                "SELECT key, models FROM models WHERE key IN "
+                f"({', '.join('?' * len(batch))})",
+                batch,
+            )
+            found.update((key, json.loads(models)) for key, models in rows)
+        return found
+
+    def put_many(self, items: dict[str, list[list[str]]]):
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO models VALUES (?, ?)",
+                [(key, json.dumps(models)) for key, models in items.items()],
+            )
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,5 +1,10 @@
 import clingo
 
+from pipeline import metrics
+from solvers import profiles
+from solvers.asp_instance import AspInstance
+from solvers.profiles import SolverProfile
+
 
 class ClingoSolver:
     @staticmethod
@@ -11,30 +16,83 @@ class ClingoSolver:
 
     @staticmethod
     def _get_answer(control: clingo.Control) -> int:
+        # `handle.get()` would wait for the search to end and consume the
+        # models, so the models are iterated directly.
         with control.solve(yield_=True) as handle:
-            if handle.get().satisfiable:
-                for model in handle:
-                    for atom in model.symbols(atoms=True):
-                        if atom.name == "answer":
-                            return atom.arguments[0]
+            for model in handle:
+                for atom in model.symbols(atoms=True):
+                    if atom.name == "answer":
+                        return atom.arguments[0]
+
+    @staticmethod
+    def _ground(
+        asp_program: str | AspInstance, profile: SolverProfile | None = None
+    ) -> clingo.Control:
+        # The search configuration is part of the control, so the profile of
+        # the current task is chosen before grounding.
+        if profile is None:
+            if isinstance(asp_program, AspInstance):
+                size = asp_program.size
+            else:
+                size = profiles.program_size(asp_program)
+            profile = profiles.select(size)
+        metrics.count("solver_calls", profile=profile.name)
+        with metrics.timer("ground_seconds"):
+            if isinstance(asp_program, AspInstance):
+                return asp_program.control(profile.arguments())
+
+            control = clingo.Control(profile.arguments())
+            control.add("base", [], asp_program)
+            control.ground([("base", [])])
+            return control
 
     @staticmethod
-    def get_models_count(asp_program: str) -> int:
-        control = clingo.Control()
-        control.add("base", [], asp_program)
-        control.ground([("base", [])])
+    def get_models_count(asp_program: str | AspInstance) -> int:
+        control = ClingoSolver._ground(asp_program)
         control.configuration.solve.models = 0
 
-        with control.solve(yield_=True) as handle:
+        with metrics.timer("solve_seconds"), control.solve(yield_=True) as handle:
             return len(list(handle))
 
     @staticmethod
-    def solve(asp_program: str, check_satisfied: bool = True) -> bool:
-        control = clingo.Control()
-        control.add("base", [], asp_program)
-        control.ground([("base", [])])
+    def get_models(
+        asp_program: str | AspInstance,
+        max_models: int = 0,
+        profile: SolverProfile | None = None,
+    ) -> list[list[str]]:
+        """
+        Shown atoms of up to `max_models` models (0 for all of them), solved
+        with the given profile or the one of the current task.
+        """
+        control = ClingoSolver._ground(asp_program, profile)
+        control.configuration.solve.models = max_models
+
+        with metrics.timer("solve_seconds"), control.solve(yield_=True) as handle:
+            return [sorted(map(str, model.symbols(shown=True))) for model in handle]
+
+    @staticmethod
+    def solve(
+        asp_program: str | AspInstance,
+        check_satisfied: bool = True,
+        timeout: float | None = None,
+    ) -> bool | None:
+        """
+        Whether the program is satisfiable, or its answer atom. With a timeout
+        in seconds, the satisfiability check gives None if the search does not
+        end in time.
+        """
+        control = ClingoSolver._ground(asp_program)
         control.configuration.solve.models = 0
 
-        if check_satisfied:
-            return ClingoSolver._check_satisfied(control)
-        return ClingoSolver._get_answer(control)
+        with metrics.timer("solve_seconds"):
+            if check_satisfied and timeout is not None:
+                # Without yielded models the search has to stop at the first one.
+                control.configuration.solve.models = 1
+                with control.solve(async_=True) as handle:
+                    if not handle.wait(timeout):
+                        handle.cancel()
+                        return None
+                    return handle.get().satisfiable
+            if check_satisfied:
+                return ClingoSolver._check_satisfied(control)
+            return ClingoSolver._get_answer(control)
@@ -0,0 +1,112 @@
+"""
+Clingo search configurations, selected per task and instance size.
+
+A `SolverProfile` holds the command-line options of a clingo control: the
+configuration preset, the heuristic, the optimization mode and the number of
+threads with their parallel mode. The profiles of `PROFILES` are the ones that
+`benchmarks.autotune` compares. It writes a table of the fastest profile of
+every task and instance size, which is installed with `set_table` and applied
+by `ClingoSolver` to every program solved inside `for_task(name)`:
+
+    {"tasks": {"sudoku_fill_in": [{"max_size": 200, "profile": "tweety"}]}}
+
+The size of a program is its number of statements. A task uses the entry with
+the smallest `max_size` that fits, or its last entry for larger programs, and
+programs of other tasks use the default configuration.
+"""
+
+import json
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+PARALLEL_MODES = ["compete", "split"]
+
+
+@dataclass(frozen=True)
+class SolverProfile:
+    name: str
+    configuration: str = "auto"
+    heuristic: str | None = None
+    opt_mode: str | None = None
+    threads: int = 1
+    parallel_mode: str = "compete"
+
+    def arguments(self) -> list[str]:
+        """Command-line options of a clingo control using the profile."""
+        arguments = []
+        if self.configuration != "auto":
+            arguments.append(f"--configuration={self.configuration}")
+        if self.heuristic is not None:
+            arguments.append(f"--heuristic={self.heuristic}")
+        if self.opt_mode is not None:
+            arguments.append(f"--opt-mode={self.opt_mode}")
+        if self.threads > 1:
+            arguments.append(f"--parallel-mode={self.threads},{self.parallel_mode}")
+        return arguments
+
+
+PROFILES = {
+    profile.name: profile
+    for profile in [
+        SolverProfile("default"),
+        SolverProfile("frumpy", configuration="frumpy"),
+        SolverProfile("jumpy", configuration="jumpy"),
+        SolverProfile("tweety", configuration="tweety"),
+        SolverProfile("trendy", configuration="trendy"),
+        SolverProfile("crafty", configuration="crafty"),
+        SolverProfile("handy", configuration="handy"),
+        SolverProfile("vsids", heuristic="Vsids"),
+        SolverProfile("berkmin", heuristic="Berkmin"),
+        SolverProfile("compete-2", configuration="many", threads=2),
+        SolverProfile("compete-4", configuration="many", threads=4),
+        SolverProfile("split-4", threads=4, parallel_mode="split"),
+    ]
+}
+DEFAULT_PROFILE = PROFILES["default"]
+
+_table: dict[str, list[tuple[int, str]]] = {}
+_task: str | None = None
+
+
+def set_table(table: dict | None):
+    """Installs a table written by `benchmarks.autotune`, or clears it."""
+    _table.clear()
+    for task, entries in ((table or {}).get("tasks") or {}).items():
+        _table[task] = sorted(
+            (entry["max_size"], entry["profile"]) for entry in entries
+        )
+        for _, name in _table[task]:
+            if name not in PROFILES:
+                raise ValueError(f"Unknown solver profile {name!r} for {task}")
+
+
+def load_table(path: str) -> dict:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+@contextmanager
+def for_task(name: str | None):
+    """Selects the profiles of a task for the programs solved in the block."""
+    global _task
+    previous = _task
+    _task = name
+    try:
+        yield
+    finally:
+        _task = previous
+
+
+def select(size: int) -> SolverProfile:
+    """Profile of a program of `size` statements of the current task."""
+    entries = _table.get(_task) if _task is not None else None
+    if not entries:
+        return DEFAULT_PROFILE
+    for max_size, name in entries:
+        if size <= max_size:
+            return PROFILES[name]
+    return PROFILES[entries[-1][1]]
+
+
+def program_size(program: str) -> int:
+    return program.count(".\n")
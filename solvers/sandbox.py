@@ -0,0 +1,175 @@
+"""
+Pool of isolated clingo worker processes for untrusted ASP programs.
+
+Every program is ground and solved in a worker process with an address-space
+limit. A worker that runs over the time limit is killed and replaced, so a
+program that never finishes grounding cannot stall the pool. Programs with
+`#script` or `#include` directives are rejected, because they would run code
+or read files outside the solver.
+"""
+
+import multiprocessing
+import re
+import time
+from dataclasses import dataclass
+from multiprocessing.connection import wait
+
+import clingo
+
+# Outcomes of a program, "sat" and "unsat" are the only successful ones.
+STATUSES = ["sat", "unsat", "error", "rejected", "timeout", "memory", "crashed"]
+FORBIDDEN = re.compile(r"#\s*(script|include)\b")
+
+
+@dataclass
+class SolveResult:
+    status: str
+    models: list[list[str]] | None = None
+    message: str | None = None
+    seconds: float = 0.0
+
+
+def solve_program(program: str, max_models: int = 2) -> SolveResult:
+    """Shown atoms of up to `max_models` models, solved in this process."""
+    if FORBIDDEN.search(program):
+        return SolveResult("rejected", message="#script and #include are not allowed")
+
+    messages = []
+    control = clingo.Control(
+        [str(max_models)],
+        logger=lambda code, message: messages.append(message),
+        message_limit=5,
+    )
+    try:
+        control.add("base", [], program)
+        control.ground([("base", [])])
+        with control.solve(yield_=True) as handle:
+            models = [sorted(map(str, model.symbols(shown=True))) for model in handle]
+    except MemoryError:
+        return SolveResult("memory")
+    except RuntimeError as e:
+        return SolveResult("error", message="".join(messages).strip() or str(e))
+
+    return SolveResult("sat" if models else "unsat", models)
+
+
+def _worker(connection, memory_limit: int | None):
+    if memory_limit is not None:
+        import resource
+
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    while True:
+        job = connection.recv()
+        if job is None:
+            return
+        key, program, max_models = job
+        start = time.perf_counter()
+        result = solve_program(program, max_models)
+        result.seconds = time.perf_counter() - start
+        connection.send((key, result))
+
+
+class _Worker:
+    def __init__(self, context, memory_limit: int | None):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(
+            target=_worker, args=(child, memory_limit), daemon=True
+        )
+        self.process.start()
+        child.close()
+        self.job = None
+        self.deadline = None
+
+    def submit(self, key, program: str, max_models: int, time_limit: float):
+        self.connection.send((key, program, max_models))
+        self.job = key
+        self.deadline = time.monotonic() + time_limit
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+        self.connection.close()
+
+
+class SolverPool:
+    """
+    Solves (key, program) jobs in `workers` processes, each limited to
+    `time_limit` seconds per program and `memory_limit` megabytes.
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        time_limit: float = 10.0,
+        memory_limit: int | None = 1024,
+        max_models: int = 2,
+    ):
+        self.workers = workers
+        self.time_limit = time_limit
+        self.memory_limit = memory_limit * 1024 * 1024 if memory_limit else None
+        self.max_models = max_models
+        self._context = multiprocessing.get_context()
+
+    def _start(self) -> _Worker:
+        return _Worker(self._context, self.memory_limit)
+
+    def imap_unordered(self, jobs):
+        """Yields (key, SolveResult) of every job as soon as it is solved."""
+        jobs = iter(jobs)
+        workers = [self._start() for _ in range(self.workers)]
+        try:
+            idle = list(workers)
+            busy: dict = {}
+            while True:
+                while idle:
+                    job = next(jobs, None)
+                    if job is None:
+                        break
+                    worker = idle.pop()
+                    worker.submit(*job, self.max_models, self.time_limit)
+                    busy[worker.connection] = worker
+                if not busy:
+                    return
+
+                timeout = min(worker.deadline for worker in busy.values())
+                ready = wait(list(busy), max(timeout - time.monotonic(), 0))
+                for connection in ready:
+                    worker = busy.pop(connection)
+                    try:
+                        key, result = connection.recv()
+                    except EOFError:
+                        # The process died, e.g. it was killed by the kernel.
+                        key, result = worker.job, SolveResult("crashed")
+                        workers.remove(worker)
+                        worker.kill()
+                        worker = self._start()
+                        workers.append(worker)
+                    idle.append(worker)
+                    yield key, result
+
+                now = time.monotonic()
+                for connection, worker in list(busy.items()):
+                    if worker.deadline <= now:
+                        del busy[connection]
+                        workers.remove(worker)
+                        worker.kill()
+                        replacement = self._start()
+                        workers.append(replacement)
+                        idle.append(replacement)
+                        yield worker.job, SolveResult(
+                            "timeout", seconds=self.time_limit
+                        )
+        finally:
+            for worker in workers:
+                worker.stop()
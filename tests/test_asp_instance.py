@@ -0,0 +1,53 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from generators.graph import build_validity_instance
+from generators.set_cards import generate_games, generate_instance
+from generators.sudoku import build_sudoku_instance, random_valid_grids
+from solvers.asp_instance import AspInstance
+from solvers.clingo_solver import ClingoSolver
+from solvers.profiles import program_size
+
+BASE = "edge(X, Y) :- link(X, Y).\nedge(Y, X) :- link(X, Y).\n#show edge/2.\n"
+
+
+def test_to_asp():
+    instance = AspInstance(BASE)
+    instance.add_fact("start", 1)
+    instance.comment("Links")
+    instance.add_facts("link", [(1, "a"), (2, (3, 4))])
+
+    assert instance.to_asp() == "start(1).\n\n% Links\nlink(1,a).\nlink(2,(3,4)).\n"
+    assert instance.to_program() == BASE + instance.to_asp()
+    assert instance.size == program_size(instance.to_program())
+
+
+def _instances() -> list[AspInstance]:
+    rng = np.random.default_rng(0)
+    grid = random_valid_grids(1, rng, [_solved_grid()])[0]
+    fill_in = grid.copy()
+    fill_in[rng.random((9, 9)) < 0.3] = 0
+    graph = nx.petersen_graph()
+    return [
+        build_sudoku_instance(grid),
+        build_sudoku_instance(fill_in),
+        build_validity_instance(graph, ["red", "blue", "green"]),
+        build_validity_instance(graph, ["red", "blue"]),
+        generate_instance(generate_games(True, 1, rng)[0]),
+    ]
+
+
+def _solved_grid() -> list[list[int]]:
+    return [
+        [(3 * (row % 3) + row // 3 + col) % 9 + 1 for col in range(9)]
+        for row in range(9)
+    ]
+
+
+@pytest.mark.parametrize("instance", _instances())
+def test_backend_facts_match_text(instance):
+    assert ClingoSolver.get_models(instance, max_models=5) == ClingoSolver.get_models(
+        instance.to_program(), max_models=5
+    )
+    assert instance.size == program_size(instance.to_program())
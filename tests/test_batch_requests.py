@@ -0,0 +1,70 @@
+import json
+import os
+
+import numpy as np
+
+from pipeline.batch_requests import ShardedWriter, build_batch_requests
+from pipeline.tasks import TASKS
+
+
+def _read_jsonl(path: str) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_odd_count_of_validity_requests(tmp_path):
+    paths = build_batch_requests(
+        TASKS["set_validity"],
+        str(tmp_path),
+        5,
+        "model",
+        shots=1,
+        rng=np.random.default_rng(0),
+    )
+
+    requests = [request for path in paths for request in _read_jsonl(path)]
+    assert [request["custom_id"] for request in requests] == [
+        f"set_validity-{i}" for i in range(5)
+    ]
+    for request in requests:
+        content = request["body"]["messages"][0]["content"]
+        # One example image and the problem image, then the prompt.
+        assert [block["type"] for block in content] == [
+            "image_url",
+            "image_url",
+            "text",
+        ]
+
+    answers = _read_jsonl(os.path.join(tmp_path, "set_validity", "answers.jsonl"))
+    assert len(answers) == 5
+    assert {answer["spec"]["valid"] for answer in answers} == {True, False}
+
+
+def test_anthropic_requests(tmp_path):
+    paths = build_batch_requests(
+        TASKS["set_validity"],
+        str(tmp_path),
+        2,
+        "model",
+        api="anthropic",
+        shots=0,
+        rng=np.random.default_rng(0),
+    )
+
+    requests = _read_jsonl(paths[0])
+    assert len(requests) == 2
+    content = requests[0]["params"]["messages"][0]["content"]
+    assert [block["type"] for block in content] == ["image", "text"]
+
+
+def test_sharded_writer_limits(tmp_path):
+    prefix = os.path.join(tmp_path, "lines")
+    with ShardedWriter(prefix, max_bytes=10, max_lines=2) as writer:
+        for line in ["a", "b", "c", "dddd", "eeee"]:
+            writer.write(line)
+
+    contents = []
+    for path in writer.paths:
+        with open(path) as f:
+            contents.append(f.read().split())
+    assert contents == [["a", "b"], ["c", "dddd"], ["eeee"]]
@@ -0,0 +1,36 @@
+import pytest
+
+from pipeline.evaluate import extract_answer, extract_asp
+
+ASP = "###ASP_START###\nanswer(N) :- cell(N, X).\n#show answer/1.\n###ASP_END###"
+
+
+@pytest.mark.parametrize(
+    "text, answer",
+    [
+        ("The answer is B.", "B"),
+        ("Answer: C", "C"),
+        ("answer - (D)", "D"),
+        ("**Answer:** **A**", "A"),
+        ("A) red\nB) blue\n\nThe answer is B", "B"),
+        ("the answer is a tricky one, but B) is correct", "B"),
+        ("I would pick\n(C)", "C"),
+        ("Let me think.\nD\n", "D"),
+        (f"The answer is B.\n{ASP}", "B"),
+        ("The answer is B.\n###ASP_START###\nanswer(N) :- cell(N).", "B"),
+        (f"{ASP}\nSo the answer is C", "C"),
+        ("the answer is a guess", ""),
+        ("No idea.", ""),
+        (ASP, ""),
+    ],
+)
+def test_extract_answer(text, answer):
+    assert extract_answer(text) == answer
+
+
+def test_extract_asp():
+    assert extract_asp(f"The answer is B.\n{ASP}") == (
+        "answer(N) :- cell(N, X).\n#show answer/1."
+    )
+    assert extract_asp("###ASP_START###\na.") == "a."
+    assert extract_asp("The answer is B.") is None
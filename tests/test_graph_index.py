@@ -0,0 +1,67 @@
+import networkx as nx
+
+from generators.graph_index import GraphDedupIndex
+
+
+def _relabeled(graph: nx.Graph, seed: int) -> tuple[nx.Graph, dict]:
+    nodes = list(graph.nodes())
+    shuffled = list(nodes)
+    nx.utils.create_random_state(seed).shuffle(shuffled)
+    mapping = dict(zip(nodes, shuffled))
+    return nx.relabel_nodes(graph, mapping), mapping
+
+
+def _colors(colors: list[str], mapping: dict) -> list[str]:
+    relabeled = [None] * len(colors)
+    for node, color in enumerate(colors):
+        relabeled[mapping[node]] = color
+    return relabeled
+
+
+def test_isomorphic_colored_graphs():
+    graph = nx.cycle_graph(6)
+    graph.add_edge(0, 3)
+    colors = ["red", "blue", "red", "blue", "red", "grey"]
+    index = GraphDedupIndex()
+
+    assert index.add(graph, colors)
+    relabeled, mapping = _relabeled(graph, 0)
+    assert not index.add(relabeled, _colors(colors, mapping))
+    assert index.add(graph, ["red", "blue", "red", "blue", "grey", "blue"])
+    assert len(index) == 2
+
+
+def test_isomorphic_large_graphs():
+    graph = nx.petersen_graph()
+    index = GraphDedupIndex()
+
+    assert index.add(graph, color_choices=["red", "blue", "green"])
+    relabeled, _ = _relabeled(graph, 1)
+    assert not index.add(relabeled, color_choices=["green", "red", "blue"])
+    assert index.add(relabeled, color_choices=["red", "blue"])
+    # Same degrees and WL hash as the Petersen graph, but not isomorphic.
+    assert index.add(nx.circular_ladder_graph(5), color_choices=["red", "blue"])
+
+
+def test_contains_does_not_add():
+    graph = nx.path_graph(5)
+    index = GraphDedupIndex()
+
+    assert not index.contains(graph, color_choices=["red", "blue"])
+    assert not index.contains(graph, color_choices=["red", "blue"])
+    assert index.add(graph, color_choices=["red", "blue"])
+    assert index.contains(nx.path_graph(5), color_choices=["blue", "red"])
+    assert len(index) == 1
+
+
+def test_structures_are_not_shared_between_tasks():
+    index = GraphDedupIndex()
+    validity = nx.cycle_graph(5)
+    fill_in = nx.cycle_graph(5)
+    colors = ["red", "blue", "red", "blue", "grey"]
+
+    assert index.add(validity, color_choices=["red", "blue", "green"])
+    assert index.contains(fill_in, colors)
+    assert not index.add(fill_in, colors)
+    assert index.add(nx.path_graph(5), colors)
+    assert not index.add(nx.path_graph(5), color_choices=["red", "blue"])
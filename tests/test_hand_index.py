@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from generators.set_game.engine import count_sets
+from generators.set_game.hand_index import load_hand_index
+
+
+def test_sampled_hands_are_distinct():
+    index = load_hand_index(3)
+    size = index.stratum_size(1)
+    hands = index.sample(1, size, np.random.default_rng(0))
+
+    assert len({tuple(sorted(hand)) for hand in hands.tolist()}) == size
+    assert all(count_sets(hand) == 1 for hand in hands.tolist())
+    with pytest.raises(ValueError, match="asked"):
+        index.sample(1, size + 1, np.random.default_rng(0))
+
+
+def test_sampled_hands_have_the_asked_set_counts():
+    index = load_hand_index(4)
+    rng = np.random.default_rng(0)
+
+    assert all(count_sets(hand) == 0 for hand in index.sample(0, 50, rng).tolist())
+    assert all(
+        count_sets(hand) >= 1
+        for hand in index.sample(1, 50, rng, at_least=True).tolist()
+    )
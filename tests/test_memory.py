@@ -0,0 +1,30 @@
+import pytest
+
+from pipeline import memory
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    monkeypatch.setattr(memory, "rss", lambda: 100 * 2**20)
+    memory.set_budget(200 * 2**20)
+    yield
+    memory.set_budget(None)
+
+
+def test_batches_grow_after_batches_without_growth(budget):
+    batches = memory.AdaptiveBatch(default=4, maximum=64)
+    assert batches.size() == 2
+
+    batches.update(2, 0)
+    assert batches.item_bytes == memory.MIN_ITEM_BYTES
+    assert batches.size() == 64
+
+
+def test_batches_shrink_with_measured_growth(budget):
+    batches = memory.AdaptiveBatch(default=4, maximum=64)
+    batches.update(2, 20 * 2**20)
+    # 100 MiB are free and half of them may be used, at 10 MiB per item.
+    assert batches.size() == 5
+    batches.update(5, 0)
+    assert batches.item_bytes == 9 * 2**20
+    assert batches.size() == 5
@@ -0,0 +1,54 @@
+import json
+import os
+
+import pytest
+
+from pipeline.shards import (
+    MANIFEST_FILENAME,
+    generate_shards,
+    load_shards,
+    merge_shards,
+    shard_dir,
+    shard_dirs,
+)
+
+NAME = "set_validity"
+
+
+def _generate(shards_dir: str, shards: list[int]):
+    assert generate_shards([NAME], shards_dir, shards, {NAME: 4}, seed=1) == 0
+
+
+def _merged(shards_dir: str, output_dir: str) -> list[dict]:
+    assert merge_shards([NAME], shards_dir, output_dir, {NAME: None}, 2) == 0
+    with open(os.path.join(output_dir, NAME, "data.json")) as f:
+        return json.load(f)
+
+
+def test_stray_entries_are_skipped(tmp_path):
+    shards_dir = str(tmp_path / "shards")
+    _generate(shards_dir, [1, 0])
+    os.makedirs(os.path.join(shards_dir, "shard-tmp"))
+    open(os.path.join(shards_dir, ".DS_Store"), "w").close()
+    open(os.path.join(shards_dir, "shard-00002"), "w").close()
+
+    assert [shard for shard, _ in shard_dirs(shards_dir)] == [0, 1]
+    assert [shard for shard, _, _ in load_shards(shards_dir, NAME, 2)] == [0, 1]
+    assert _merged(shards_dir, str(tmp_path / "merged"))
+
+
+def test_interrupted_shard_is_generated_again(tmp_path):
+    shards_dir = str(tmp_path / "shards")
+    _generate(shards_dir, [0, 1])
+    expected = _merged(shards_dir, str(tmp_path / "first"))
+
+    # A shard whose export was interrupted has no manifest and leftover files.
+    task_dir = os.path.join(shard_dir(shards_dir, 1), NAME)
+    os.remove(os.path.join(task_dir, MANIFEST_FILENAME))
+    open(os.path.join(task_dir, "leftover.json"), "w").close()
+    with pytest.raises(ValueError, match="missing"):
+        load_shards(shards_dir, NAME, 2)
+
+    _generate(shards_dir, [1])
+    assert not os.path.exists(os.path.join(task_dir, "leftover.json"))
+    assert _merged(shards_dir, str(tmp_path / "second")) == expected
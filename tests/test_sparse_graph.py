@@ -0,0 +1,45 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from generators.sparse_graph import generate_validity_graphs, is_colorable
+from pipeline import metrics
+
+
+@pytest.fixture
+def enabled_metrics():
+    metrics.reset()
+    metrics.enable()
+    yield
+    metrics.enable(False)
+    metrics.reset()
+
+
+def _accepted(snapshot: dict) -> int:
+    return sum(
+        counter["value"]
+        for counter in snapshot["counters"]
+        if counter["name"] == "candidates"
+        and counter["labels"]["outcome"] == "accepted"
+    )
+
+
+def test_validity_pairs(enabled_metrics):
+    valid, invalid = generate_validity_graphs(
+        10, "geometric", 20, 60, np.random.default_rng(0)
+    )
+
+    assert len(valid) == len(invalid) == 10
+    assert all(is_colorable(sample) for sample in valid)
+    assert not any(is_colorable(sample) for sample in invalid)
+    for samples in [valid, invalid]:
+        assert all(20 <= len(sample["pos"]) <= 60 for sample in samples)
+    # Neither the size nor the number of colors tells the labels apart.
+    assert Counter(len(sample["pos"]) for sample in valid) == Counter(
+        len(sample["pos"]) for sample in invalid
+    )
+    assert Counter(len(sample["color_choices"]) for sample in valid) == Counter(
+        len(sample["color_choices"]) for sample in invalid
+    )
+    assert _accepted(metrics.snapshot()) == 20
@@ -0,0 +1,29 @@
+import itertools
+
+from pipeline.stream import ProblemStream
+
+NAMES = ["sudoku_validity", "set_validity", "graph_validity"]
+
+
+def _batches(worker_id: int, num_workers: int, n: int) -> list[tuple[str, int]]:
+    stream = ProblemStream(NAMES, worker_id=worker_id, num_workers=num_workers)
+    return list(itertools.islice(stream.batches(), n))
+
+
+def test_workers_share_the_batches_of_every_task():
+    batches = [_batches(worker_id, 3, 30) for worker_id in range(3)]
+
+    for worker_batches in batches:
+        assert {name for name, _ in worker_batches} == set(NAMES)
+    assert sorted(itertools.chain(*batches)) == sorted(
+        (name, index) for name in NAMES for index in range(30)
+    )
+
+
+def test_single_worker_takes_tasks_in_turn():
+    assert _batches(0, 1, 4) == [
+        ("sudoku_validity", 0),
+        ("set_validity", 0),
+        ("graph_validity", 0),
+        ("sudoku_validity", 1),
+    ]
@@ -0,0 +1,17 @@
+import random
+
+import numpy as np
+import pytest
+
+from pipeline.tasks import TASKS
+
+
+@pytest.mark.parametrize("name", list(TASKS))
+def test_generate_is_reproducible_from_rng(name):
+    task = TASKS[name]
+    np.random.seed(0)
+    random.seed(0)
+    specs = task.generate(8, np.random.default_rng(0))
+    np.random.seed(1)
+    random.seed(1)
+    assert task.generate(8, np.random.default_rng(0)) == specs